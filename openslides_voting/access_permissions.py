@@ -35,6 +35,12 @@ class AuthorizedVotersAccessPermissions(OSBaseAccessPermissions):
         return AuthorizedVotersSerializer
 
 
+class AuthorizedVoterAccessPermissions(AuthorizedVotersAccessPermissions):
+    def get_serializer_class(self, user=None):
+        from .serializers import AuthorizedVoterSerializer
+        return AuthorizedVoterSerializer
+
+
 class BaseAccessPermissions(OSBaseAccessPermissions):
     def check_permissions(self, user):
         return has_perm(user, 'openslides_voting.can_manage')
@@ -156,6 +162,12 @@ class AssignmentPollTypeAccessPermissions(BaseAccessPermissions):
         return AssignmentPollTypeSerializer
 
 
+class AttendanceAccessPermissions(BaseAccessPermissions):
+    def get_serializer_class(self, user=None):
+        from .serializers import AttendanceSerializer
+        return AttendanceSerializer
+
+
 class AttendanceLogAccessPermissions(BaseAccessPermissions):
     def get_serializer_class(self, user=None):
         from .serializers import AttendanceLogSerializer
@@ -166,3 +178,9 @@ class VotingTokenAccessPermissions(BaseAccessPermissions):
     def get_serializer_class(self, user=None):
         from .serializers import VotingTokenSerializer
         return VotingTokenSerializer
+
+
+class VoteCollectorReceiverAccessPermissions(BaseAccessPermissions):
+    def get_serializer_class(self, user=None):
+        from .serializers import VoteCollectorReceiverSerializer
+        return VoteCollectorReceiverSerializer
@@ -2,7 +2,8 @@ import os
 
 from django.apps import AppConfig
 from django.conf import settings
-from django.db.models.signals import post_save, post_delete
+from django.core.signals import request_started
+from django.db.models.signals import m2m_changed, post_init, post_save, post_delete
 from openslides.utils.projector import register_projector_elements
 
 from . import (
@@ -39,24 +40,32 @@ class VotingAppConfig(AppConfig):
         from . import projector
 
         # Import all required stuff.
+        from openslides.assignments.models import AssignmentOption
         from openslides.core.config import config
         from openslides.core.signals import post_permission_creation
         from openslides.users.models import Group, User
         from openslides.utils.rest_api import router
+        from .cache import invalidate_candidate_index, invalidate_principle_index, invalidate_share_cache
+        from .coherence import generations
         from .config_variables import get_config_variables
         from .projector import get_projector_elements
         from .signals import (
             add_permissions_to_builtin_groups,
+            remember_user_presence,
+            update_attendance,
             update_authorized_voters,
+            update_authorized_voters_groups,
             inform_keypad_deleted,
         )
         from .urls import urlpatterns
-        from .models import Keypad, VotingShare
+        from .models import Keypad, VotingPrinciple, VotingProxy, VotingShare
         from .views import (
             AssignmentAbsenteeVoteViewSet,
             AssignmentPollBallotViewSet,
             AssignmentPollTypeViewSet,
             AttendanceLogViewSet,
+            AttendanceViewSet,
+            AuthorizedVoterViewSet,
             AuthorizedVotersViewSet,
             KeypadViewSet,
             MotionAbsenteeVoteViewSet,
@@ -66,7 +75,8 @@ class VotingAppConfig(AppConfig):
             VotingPrincipleViewSet,
             VotingProxyViewSet,
             VotingShareViewSet,
-            VotingTokenViewSet
+            VotingTokenViewSet,
+            VoteCollectorReceiverViewSet,
         )
 
         # Register projector elements
@@ -81,13 +91,50 @@ class VotingAppConfig(AppConfig):
             dispatch_uid='voting_add_permissions_to_builtin_groups'
         )
 
+        request_started.connect(generations.request_started, dispatch_uid='voting_check_generations')
         post_delete.connect(inform_keypad_deleted, sender=Keypad)
+        for model in (User, Keypad, VotingProxy):
+            post_save.connect(
+                update_authorized_voters, sender=model,
+                dispatch_uid='voting_update_authorized_voters_%s' % model.__name__)
+            post_delete.connect(
+                update_authorized_voters, sender=model,
+                dispatch_uid='voting_update_authorized_voters_%s' % model.__name__)
+        post_init.connect(remember_user_presence, sender=User, dispatch_uid='voting_remember_user_presence')
+        m2m_changed.connect(
+            update_authorized_voters_groups, sender=User.groups.through,
+            dispatch_uid='voting_update_authorized_voters_groups')
+        post_save.connect(
+            invalidate_share_cache, sender=VotingShare, dispatch_uid='voting_invalidate_share_cache')
+        post_delete.connect(
+            invalidate_share_cache, sender=VotingShare, dispatch_uid='voting_invalidate_share_cache')
+        for model in (VotingShare, VotingPrinciple):
+            post_save.connect(
+                update_attendance, sender=model, dispatch_uid='voting_update_attendance_%s' % model.__name__)
+            post_delete.connect(
+                update_attendance, sender=model, dispatch_uid='voting_update_attendance_%s' % model.__name__)
+        post_save.connect(
+            invalidate_principle_index, sender=VotingPrinciple, dispatch_uid='voting_invalidate_principle_index')
+        post_delete.connect(
+            invalidate_principle_index, sender=VotingPrinciple, dispatch_uid='voting_invalidate_principle_index')
+        m2m_changed.connect(
+            invalidate_principle_index, sender=VotingPrinciple.motions.through,
+            dispatch_uid='voting_invalidate_principle_index_motions')
+        m2m_changed.connect(
+            invalidate_principle_index, sender=VotingPrinciple.assignments.through,
+            dispatch_uid='voting_invalidate_principle_index_assignments')
+        post_save.connect(
+            invalidate_candidate_index, sender=AssignmentOption, dispatch_uid='voting_invalidate_candidate_index')
+        post_delete.connect(
+            invalidate_candidate_index, sender=AssignmentOption, dispatch_uid='voting_invalidate_candidate_index')
 
         # Register viewsets.
         router.register(self.get_model('AssignmentAbsenteeVote').get_collection_string(), AssignmentAbsenteeVoteViewSet)
         router.register(self.get_model('AssignmentPollBallot').get_collection_string(), AssignmentPollBallotViewSet)
         router.register(self.get_model('AssignmentPollType').get_collection_string(), AssignmentPollTypeViewSet)
+        router.register(self.get_model('Attendance').get_collection_string(), AttendanceViewSet)
         router.register(self.get_model('AttendanceLog').get_collection_string(), AttendanceLogViewSet)
+        router.register(self.get_model('AuthorizedVoter').get_collection_string(), AuthorizedVoterViewSet)
         router.register(self.get_model('AuthorizedVoters').get_collection_string(), AuthorizedVotersViewSet)
         router.register(self.get_model('Keypad').get_collection_string(), KeypadViewSet)
         router.register(self.get_model('MotionAbsenteeVote').get_collection_string(), MotionAbsenteeVoteViewSet)
@@ -98,6 +145,8 @@ class VotingAppConfig(AppConfig):
         router.register(self.get_model('VotingPrinciple').get_collection_string(), VotingPrincipleViewSet)
         router.register(self.get_model('VotingShare').get_collection_string(), VotingShareViewSet)
         router.register(self.get_model('VotingProxy').get_collection_string(), VotingProxyViewSet)
+        router.register(self.get_model('VoteCollectorReceiver').get_collection_string(),
+                        VoteCollectorReceiverViewSet)
 
         # Provide plugin urlpatterns to application configuration.
         self.urlpatterns = urlpatterns
@@ -105,9 +154,9 @@ class VotingAppConfig(AppConfig):
     def get_startup_elements(self):
         from openslides.utils.collection import Collection
         for model in ('AssignmentAbsenteeVote', 'AssignmentPollType', 'AssignmentPollBallot',
-                'AttendanceLog', 'AuthorizedVoters', 'Keypad', 'MotionAbsenteeVote',
+                'Attendance', 'AttendanceLog', 'AuthorizedVoter', 'AuthorizedVoters', 'Keypad', 'MotionAbsenteeVote',
                 'MotionPollType', 'MotionPollBallot', 'VotingToken', 'VotingController',
-                'VotingShare', 'VotingPrinciple', 'VotingProxy'):
+                'VotingShare', 'VotingPrinciple', 'VotingProxy', 'VoteCollectorReceiver'):
             yield Collection(self.get_model(model).get_collection_string())
 
     def get_angular_constants(self):
@@ -0,0 +1,248 @@
+import json
+import struct
+import sys
+import zlib
+from array import array
+
+from django.db import transaction
+from openslides.assignments.models import AssignmentPoll
+from openslides.motions.models import MotionPoll
+from openslides.utils.autoupdate import inform_deleted_data
+
+from .models import AssignmentPollBallot, BallotArchive, MotionPollBallot, VotingController
+
+
+FORMAT_VERSION = 1
+
+# The packed columns: (name, type code). Votes and devices are stored as codes into a
+# dictionary of their distinct values, their type code depends on the dictionary size.
+COLUMNS = (
+    ('ballot', 'q'),
+    ('delegate', 'q'),
+    ('vote', None),
+    ('device', None),
+    ('result_token', 'I'),
+    ('is_dummy', 'B'),
+)
+
+ROW_FIELDS = ('pk', 'delegate_id', 'vote', 'device', 'result_token', 'is_dummy')
+
+
+def get_code_type(size):
+    """
+    Returns the smallest array type code for codes into a dictionary of the given size.
+    """
+    if size <= 0x100:
+        return 'B'
+    if size <= 0x10000:
+        return 'H'
+    return 'I'
+
+
+class PackedBallots:
+    """
+    The ballots of a poll as columns:
+    - ballot: ids of the ballot rows,
+    - delegate: delegate ids (0 for anonymous ballots),
+    - vote: codes into the list of distinct votes,
+    - device: codes into the list of distinct devices,
+    - result_token and is_dummy.
+
+    pack() stores a JSON header (format version, row count, column layout and the
+    dictionaries) followed by the little-endian columns, compressed with zlib.
+    """
+    def __init__(self, columns, votes, devices):
+        self.columns = columns
+        self.votes = votes
+        self.devices = devices
+
+    def __len__(self):
+        return len(self.columns['ballot'])
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Packs rows of ROW_FIELDS. Votes may be any JSON value.
+        """
+        votes, vote_codes = [], {}
+        devices, device_codes = [], {}
+        values = {name: [] for name, _type_code in COLUMNS}
+        for pk, delegate_id, vote, device, result_token, is_dummy in rows:
+            key = json.dumps(vote, sort_keys=True)
+            if key not in vote_codes:
+                vote_codes[key] = len(votes)
+                votes.append(vote)
+            if device not in device_codes:
+                device_codes[device] = len(devices)
+                devices.append(device)
+            values['ballot'].append(pk)
+            values['delegate'].append(delegate_id or 0)
+            values['vote'].append(vote_codes[key])
+            values['device'].append(device_codes[device])
+            values['result_token'].append(result_token)
+            values['is_dummy'].append(1 if is_dummy else 0)
+
+        type_codes = dict(COLUMNS, vote=get_code_type(len(votes)), device=get_code_type(len(devices)))
+        columns = {name: array(type_codes[name], values[name]) for name, _type_code in COLUMNS}
+        return cls(columns, votes, devices)
+
+    def pack(self):
+        layout = []
+        body = []
+        for name, _type_code in COLUMNS:
+            column = self.columns[name]
+            if sys.byteorder == 'big':
+                column = array(column.typecode, column)
+                column.byteswap()
+            data = column.tobytes()
+            layout.append([name, column.typecode, len(data)])
+            body.append(data)
+        header = json.dumps({
+            'version': FORMAT_VERSION,
+            'rows': len(self),
+            'columns': layout,
+            'votes': self.votes,
+            'devices': self.devices,
+        }, separators=(',', ':')).encode('utf-8')
+        return zlib.compress(struct.pack('<I', len(header)) + header + b''.join(body), 9)
+
+    @classmethod
+    def unpack(cls, data):
+        data = zlib.decompress(bytes(data))
+        header_length, = struct.unpack_from('<I', data)
+        header = json.loads(data[4:4 + header_length].decode('utf-8'))
+        if header['version'] != FORMAT_VERSION:
+            raise ValueError('Unknown ballot archive format {}.'.format(header['version']))
+        offset = 4 + header_length
+        columns = {}
+        for name, type_code, length in header['columns']:
+            column = array(type_code)
+            if length % column.itemsize or length // column.itemsize != header['rows']:
+                raise ValueError('The column {} of the ballot archive is corrupt.'.format(name))
+            column.frombytes(data[offset:offset + length])
+            if sys.byteorder == 'big':
+                column.byteswap()
+            columns[name] = column
+            offset += length
+        return cls(columns, header['votes'], header['devices'])
+
+    def iter_votes(self, encode=None):
+        """
+        Yields (delegate_id, vote) like values_list('delegate_id', 'vote') of the ballots.
+        encode is applied once to each distinct vote if given.
+        """
+        votes = self.votes if encode is None else [encode(vote) for vote in self.votes]
+        for delegate_id, code in zip(self.columns['delegate'], self.columns['vote']):
+            yield delegate_id or None, votes[code]
+
+    def iter_rows(self):
+        """
+        Yields the ballots as tuples of ROW_FIELDS.
+        """
+        columns = self.columns
+        for pk, delegate_id, vote, device, result_token, is_dummy in zip(
+                *(columns[name] for name, _type_code in COLUMNS)):
+            yield pk, delegate_id or None, self.votes[vote], self.devices[device], result_token, bool(is_dummy)
+
+    def pseudo_anonymize(self):
+        """
+        Removes delegates, devices and result tokens like pseudo_anonymize_votes of the ballots.
+        """
+        count = len(self)
+        self.columns['delegate'] = array('q', bytes(8 * count))
+        self.columns['device'] = array('B', bytes(count))
+        self.columns['result_token'] = array('I', bytes(4 * count))
+        self.devices = [None]
+
+
+def load_archive(poll):
+    """
+    Returns the PackedBallots of an archived poll or None.
+    """
+    archive = BallotArchive.get(poll)
+    if archive is None:
+        return None
+    return PackedBallots.unpack(archive.data)
+
+
+def get_ballot_model(poll):
+    return MotionPollBallot if isinstance(poll, MotionPoll) else AssignmentPollBallot
+
+
+def is_archivable(poll):
+    """
+    Returns True if the poll is closed, i. e. it is not the target of an active voting.
+    """
+    voting_mode = 'MotionPoll' if isinstance(poll, MotionPoll) else 'AssignmentPoll'
+    return VotingController.get_voting((voting_mode, ), poll.pk) is None
+
+
+def lock_poll(poll):
+    """
+    Locks the row of the poll until the end of the transaction. archive_poll and
+    start_voting lock the poll, so a voting cannot start between the check and the
+    deletion of the ballots of an archive.
+    """
+    type(poll).objects.select_for_update().get(pk=poll.pk)
+
+
+@transaction.atomic
+def archive_poll(poll):
+    """
+    Packs the ballots of a closed poll into a BallotArchive and deletes the ballot rows.
+    Returns the number of archived ballots. Polls without ballots, active polls and
+    polls which are archived already are skipped.
+    """
+    lock_poll(poll)
+    if not is_archivable(poll) or BallotArchive.get(poll) is not None:
+        return 0
+    model = get_ballot_model(poll)
+    vote_index = ROW_FIELDS.index('vote')
+    fields = ROW_FIELDS[:vote_index] + (model.vote_field, ) + ROW_FIELDS[vote_index + 1:]
+    rows = list(model.objects.filter(poll=poll).order_by('pk').values_list(*fields))
+    if not rows:
+        return 0
+    if model.vote_field != 'vote':
+        # The archive holds the decoded votes.
+        rows = [row[:vote_index] + (model.decode_vote(poll.pk, row[vote_index]), ) + row[vote_index + 1:]
+                for row in rows]
+    packed = PackedBallots.from_rows(rows)
+    BallotArchive.objects.create(**{
+        BallotArchive.get_poll_field(poll): poll,
+        'ballots': len(rows),
+        'data': packed.pack(),
+    })
+    model.objects.filter(poll=poll).delete()
+    collection_string = model.get_collection_string()
+    inform_deleted_data([(collection_string, row[0]) for row in rows])
+    return len(rows)
+
+
+def pseudo_anonymize_archive(poll):
+    """
+    Pseudo anonymizes the archived ballots of a poll if it was archived.
+    """
+    archive = BallotArchive.get(poll)
+    if archive is not None:
+        packed = PackedBallots.unpack(archive.data)
+        packed.pseudo_anonymize()
+        archive.data = packed.pack()
+        archive.save()
+
+
+def query_archivable_polls(model, poll_ids=None, before=None):
+    """
+    Returns the polls (MotionPoll or AssignmentPoll) which have ballots and were started
+    before the given time. All polls with ballots if poll_ids and before are None.
+    """
+    ballot_model = MotionPollBallot if model == MotionPoll else AssignmentPollBallot
+    polls = model.objects.filter(pk__in=ballot_model.objects.values('poll_id'))
+    if poll_ids is not None:
+        polls = polls.filter(pk__in=poll_ids)
+    if before is not None:
+        started = 'motionpolltype__started__lt' if model == MotionPoll else 'assignmentpolltype__started__lt'
+        polls = polls.filter(**{started: before})
+    return polls.order_by('pk')
+
+
+POLL_MODELS = {'motion': MotionPoll, 'assignment': AssignmentPoll}
@@ -0,0 +1,114 @@
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .coherence import generations
+from .models import Attendance, AttendanceLog
+from .routers import read_database
+from .voting import get_total_shares
+
+
+def get_debounce_delay():
+    """
+    Returns the delay in seconds by which attendance updates are collected. 0 updates
+    the attendance immediately.
+    """
+    return getattr(settings, 'VOTING_ATTENDANCE_DEBOUNCE', 2)
+
+
+def get_log_retention():
+    """
+    Returns the number of days attendance log samples are kept. 0 keeps them forever.
+    """
+    return getattr(settings, 'VOTING_ATTENDANCE_LOG_RETENTION', 0)
+
+
+def serialize_total_shares(total_shares):
+    """
+    Returns the total shares with string keys and decimals as strings like they are
+    sent in a JSON response.
+    """
+    return {
+        str(key): [value if isinstance(value, int) else str(value) for value in values]
+        for key, values in total_shares.items()}
+
+
+def update_attendance():
+    """
+    Recomputes the attendance and saves it if it has changed. Clients are informed by
+    autoupdate. Adds an attendance log entry if the attending heads have changed
+    since the last log.
+    """
+    total_shares = get_total_shares()
+    attendance = Attendance.objects.get()
+    shares = serialize_total_shares(total_shares)
+    if attendance.shares != shares:
+        attendance.shares = shares
+        attendance.updated = timezone.now()
+        attendance.save()
+
+    latest_log = AttendanceLog.objects.first()
+    if latest_log is None or latest_log.heads != total_shares['heads'][1]:
+        AttendanceLog.add(total_shares)
+        retention = get_log_retention()
+        if retention:
+            AttendanceLog.clear(before=timezone.now() - timedelta(days=retention))
+    return attendance
+
+
+class AttendanceUpdater:
+    """
+    Collects attendance changes and recomputes the attendance once per debounce delay
+    in a background thread, e. g. while staff check in many delegates at once.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def schedule(self):
+        delay = get_debounce_delay()
+        if delay <= 0:
+            update_attendance()
+            return
+        with self.lock:
+            if self.timer is None:
+                self.timer = threading.Timer(delay, self.run)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def run(self):
+        with self.lock:
+            self.timer = None
+        try:
+            # The timer thread does not run a request. Notice changes of other processes.
+            generations.refresh()
+            update_attendance()
+        except Exception:
+            # The next change schedules a new update.
+            pass
+        finally:
+            close_old_connections()
+
+
+attendance_updater = AttendanceUpdater()
+
+
+def schedule_attendance_update():
+    """
+    Schedules an attendance update after the current transaction was committed.
+    """
+    transaction.on_commit(attendance_updater.schedule)
+
+
+def get_attendance():
+    """
+    Returns the stored attendance. Computes it if it was never computed.
+    """
+    with read_database():
+        attendance = Attendance.objects.get()
+    if attendance.updated is None:
+        attendance = update_attendance()
+    return attendance.shares
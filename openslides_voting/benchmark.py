@@ -0,0 +1,288 @@
+import json
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.contrib.auth.models import Group
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from openslides.assignments.models import Assignment, AssignmentPoll
+from openslides.core.config import config
+from openslides.motions.models import Motion, MotionPoll
+from openslides.users.models import User
+
+from .cache import principle_index, share_cache
+from .models import (
+    AssignmentPollBallot,
+    Keypad,
+    MotionAbsenteeVote,
+    MotionPollBallot,
+    VotingPrinciple,
+    VotingProxy,
+    VotingShare,
+)
+from .voting import AssignmentBallot, MotionBallot, get_admitted_delegates, get_total_shares
+
+
+DELEGATE_GROUP_ID = 2
+
+BENCHMARK_CONFIG = {
+    'voting_enable_proxies': True,
+    'voting_enable_principles': True,
+    'voting_enable_votecollector': False,
+    'voting_not_voted_abstains': False,
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def override_config(values):
+    """
+    Overrides config values in memory. Nothing is written to the database, so no
+    autoupdate is sent to connected clients.
+    """
+    handler = type(config)
+    getitem = handler.__getitem__
+
+    def get_value(self, key):
+        if key in values:
+            return values[key]
+        return getitem(self, key)
+
+    handler.__getitem__ = get_value
+    try:
+        yield
+    finally:
+        handler.__getitem__ = getitem
+
+
+class Assembly:
+    """
+    Builds a synthetic assembly: delegates with keypads and shares for several principles,
+    proxy chains and absentee votes, a motion poll and an assignment poll. The random
+    generator is seeded so the same options build the same assembly.
+    """
+    def __init__(self, delegates, principles=2, proxy_ratio=0.2, chain_length=3, absentee_ratio=0.05,
+                 present_ratio=0.9, candidates=10, seed=1):
+        self.size = delegates
+        self.principle_count = principles
+        self.proxy_ratio = proxy_ratio
+        self.chain_length = chain_length
+        self.absentee_ratio = absentee_ratio
+        self.present_ratio = present_ratio
+        self.candidate_count = candidates
+        self.random = random.Random(seed)
+        self.prefix = 'benchmark-%s-' % uuid.uuid4().hex[:8]
+
+    def build(self):
+        rnd = self.random
+        User.objects.bulk_create([
+            User(username='%s%d' % (self.prefix, i), first_name='Delegate', last_name=str(i), number=str(i),
+                 is_present=rnd.random() < self.present_ratio)
+            for i in range(self.size)])
+        self.user_ids = list(User.objects.filter(username__startswith=self.prefix).order_by('pk').values_list(
+            'pk', flat=True))
+        User.groups.through.objects.bulk_create([
+            User.groups.through(user_id=user_id, group_id=DELEGATE_GROUP_ID) for user_id in self.user_ids])
+
+        first_number = (Keypad.objects.order_by('-number').values_list('number', flat=True).first() or 0) + 1
+        Keypad.objects.bulk_create([
+            Keypad(user_id=user_id, number=first_number + i) for i, user_id in enumerate(self.user_ids)])
+
+        VotingPrinciple.objects.bulk_create([
+            VotingPrinciple(name='%s%d' % (self.prefix, i), decimal_places=0) for i in range(self.principle_count)])
+        principles = list(VotingPrinciple.objects.filter(name__startswith=self.prefix).order_by('pk'))
+        VotingShare.objects.bulk_create([
+            VotingShare(delegate_id=user_id, principle=principle, shares=Decimal(rnd.randint(1, 100)))
+            for user_id in self.user_ids for principle in principles])
+
+        # Proxy chains: delegate -> proxy -> proxy ... -> authorized voter.
+        ids = list(self.user_ids)
+        rnd.shuffle(ids)
+        proxies = []
+        index = 0
+        while len(proxies) < self.size * self.proxy_ratio and index + 1 < len(ids):
+            length = rnd.randint(1, self.chain_length)
+            chain = ids[index:index + length + 1]
+            proxies.extend(VotingProxy(delegate_id=delegate_id, proxy_id=proxy_id)
+                           for delegate_id, proxy_id in zip(chain, chain[1:]))
+            index += length + 1
+        VotingProxy.objects.bulk_create(proxies)
+        self.proxy_count = len(proxies)
+
+        self.motion = Motion()
+        self.motion.title = 'Benchmark'
+        self.motion.text = 'Benchmark'
+        self.motion.save(skip_autoupdate=True)
+        self.motion_poll = MotionPoll(motion=self.motion)
+        self.motion_poll.save(skip_autoupdate=True)
+        MotionAbsenteeVote.objects.bulk_create([
+            MotionAbsenteeVote(motion=self.motion, delegate_id=proxy.delegate_id, vote=rnd.choice('YNA'))
+            for proxy in proxies if rnd.random() < self.absentee_ratio / max(self.proxy_ratio, 0.01)])
+
+        self.assignment = Assignment(title='Benchmark', open_posts=1)
+        self.assignment.save(skip_autoupdate=True)
+        self.assignment_poll = AssignmentPoll(assignment=self.assignment, pollmethod='yna')
+        self.assignment_poll.save(skip_autoupdate=True)
+        self.assignment_poll.set_options(
+            [{'candidate_id': user_id, 'weight': i} for i, user_id in enumerate(self.user_ids[:self.candidate_count])],
+            skip_autoupdate=True)
+
+        principles[0].motions.add(self.motion)
+        principles[-1].assignments.add(self.assignment)
+        self.principle = principles[0]
+        self.assignment_principle = principles[-1]
+
+        # Bulk writes do not send signals.
+        share_cache.invalidate()
+        principle_index.invalidate()
+
+    def describe(self):
+        return {
+            'delegates': self.size,
+            'principles': self.principle_count,
+            'proxies': self.proxy_count,
+            'absentee_votes': MotionAbsenteeVote.objects.filter(motion=self.motion).count(),
+            'candidates': self.candidate_count,
+            'database': connection.vendor,
+        }
+
+
+def measure(func, setup=None, repeat=3):
+    """
+    Runs func once counting the queries and then repeat times measuring the time.
+    setup is run before each run and not measured. Returns {seconds, queries} with the
+    fastest time.
+    """
+    if setup:
+        setup()
+    with CaptureQueriesContext(connection) as context:
+        func()
+    queries = len(context.captured_queries)
+    times = []
+    for _i in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {'seconds': round(min(times), 6), 'queries': queries}
+
+
+def run_benchmarks(assembly, votes=100, repeat=3):
+    """
+    Measures the voting functions on the assembly. Returns {<benchmark>: {seconds, queries}}.
+    """
+    results = {}
+    motion_ballot = MotionBallot(assembly.motion_poll, assembly.principle)
+    assignment_ballot = AssignmentBallot(assembly.assignment_poll, assembly.assignment_principle)
+    admitted = get_admitted_delegates(assembly.principle)[1]
+    voters = list(User.objects.filter(pk__in=list(admitted)[:votes]))
+    all_votes = [(random.Random(voter_id).choice('YNA'), User(pk=voter_id), None) for voter_id in admitted]
+
+    def delete_motion_ballots():
+        MotionPollBallot.objects.filter(poll=assembly.motion_poll).delete()
+
+    def create_motion_ballots():
+        delete_motion_ballots()
+        motion_ballot.register_votes_bulk(all_votes)
+
+    def register_votes():
+        for voter in voters:
+            motion_ballot.register_vote('Y', voter=voter)
+
+    candidate_ids = [str(user_id) for user_id in assembly.user_ids[:assembly.candidate_count]]
+
+    def create_assignment_ballots():
+        AssignmentPollBallot.objects.filter(poll=assembly.assignment_poll).delete()
+        rnd = random.Random(1)
+        AssignmentPollBallot.objects.bulk_create([
+            AssignmentPollBallot(
+                poll=assembly.assignment_poll, delegate_id=voter_id, result_token=0,
+                vote={candidate_id: rnd.choice('YNA') for candidate_id in candidate_ids})
+            for voter_id in admitted])
+
+    results['get_admitted_delegates'] = measure(lambda: get_admitted_delegates(assembly.principle), repeat=repeat)
+    results['get_total_shares'] = measure(get_total_shares, repeat=repeat)
+    results['create_absentee_ballots'] = measure(
+        motion_ballot.create_absentee_ballots, setup=delete_motion_ballots, repeat=repeat)
+    results['register_vote'] = measure(register_votes, setup=delete_motion_ballots, repeat=repeat)
+    results['register_vote']['votes'] = len(voters)
+    results['motion_count_votes'] = measure(
+        motion_ballot.count_votes, setup=create_motion_ballots, repeat=repeat)
+    results['assignment_count_votes'] = measure(
+        assignment_ballot.count_votes, setup=create_assignment_ballots, repeat=repeat)
+    results['pseudo_anonymize_votes'] = measure(
+        motion_ballot.pseudo_anonymize_votes, setup=create_motion_ballots, repeat=repeat)
+    return results
+
+
+def run(sizes, repeat=3, votes=100, **assembly_options):
+    """
+    Builds an assembly of each size and measures it. All changes are rolled back.
+    Returns {<size>: {'assembly': {...}, 'results': {...}}}.
+    """
+    if not Group.objects.filter(pk=DELEGATE_GROUP_ID, permissions__codename='can_vote').exists():
+        raise ValueError('The delegates group (id {}) with the can_vote permission is missing.'.format(
+            DELEGATE_GROUP_ID))
+
+    report = {}
+    with override_config(BENCHMARK_CONFIG):
+        for size in sizes:
+            try:
+                with transaction.atomic():
+                    assembly = Assembly(size, **assembly_options)
+                    assembly.build()
+                    report[str(size)] = {
+                        'assembly': assembly.describe(),
+                        'results': run_benchmarks(assembly, votes=votes, repeat=repeat),
+                    }
+                    raise Rollback()
+            except Rollback:
+                pass
+            finally:
+                share_cache.invalidate()
+                principle_index.invalidate()
+    return report
+
+
+def compare(report, baseline, tolerance=0.25):
+    """
+    Compares a report with a baseline report. Returns a list of regressions: benchmarks
+    which are more than tolerance slower or run more queries. Sizes measured on another
+    database are reported instead of compared.
+    """
+    regressions = []
+    for size, data in report.items():
+        database = data['assembly'].get('database')
+        base_database = baseline.get(size, {}).get('assembly', {}).get('database', database)
+        if base_database != database:
+            regressions.append('{} delegates: the baseline was measured on {}, not on {}'.format(
+                size, base_database, database))
+            continue
+        for name, result in data['results'].items():
+            base = baseline.get(size, {}).get('results', {}).get(name)
+            if base is None:
+                continue
+            if result['queries'] > base['queries']:
+                regressions.append('{} delegates, {}: {} queries (baseline {})'.format(
+                    size, name, result['queries'], base['queries']))
+            if result['seconds'] > base['seconds'] * (1 + tolerance):
+                regressions.append('{} delegates, {}: {:.4f} s (baseline {:.4f} s)'.format(
+                    size, name, result['seconds'], base['seconds']))
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, report):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
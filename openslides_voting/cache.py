@@ -0,0 +1,202 @@
+import threading
+
+from openslides.assignments.models import AssignmentOption
+
+from . import coherence
+from .coherence import generations
+from .models import VotingPrinciple, VotingShare
+
+
+class BaseCache:
+    """
+    Base class of the in-process caches. The data is loaded on first use by load()
+    and dropped by invalidate(). Changes of other processes are noticed by the
+    generation check on the first access of each request (see coherence.py).
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = None
+        self.version = 0
+
+    def load(self):
+        raise NotImplementedError
+
+    def get_data(self):
+        generations.check()
+        data = self.data
+        if data is None:
+            version = self.version
+            data = self.load()
+            with self.lock:
+                # Do not store the data if the cache was invalidated while loading.
+                if self.version == version:
+                    self.data = data
+        return data
+
+    def invalidate(self):
+        with self.lock:
+            self.data = None
+            self.version += 1
+
+
+class ShareCache(BaseCache):
+    """
+    Caches the voting shares of all delegates as share vectors per voting principle:
+    {<principle_id>: {<delegate_id>: <shares>}}
+
+    All shares are loaded with one query on first use. The cache is invalidated on
+    every save or delete of a VotingShare and after bulk imports in all processes.
+    The returned dictionaries are shared and must not be changed.
+    """
+    def load(self):
+        vectors = {}
+        for principle_id, delegate_id, shares in VotingShare.objects.values_list(
+                'principle_id', 'delegate_id', 'shares'):
+            vectors.setdefault(principle_id, {})[delegate_id] = shares
+        return vectors
+
+    def get_all(self):
+        """
+        Returns the share vectors of all principles.
+        """
+        return self.get_data()
+
+    def get(self, principle):
+        """
+        Returns the share vector {<delegate_id>: <shares>} of a principle (object or id).
+        """
+        principle_id = getattr(principle, 'pk', principle)
+        return self.get_all().get(principle_id, {})
+
+    def exists(self):
+        """
+        Returns True if any voting share exists.
+        """
+        return any(self.get_all().values())
+
+
+class PrincipleIndex(BaseCache):
+    """
+    Indexes the voting principles by motion and assignment id.
+
+    The principles and their relations are loaded with three queries on first use. The
+    index is invalidated in all processes on every save or delete of a VotingPrinciple
+    and when its motions or assignments change. The returned principles are shared and must not be changed.
+    """
+    def load(self):
+        principles = {principle.pk: principle for principle in VotingPrinciple.objects.all()}
+        motions = dict(VotingPrinciple.motions.through.objects.values_list('motion_id', 'votingprinciple_id'))
+        assignments = dict(
+            VotingPrinciple.assignments.through.objects.values_list('assignment_id', 'votingprinciple_id'))
+
+        # One and only one principle without any motion or assignment relationships is
+        # used for all motions and assignments.
+        default = None
+        if len(principles) == 1:
+            principle_id = next(iter(principles))
+            if principle_id not in motions.values() and principle_id not in assignments.values():
+                default = principles[principle_id]
+
+        return {
+            'principles': principles,
+            'motions': motions,
+            'assignments': assignments,
+            'default': default,
+        }
+
+    def get(self, motion=None, assignment=None):
+        """
+        Returns the voting principle of a motion or assignment (object or id) or the default
+        principle. Returns None if there is none.
+        """
+        data = self.get_data()
+        principle_id = None
+        if motion:
+            principle_id = data['motions'].get(getattr(motion, 'pk', motion))
+        elif assignment:
+            principle_id = data['assignments'].get(getattr(assignment, 'pk', assignment))
+        if principle_id is None:
+            return data['default']
+        return data['principles'].get(principle_id)
+
+    def find_conflict(self, motion_ids, assignment_ids, exclude=None):
+        """
+        Returns the first ('motion' or 'assignment', <id>, <principle>) already related to
+        another principle than exclude (object or id) or None.
+        """
+        data = self.get_data()
+        exclude_id = getattr(exclude, 'pk', exclude)
+        for kind, ids, index in (('motion', motion_ids, data['motions']),
+                                 ('assignment', assignment_ids, data['assignments'])):
+            for pk in set(ids) & index.keys():
+                if index[pk] != exclude_id and index[pk] in data['principles']:
+                    return kind, pk, data['principles'][index[pk]]
+        return None
+
+
+class CandidateIndex(BaseCache):
+    """
+    Indexes the candidate ids of all assignment polls in option order:
+    {<poll_id>: (<candidate_id>, ...)}
+
+    The compact vote encoding of AssignmentPollBallot refers to the candidates by their
+    index (see votecodec.py). The options are loaded with one query on first use, options
+    of polls created later are looked up on the first access. The index is invalidated
+    in all processes on every save or delete of an AssignmentOption.
+    """
+    def load(self):
+        candidates = {}
+        for poll_id, candidate_id in AssignmentOption.objects.order_by('poll_id', 'pk').values_list(
+                'poll_id', 'candidate_id'):
+            candidates.setdefault(poll_id, []).append(candidate_id)
+        return {poll_id: tuple(candidate_ids) for poll_id, candidate_ids in candidates.items()}
+
+    def get(self, poll):
+        """
+        Returns the candidate ids of an assignment poll (object or id) in option order.
+        """
+        poll_id = getattr(poll, 'pk', poll)
+        data = self.get_data()
+        candidate_ids = data.get(poll_id)
+        if candidate_ids is None:
+            candidate_ids = tuple(AssignmentOption.objects.filter(poll_id=poll_id).order_by('pk').values_list(
+                'candidate_id', flat=True))
+            with self.lock:
+                if self.data is data:
+                    data[poll_id] = candidate_ids
+        return candidate_ids
+
+
+share_cache = ShareCache()
+generations.register(share_cache, coherence.SHARES)
+
+
+def invalidate_share_cache(sender=None, **kwargs):
+    """
+    Signal receiver for post_save and post_delete of VotingShare.
+    """
+    generations.bump(coherence.SHARES)
+
+
+principle_index = PrincipleIndex()
+generations.register(principle_index, coherence.PRINCIPLES)
+
+
+def invalidate_principle_index(sender=None, **kwargs):
+    """
+    Signal receiver for post_save, post_delete and m2m_changed of VotingPrinciple.
+    """
+    action = kwargs.get('action')
+    if action is None or action.startswith('post_'):
+        generations.bump(coherence.PRINCIPLES)
+
+
+candidate_index = CandidateIndex()
+generations.register(candidate_index, coherence.CANDIDATES)
+
+
+def invalidate_candidate_index(sender=None, **kwargs):
+    """
+    Signal receiver for post_save and post_delete of AssignmentOption.
+    """
+    generations.bump(coherence.CANDIDATES)
@@ -0,0 +1,97 @@
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import VotingGeneration
+
+
+# Parts of the voting state with their own generation counter.
+VOTING = 'voting'  # Start and stop of votings, ballots changed by the REST API and cleared ballots.
+ADMISSION = 'admission'  # Authorized voters, changed by presences, keypads and proxies.
+SHARES = 'shares'
+PRINCIPLES = 'principles'
+CANDIDATES = 'candidates'  # Options of assignment polls.
+
+
+def is_enabled():
+    """
+    Coherence checks are enabled by default. Single process deployments may disable
+    them with VOTING_CACHE_COHERENCE = False.
+    """
+    return getattr(settings, 'VOTING_CACHE_COHERENCE', True)
+
+
+class Generations:
+    """
+    Keeps the in-process caches of all worker processes coherent.
+
+    Each part of the voting state has a generation counter in the database. A process
+    changing the state increases the counter with bump() in the same transaction and
+    invalidates its own caches. Every process reads all counters with one query on the
+    first cache access of a request and invalidates the caches of all parts whose
+    counter has changed since the last check. Code outside of requests (e. g. background
+    threads) calls refresh() itself.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # The counters seen by the last check of this process: {<name>: <value>}
+        self.seen = {}
+        # [(<cache>, <set of names>)]
+        self.caches = []
+
+    def register(self, cache, *names):
+        """
+        Registers a cache (with an invalidate method) depending on the given parts.
+        """
+        self.caches.append((cache, set(names)))
+
+    def request_started(self, **kwargs):
+        """
+        Signal receiver for request_started. The counters are checked on the first cache
+        access of the request.
+        """
+        self.local.pending = True
+
+    def check(self):
+        """
+        Checks the counters once per request. Does nothing outside of requests.
+        """
+        if getattr(self.local, 'pending', False):
+            self.local.pending = False
+            self.refresh()
+
+    def refresh(self):
+        """
+        Reads the counters and invalidates the caches of changed parts.
+        """
+        if not is_enabled():
+            return
+        current = dict(VotingGeneration.objects.values_list('name', 'value'))
+        with self.lock:
+            changed = {name for name, value in current.items() if self.seen.get(name) != value}
+            self.seen.update(current)
+        self.invalidate(changed)
+
+    def bump(self, *names):
+        """
+        Increases the counters of the given parts and invalidates the caches of this
+        process, at once and again after the transaction was committed. Other threads
+        may reload the old state before the commit, also if the counters are disabled.
+        Other processes notice the change after the commit with the next check.
+        """
+        if is_enabled():
+            VotingGeneration.objects.filter(name__in=names).update(value=F('value') + 1)
+        self.invalidate(names)
+        transaction.on_commit(lambda: self.invalidate(names))
+
+    def invalidate(self, names):
+        names = set(names)
+        for cache, cache_names in self.caches:
+            if names & cache_names:
+                cache.invalidate()
+
+
+generations = Generations()
@@ -95,6 +95,27 @@ def get_config_variables():
         group='OpenSlides-Voting',
         subgroup='VoteCollector'
     )
+    yield ConfigVariable(
+        name='voting_votecollector_pull_only',
+        default_value=False,
+        input_type='boolean',
+        label='Pull votes from VoteCollector when voting stops',
+        help_text='Keypad votes are not posted one by one but fetched from the VoteCollector '
+                  'when the voting is stopped. No live results and delegate board during voting.',
+        weight=657,
+        group='OpenSlides-Voting',
+        subgroup='VoteCollector'
+    )
+    yield ConfigVariable(
+        name='voting_show_stats',
+        default_value=False,
+        input_type='boolean',
+        label='Show voting statistics on projector',
+        help_text='Show votes per second, rejected votes and backlog on the projector during a voting.',
+        weight=658,
+        group='OpenSlides-Voting',
+        subgroup='VoteCollector'
+    )
 
     # Delegate board
     yield ConfigVariable(
@@ -0,0 +1,144 @@
+import csv
+import json
+
+import django
+from django.contrib.contenttypes.models import ContentType
+from openslides.agenda.models import Item
+from openslides.assignments.models import Assignment
+from openslides.motions.models import Motion
+from openslides.users.models import User
+
+from .archive import PackedBallots
+from .models import MAX_IN_CLAUSE, AssignmentPollBallot, BallotArchive, MotionPollBallot, chunked
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_COLUMNS = (
+    'poll', 'ballot', 'delegate', 'delegate_number', 'delegate_first_name', 'delegate_last_name',
+    'device', 'vote', 'result_token', 'is_dummy',
+)
+
+EXPORT_FIELDS = (
+    'poll_id', 'pk', 'delegate_id', 'delegate__number', 'delegate__first_name', 'delegate__last_name',
+    'device', 'vote', 'result_token', 'is_dummy',
+)
+
+
+def parse_id_ranges(value):
+    """
+    Returns a list of ids from a string like '1,3,5-9'. Raises ValueError.
+    """
+    ids = []
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, _sep, last = part.partition('-')
+        first = int(first)
+        last = int(last) if last else first
+        if last < first or last - first > 10000:
+            raise ValueError('Invalid range: {}'.format(part))
+        ids.extend(range(first, last + 1))
+    return ids
+
+
+def filter_polls(queryset, model, poll_ids=None, item_ids=None, poll_field='poll'):
+    """
+    Filters a queryset of ballots or archives (of the ballot model) by the given polls or
+    by all polls of the motions or assignments of the given agenda items.
+    """
+    if poll_ids is not None:
+        queryset = queryset.filter(**{poll_field + '_id__in': poll_ids})
+    if item_ids is not None:
+        content_model = Motion if model == MotionPollBallot else Assignment
+        object_ids = Item.objects.filter(
+            pk__in=item_ids, content_type=ContentType.objects.get_for_model(content_model)).values_list(
+            'object_id', flat=True)
+        if model == MotionPollBallot:
+            queryset = queryset.filter(**{poll_field + '__motion_id__in': list(object_ids)})
+        else:
+            queryset = queryset.filter(**{poll_field + '__assignment_id__in': list(object_ids)})
+    return queryset
+
+
+def query_ballots(model, poll_ids=None, item_ids=None):
+    """
+    Returns a queryset of the ballots of the given polls or of all polls of the motions
+    or assignments of the given agenda items.
+    """
+    return filter_polls(model.objects.all(), model, poll_ids, item_ids).order_by('poll_id', 'pk')
+
+
+def iter_ballot_rows(ballots, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields the ballots as tuples of EXPORT_FIELDS. A server-side cursor is used where
+    the database supports it so memory use does not depend on the number of ballots.
+    Encoded votes (see AssignmentPollBallot) are decoded.
+    """
+    model = ballots.model
+    vote_index = EXPORT_FIELDS.index('vote')
+    fields = EXPORT_FIELDS[:vote_index] + (model.vote_field, ) + EXPORT_FIELDS[vote_index + 1:]
+    rows = ballots.values_list(*fields)
+    if django.VERSION >= (2, 0):
+        rows = rows.iterator(chunk_size=chunk_size)
+    else:
+        rows = rows.iterator()
+    if model.vote_field == 'vote':
+        return rows
+    return (row[:vote_index] + (model.decode_vote(row[0], row[vote_index]), ) + row[vote_index + 1:]
+            for row in rows)
+
+
+def iter_archived_rows(model, poll_ids=None, item_ids=None):
+    """
+    Yields the archived ballots of the given polls as tuples of EXPORT_FIELDS, one
+    archived poll after the other. The delegates are looked up once per archive.
+    """
+    poll_field = 'motion_poll' if model == MotionPollBallot else 'assignment_poll'
+    archives = filter_polls(BallotArchive.objects.all(), model, poll_ids, item_ids, poll_field)
+    for archive in archives.order_by(poll_field + '_id').iterator():
+        poll_id = getattr(archive, poll_field + '_id')
+        rows = list(PackedBallots.unpack(archive.data).iter_rows())
+        delegate_ids = {row[1] for row in rows if row[1]}
+        delegates = {}
+        for user_ids in chunked(sorted(delegate_ids), MAX_IN_CLAUSE):
+            delegates.update((pk, (number, first_name, last_name)) for pk, number, first_name, last_name in (
+                User.objects.filter(pk__in=user_ids).values_list('pk', 'number', 'first_name', 'last_name')))
+        for pk, delegate_id, vote, device, result_token, is_dummy in rows:
+            number, first_name, last_name = delegates.get(delegate_id, (None, None, None))
+            yield (poll_id, pk, delegate_id, number, first_name, last_name, device, vote, result_token, is_dummy)
+
+
+class Echo:
+    """
+    File-like object returning what is written, used to stream csv.writer output.
+    """
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        row = list(row)
+        vote = row[7]
+        if not isinstance(vote, str):
+            row[7] = json.dumps(vote)
+        yield writer.writerow(row)
+
+
+def stream_ndjson(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_COLUMNS, row))) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', stream_csv),
+    'ndjson': ('application/x-ndjson', stream_ndjson),
+}
+
+
+def get_ballot_model(poll_type):
+    return {'motion': MotionPollBallot, 'assignment': AssignmentPollBallot}.get(poll_type)
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ... import archive
+from ...export import parse_id_ranges
+
+
+class Command(BaseCommand):
+    help = ('Packs the ballots of closed polls into compact per-poll archives and deletes '
+            'the ballot rows. Archived ballots are still counted by recounts and exported.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('poll_type', choices=sorted(archive.POLL_MODELS),
+                            help='Archive motion polls or assignment polls.')
+        parser.add_argument('--polls', default=None,
+                            help='Comma separated poll ids or ranges like 1,3,5-9 (default all polls).')
+        parser.add_argument('--older-than', type=float, default=0,
+                            help='Only archive polls started more than this many hours ago (default 0).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='List the polls without archiving them.')
+
+    def handle(self, *args, **options):
+        try:
+            poll_ids = parse_id_ranges(options['polls']) if options['polls'] else None
+        except ValueError as e:
+            raise CommandError(str(e))
+        before = None
+        if options['older_than'] > 0:
+            before = timezone.now() - timedelta(hours=options['older_than'])
+
+        polls = archive.query_archivable_polls(archive.POLL_MODELS[options['poll_type']], poll_ids, before)
+        archived_polls = archived_ballots = 0
+        for poll in polls:
+            if not archive.is_archivable(poll):
+                self.stdout.write('Poll %d is voted right now, skipped.' % poll.pk)
+                continue
+            if options['dry_run']:
+                self.stdout.write('Poll %d would be archived.' % poll.pk)
+                continue
+            count = archive.archive_poll(poll)
+            if count:
+                archived_polls += 1
+                archived_ballots += count
+                self.stdout.write('Poll %d: %d ballots archived.' % (poll.pk, count))
+        if not options['dry_run']:
+            self.stdout.write('%d ballots of %d polls archived.' % (archived_ballots, archived_polls))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from openslides.core.config import config
+
+from ...models import VotingController
+from ...votecollector import rollcall, rpc
+
+
+class Command(BaseCommand):
+    help = ('Pings all keypads and marks exactly the users whose keypad responds within '
+            'the window as present.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window', type=int, default=None,
+                            help='Seconds to collect keypad responses (default VOTING_ROLL_CALL_WINDOW).')
+        parser.add_argument('--session', type=int, default=1,
+                            help='Voting session whose keypads are pinged (default 1).')
+
+    def handle(self, *args, **options):
+        if not config['voting_enable_votecollector']:
+            raise CommandError('The VoteCollector is not enabled.')
+        try:
+            session = VotingController.objects.get(pk=options['session'])
+        except VotingController.DoesNotExist:
+            raise CommandError('The voting session does not exist.')
+        try:
+            # Without a callback url the responses are pulled from the VoteCollector.
+            report = rollcall.roll_call(options['window'], session=session)
+        except rpc.VoteCollectorError as e:
+            raise CommandError(e.value)
+        self.stdout.write('%(responded)d keypads responded: %(present)d present, %(absent)d absent, '
+                          '%(changed)d changed' % report)
@@ -0,0 +1,267 @@
+import base64
+import hashlib
+import hmac
+import http.client
+import json
+import random
+import threading
+import time
+from queue import Queue
+from socketserver import ThreadingMixIn
+from urllib.parse import urlencode, urlsplit
+from xmlrpc.server import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def percentile(values, p):
+    """
+    Returns the p-th percentile (0..100) of a sorted list using the nearest rank.
+    """
+    if not values:
+        return 0
+    index = max(0, min(len(values) - 1, int(round(p / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+class ThreadingXMLRPCServer(ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+
+
+class QuietRequestHandler(SimpleXMLRPCRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class Emulator:
+    """
+    Emulates the XML-RPC API of the VoteCollector and fires HMAC-signed callbacks for
+    simulated keypads.
+    """
+    def __init__(self, keypads, rate, batch_size, retries, workers, secret, stdout):
+        self.keypads = keypads
+        self.rate = rate
+        self.batch_size = batch_size
+        self.retries = retries
+        self.workers = workers
+        self.key = bytes(secret, 'utf-8')
+        self.stdout = stdout
+
+        self.lock = threading.Lock()
+        self.mode = None
+        self.options = None
+        self.callback_url = None
+        self.keypad_list = []
+        self.votes = []
+        self.latencies = []
+        self.failed = 0
+        self.rejected = 0
+        self.retried = 0
+        self.started = None
+        self.is_voting = False
+
+    # XML-RPC API
+
+    def getDeviceStatus(self):
+        return 'Device: Emulator. Status: Connected. Secret Key: Yes'
+
+    def prepareVoting(self, mode, first_keypad, last_keypad, keypad_list):
+        mode, _sep, ext_mode = mode.partition('-')
+        callback_url = None
+        options = None
+        for part in ext_mode.split(';'):
+            if part.startswith('http'):
+                callback_url = part
+            elif part:
+                options = part
+        with self.lock:
+            self.mode = mode
+            self.options = options
+            self.callback_url = callback_url
+            self.keypad_list = list(keypad_list) or list(range(1, self.keypads + 1))
+        return len(self.keypad_list)
+
+    def startVoting(self):
+        with self.lock:
+            self.votes = []
+            self.latencies = []
+            self.failed = self.rejected = self.retried = 0
+            self.started = time.time()
+            self.is_voting = True
+        threading.Thread(target=self.fire, daemon=True).start()
+        return len(self.keypad_list)
+
+    def stopVoting(self):
+        with self.lock:
+            self.is_voting = False
+        return 0
+
+    def getVotingStatus(self):
+        elapsed = int(time.time() - self.started) if self.started else 0
+        return [elapsed, len(self.votes)]
+
+    def getVotingResult(self):
+        with self.lock:
+            return list(self.votes)
+
+    # Simulation
+
+    def get_value(self):
+        if self.mode in ('YesNoAbstain', 'SpeakerList'):
+            return random.choice(('Y', 'N', 'A') if self.mode == 'YesNoAbstain' else ('Y', 'N'))
+        if self.mode in ('SingleDigit', 'MultiDigit'):
+            return str(random.randint(0, int(self.options or 10) - 1))
+        return 'P'  # Ping
+
+    def sign(self, message):
+        digest = hmac.new(self.key, bytes(message, 'utf-8'), hashlib.sha256).digest()
+        return base64.b64encode(digest).decode('utf-8')
+
+    def fire(self):
+        """
+        Casts a vote for each keypad at the configured rate and posts them in batches.
+        """
+        queue = Queue()
+        threads = []
+        if self.callback_url:
+            threads = [threading.Thread(target=self.post_worker, args=(queue,), daemon=True)
+                       for _i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+
+        interval = self.batch_size / self.rate if self.rate else 0
+        next_time = time.time()
+        keypad_list = list(self.keypad_list)
+        random.shuffle(keypad_list)
+        for start in range(0, len(keypad_list), self.batch_size):
+            if not self.is_voting:
+                break
+            batch = [{
+                'id': number,
+                'value': self.get_value(),
+                'sn': str(1000000 + number),
+                'bl': random.randint(0, 3)
+            } for number in keypad_list[start:start + self.batch_size]]
+            with self.lock:
+                self.votes.extend(batch)
+            if self.callback_url:
+                queue.put(batch)
+            next_time += interval
+            time.sleep(max(0, next_time - time.time()))
+
+        for thread in threads:
+            queue.put(None)
+        for thread in threads:
+            thread.join()
+        self.report()
+
+    def post_worker(self, queue):
+        """
+        Posts batches using a kept-alive connection. Failed posts are retried.
+        """
+        url = urlsplit(self.callback_url)
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        connection = connection_class(url.netloc, timeout=30)
+        while True:
+            batch = queue.get()
+            if batch is None:
+                break
+            for attempt in range(1 + self.retries):
+                start = time.time()
+                try:
+                    status = self.post(connection, url, batch)
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    status = None
+                with self.lock:
+                    if status is not None and status < 500:
+                        # Rejected votes (4xx) are answered by OpenSlides and not retried.
+                        self.latencies.append(time.time() - start)
+                        if status != 200:
+                            self.rejected += len(batch)
+                        break
+                    if attempt < self.retries:
+                        self.retried += 1
+            else:
+                with self.lock:
+                    self.failed += len(batch)
+        connection.close()
+
+    def post(self, connection, url, batch):
+        if self.mode == 'SpeakerList':
+            # The speaker list is posted per keypad as form data.
+            status = 200
+            for vote in batch:
+                message = json.dumps([vote])
+                body = urlencode({
+                    'auth': json.dumps({'message': message, 'hmac': self.sign(message)}),
+                    'value': vote['value'],
+                    'battery': vote['bl']})
+                connection.request('POST', url.path + '%d/' % vote['id'], body, {
+                    'Content-Type': 'application/x-www-form-urlencoded'})
+                response = connection.getresponse()
+                response.read()
+                status = max(status, response.status)
+            return status
+
+        message = json.dumps(batch)
+        body = json.dumps({'message': message, 'hmac': self.sign(message)})
+        connection.request('POST', url.path, body, {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        return response.status
+
+    def report(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            elapsed = time.time() - self.started
+            votes = len(self.votes)
+            failed = self.failed
+            rejected = self.rejected
+            retried = self.retried
+        self.stdout.write(
+            'Mode %s: %d votes in %.2f s (%.1f votes/s), %d posts, %d retries, '
+            '%d votes rejected, %d votes failed' % (
+                self.mode, votes, elapsed, votes / elapsed if elapsed else 0, len(latencies), retried,
+                rejected, failed))
+        if latencies:
+            self.stdout.write('Post latency: p50 %.1f ms, p95 %.1f ms, p99 %.1f ms, max %.1f ms' % (
+                percentile(latencies, 50) * 1000, percentile(latencies, 95) * 1000,
+                percentile(latencies, 99) * 1000, latencies[-1] * 1000))
+
+
+class Command(BaseCommand):
+    help = ('Runs a local VoteCollector emulator. Set the VoteCollector URL to the emulator '
+            'and start a voting in OpenSlides. The emulator casts and posts HMAC-signed votes '
+            'for all keypads and reports throughput and latency.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8030)
+        parser.add_argument('--keypads', type=int, default=100,
+                            help='Number of keypads if OpenSlides sends an empty keypad list.')
+        parser.add_argument('--rate', type=float, default=200,
+                            help='Votes per second. 0 casts all votes at once.')
+        parser.add_argument('--batch-size', type=int, default=10, help='Votes per callback.')
+        parser.add_argument('--retries', type=int, default=3, help='Retries of failed callbacks.')
+        parser.add_argument('--workers', type=int, default=4, help='Parallel callback connections.')
+
+    def handle(self, *args, **options):
+        emulator = Emulator(
+            options['keypads'], options['rate'], max(1, options['batch_size']), options['retries'],
+            max(1, options['workers']), settings.SECRET_KEY, self.stdout)
+
+        server = ThreadingXMLRPCServer(
+            (options['host'], options['port']), requestHandler=QuietRequestHandler, allow_none=True)
+        for name in ('getDeviceStatus', 'prepareVoting', 'startVoting', 'stopVoting',
+                     'getVotingStatus', 'getVotingResult'):
+            server.register_function(getattr(emulator, name), 'voteCollector.' + name)
+
+        self.stdout.write('VoteCollector emulator listening on http://%s:%d' % (options['host'], options['port']))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ... import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Builds synthetic assemblies in the configured database and measures admission, '
+            'total shares, ballot registration, absentee ballots, vote counting and pseudo '
+            'anonymization. All changes are rolled back. Results can be saved as baseline and '
+            'compared with a baseline to catch regressions. Run it once per database, e. g. with '
+            '--settings of a settings module using SQLite and one using PostgreSQL.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,5000,20000',
+                            help='Comma separated numbers of delegates (default 1000,5000,20000).')
+        parser.add_argument('--principles', type=int, default=2)
+        parser.add_argument('--proxies', type=float, default=0.2, help='Share of represented delegates.')
+        parser.add_argument('--chain-length', type=int, default=3, help='Maximum length of proxy chains.')
+        parser.add_argument('--absentee', type=float, default=0.05, help='Share of absentee votes.')
+        parser.add_argument('--present', type=float, default=0.9, help='Share of present delegates.')
+        parser.add_argument('--candidates', type=int, default=10, help='Candidates of the election.')
+        parser.add_argument('--votes', type=int, default=100, help='Votes registered one by one.')
+        parser.add_argument('--repeat', type=int, default=3, help='Measured runs per benchmark.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--baseline', help='Compare with this baseline file.')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed slowdown against the baseline (default 0.25).')
+        parser.add_argument('--save-baseline', help='Save the results as baseline file.')
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive',
+                            help='Do not ask for confirmation.')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('Invalid sizes.')
+
+        if options['interactive']:
+            answer = input('The benchmark writes into the configured database and rolls back '
+                           'afterwards. Do not run it on a live event. Continue? [y/N] ')
+            if answer.lower() != 'y':
+                return
+
+        try:
+            report = benchmark.run(
+                sizes, repeat=max(1, options['repeat']), votes=options['votes'],
+                principles=max(1, options['principles']), proxy_ratio=options['proxies'],
+                chain_length=max(1, options['chain_length']), absentee_ratio=options['absentee'],
+                present_ratio=options['present'], candidates=options['candidates'], seed=options['seed'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for size, data in report.items():
+            self.stdout.write('%(delegates)d delegates, %(principles)d principles, %(proxies)d proxies, '
+                              '%(absentee_votes)d absentee votes on %(database)s' % data['assembly'])
+            for name, result in data['results'].items():
+                self.stdout.write('  %-26s %10.2f ms %8d queries' % (
+                    name, result['seconds'] * 1000, result['queries']))
+
+        if options['save_baseline']:
+            benchmark.save_baseline(options['save_baseline'], report)
+            self.stdout.write('Baseline saved to %s' % options['save_baseline'])
+
+        if options['baseline']:
+            regressions = benchmark.compare(report, benchmark.load_baseline(options['baseline']),
+                                            options['tolerance'])
+            if regressions:
+                for regression in regressions:
+                    self.stderr.write(regression)
+                raise CommandError('%d regressions against the baseline.' % len(regressions))
+            self.stdout.write('No regressions against the baseline.')
@@ -0,0 +1,147 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from openslides.assignments.models import AssignmentPoll
+from openslides.motions.models import MotionPoll
+from openslides.users.models import User
+
+from ...models import VotingController, VotingToken
+from ...recorder import open_recording
+from ...stats import percentile
+from ...voting import AssignmentBallot, MotionBallot
+
+
+class Command(BaseCommand):
+    help = ('Replays a recorded voting session (see VOTING_RECORD_DIR) against the configured '
+            'database: restores the starting state, deletes the ballots of the poll and sends '
+            'all recorded vote requests at the original or an accelerated speed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Recording file (.ndjson or .ndjson.gz).')
+        parser.add_argument('--speed', type=float, default=1.0,
+                            help='Speed factor, e. g. 10 for ten times faster. 0 sends without pauses.')
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive',
+                            help='Do not ask for confirmation.')
+
+    def handle(self, *args, **options):
+        records = open_recording(options['path'])
+        try:
+            header = next(records)
+        except StopIteration:
+            raise CommandError('The recording is empty.')
+        if header.get('type') != 'start':
+            raise CommandError('The recording does not start with the voting state.')
+
+        if options['interactive']:
+            answer = input('The replay deletes the ballots of the recorded poll and changes the voting '
+                           'state of the configured database. Use a test database. Continue? [y/N] ')
+            if answer.lower() != 'y':
+                return
+
+        self.restore_state(header)
+        key = bytes(settings.SECRET_KEY, 'utf-8')
+        clients = {}
+        latencies = []
+        mismatches = 0
+        speed = options['speed']
+        start = time.time()
+        for record in records:
+            if record.get('type') == 'stop':
+                break
+            if speed > 0:
+                time.sleep(max(0, start + record['t'] / speed - time.time()))
+
+            client = clients.get(record['u'])
+            if client is None:
+                client = clients[record['u']] = Client()
+                if record['u'] is not None:
+                    client.force_login(User.objects.get(pk=record['u']))
+
+            body = record['b']
+            request_start = time.perf_counter()
+            if '/votecollector/' in record['p']:
+                # The payload was verified on recording. Sign it with the current secret key.
+                digest = hmac.new(key, bytes(body, 'utf-8'), hashlib.sha256).digest()
+                auth = json.dumps({'message': body, 'hmac': base64.b64encode(digest).decode('utf-8')})
+                if record['f'] is not None:
+                    data = dict(record['f'], auth=auth)
+                    response = client.post(record['p'], data)
+                else:
+                    response = client.post(record['p'], auth, content_type='application/json')
+            else:
+                if header['voting_type'] == 'token_based_electronic' and record['s'] == 200:
+                    self.restore_tokens(body)
+                response = client.post(record['p'], body, content_type='application/json')
+            latencies.append(time.perf_counter() - request_start)
+            if response.status_code != record['s']:
+                mismatches += 1
+
+        elapsed = time.time() - start
+        vc = VotingController.objects.get(pk=header.get('session', 1))
+        vc.is_voting = False
+        vc.save()
+        vc.authorized_voters.clear_voting()
+
+        latencies.sort()
+        self.stdout.write('%d requests in %.2f s (%.1f requests/s), %d votes received, '
+                          '%d responses differ from the recording' % (
+                              len(latencies), elapsed, len(latencies) / elapsed if elapsed else 0,
+                              vc.votes_received, mismatches))
+        if latencies:
+            self.stdout.write('Latency: p50 %.1f ms, p95 %.1f ms, p99 %.1f ms, max %.1f ms' % (
+                percentile(latencies, 50) * 1000, percentile(latencies, 95) * 1000,
+                percentile(latencies, 99) * 1000, latencies[-1] * 1000))
+
+    def restore_state(self, header):
+        """
+        Sets the voting session and its authorized voters to the recorded start of the
+        voting and deletes the ballots of the poll.
+        """
+        mode = header['voting_mode']
+        target = header['voting_target']
+        poll_kwargs = {}
+        try:
+            if mode == 'MotionPoll':
+                poll = MotionPoll.objects.get(pk=target)
+                MotionBallot(poll).delete_ballots()
+                poll_kwargs['motion_poll'] = poll
+            elif mode == 'AssignmentPoll':
+                poll = AssignmentPoll.objects.get(pk=target)
+                AssignmentBallot(poll).delete_ballots()
+                poll_kwargs['assignment_poll'] = poll
+        except (MotionPoll.DoesNotExist, AssignmentPoll.DoesNotExist):
+            raise CommandError('The recorded poll does not exist in this database.')
+
+        try:
+            vc = VotingController.objects.get(pk=header.get('session', 1))
+        except VotingController.DoesNotExist:
+            raise CommandError('The recorded voting session does not exist in this database.')
+        vc.voting_mode = mode
+        vc.voting_target = target
+        vc.principle_id = header['principle']
+        vc.votes_count = header['votes_count']
+        vc.votes_received = 0
+        vc.is_voting = True
+        vc.save()
+        vc.authorized_voters.set_voting(header['admitted'], header['voting_type'], **poll_kwargs)
+
+    def restore_tokens(self, body):
+        """
+        Restores the voting tokens of an accepted token vote. The tokens were deleted when
+        they were used. The recording holds no other tokens.
+        """
+        try:
+            votes = json.loads(body)
+        except ValueError:
+            return
+        if not isinstance(votes, list):
+            votes = [votes]
+        tokens = {vote['token'] for vote in votes if isinstance(vote, dict) and isinstance(vote.get('token'), str)}
+        tokens -= set(VotingToken.objects.filter(token__in=tokens).values_list('token', flat=True))
+        VotingToken.objects.bulk_create([VotingToken(token=token) for token in tokens])
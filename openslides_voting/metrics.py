@@ -0,0 +1,179 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+# Upper bounds of the latency histogram buckets in milliseconds. The last bucket is open.
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+def is_enabled():
+    return getattr(settings, 'VOTING_METRICS_ENABLED', False)
+
+
+class StageMetrics:
+    """
+    Latency histogram and query counts of one stage.
+    """
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.queries = 0
+        self.max_queries = 0
+
+    def add(self, duration, queries):
+        duration *= 1000
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.buckets[bisect_left(LATENCY_BUCKETS, duration)] += 1
+        if queries is not None:
+            self.queries += queries
+            self.max_queries = max(self.max_queries, queries)
+
+    def percentile(self, p):
+        """
+        Returns the upper bound of the bucket containing the p-th percentile (0..100).
+        The open bucket returns the maximum.
+        """
+        rank = p / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else round(self.max, 3)
+        return 0
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count, 3) if self.count else 0,
+            'max_ms': round(self.max, 3),
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'buckets': dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ['inf'], self.buckets)),
+            'queries_mean': round(self.queries / self.count, 2) if self.count else 0,
+            'queries_max': self.max_queries,
+        }
+
+
+class Metrics:
+    """
+    Collects the stage metrics of this process: {<view>: {<stage>: StageMetrics}}
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+            self.since = time.time()
+
+    def record(self, view, stages):
+        with self.lock:
+            view_metrics = self.views.setdefault(view, {})
+            for stage, (duration, queries) in stages.items():
+                if stage not in view_metrics:
+                    view_metrics[stage] = StageMetrics()
+                view_metrics[stage].add(duration, queries)
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                'enabled': is_enabled(),
+                'since': self.since,
+                'views': {
+                    view: {stage: stage_metrics.as_dict() for stage, stage_metrics in view_metrics.items()}
+                    for view, view_metrics in self.views.items()},
+            }
+
+
+metrics = Metrics()
+_local = threading.local()
+
+
+class RequestTimer:
+    """
+    Measures the stages of one request. mark(stage) assigns the time and the queries since
+    the previous mark to the stage. Marks of the same stage within a request are summed up.
+    The time after the last mark, e. g. the commit, is recorded as stage 'commit' and the
+    whole request as stage 'total'.
+
+    Queries are counted with an execute wrapper on Django 2.0+. Older versions capture
+    them with the debug cursor like CaptureQueriesContext.
+    """
+    def __init__(self, view):
+        self.view = view
+        self.stages = {}
+        self.queries = 0
+        self.capture = None
+
+    def __enter__(self):
+        if hasattr(connection, 'execute_wrapper'):
+            self.wrapper = connection.execute_wrapper(self.count_query)
+        else:
+            self.wrapper = self.capture = CaptureQueriesContext(connection)
+        self.wrapper.__enter__()
+        self.start = self.last = time.perf_counter()
+        self.last_queries = 0
+        _local.timer = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _local.timer = None
+        self.mark('commit')
+        self.wrapper.__exit__(exc_type, exc_value, traceback)
+        self.stages['total'] = (self.last - self.start, self.queries)
+        metrics.record(self.view, self.stages)
+
+    def count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        if self.capture is not None:
+            self.queries = len(connection.queries_log) - self.capture.initial_queries
+        duration, queries = self.stages.get(stage, (0, 0))
+        self.stages[stage] = (duration + now - self.last, queries + self.queries - self.last_queries)
+        self.last = now
+        self.last_queries = self.queries
+
+
+class NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def mark(self, stage):
+        pass
+
+
+null_timer = NullTimer()
+
+
+def measure(view):
+    """
+    Returns a context manager measuring a request of the view or a no-op one if metrics
+    are disabled.
+    """
+    return RequestTimer(view) if is_enabled() else null_timer
+
+
+def mark(stage):
+    """
+    Marks the end of a stage of the request measured in this thread, if any.
+    """
+    timer = getattr(_local, 'timer', None)
+    if timer is not None:
+        timer.mark(stage)
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import openslides.utils.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openslides_voting', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoteCollectorReceiver',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128)),
+                ('uri', models.CharField(max_length=200)),
+                ('first_keypad', models.IntegerField(blank=True, null=True)),
+                ('last_keypad', models.IntegerField(blank=True, null=True)),
+                ('device_status', models.CharField(default='No device', max_length=200)),
+                ('votes_received', models.IntegerField(default=0)),
+                ('is_voting', models.BooleanField(default=False)),
+            ],
+            options={
+                'ordering': ('first_keypad',),
+                'default_permissions': (),
+            },
+            bases=(openslides.utils.models.RESTModelMixin, models.Model),
+        ),
+    ]
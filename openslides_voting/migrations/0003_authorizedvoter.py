@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import jsonfield.fields
+import openslides.utils.models
+
+
+def move_authorized_voters(apps, schema_editor):
+    """
+    Moves the authorized voters of a running voting into AuthorizedVoter objects.
+    """
+    AuthorizedVoters = apps.get_model('openslides_voting', 'AuthorizedVoters')
+    AuthorizedVoter = apps.get_model('openslides_voting', 'AuthorizedVoter')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    user_ids = set(User.objects.values_list('pk', flat=True))
+    voters = []
+    for av in AuthorizedVoters.objects.all():
+        for voter_id, delegates in (av.authorized_voters or {}).items():
+            if int(voter_id) in user_ids:
+                voters.append(AuthorizedVoter(voter_id=int(voter_id), delegates=delegates))
+    AuthorizedVoter.objects.bulk_create(voters)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('openslides_voting', '0002_votecollectorreceiver'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorizedVoter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delegates', jsonfield.fields.JSONField(default=[])),
+                ('voter', models.OneToOneField(
+                    on_delete=django.db.models.deletion.CASCADE, related_name='authorized_voter',
+                    to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'default_permissions': (),
+            },
+            bases=(openslides.utils.models.RESTModelMixin, models.Model),
+        ),
+        migrations.RunPython(move_authorized_voters, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='authorizedvoters',
+            name='authorized_voters',
+        ),
+    ]
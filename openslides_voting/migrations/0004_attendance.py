@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import jsonfield.fields
+import openslides.utils.models
+
+
+def add_attendance_object(apps, schema_editor):
+    """
+    Adds the one and only Attendance object.
+    """
+    model = apps.get_model('openslides_voting', 'Attendance')
+    model.objects.bulk_create([model()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openslides_voting', '0003_authorizedvoter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Attendance',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shares', jsonfield.fields.JSONField(default={})),
+                ('updated', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'default_permissions': (),
+            },
+            bases=(openslides.utils.models.RESTModelMixin, models.Model),
+        ),
+        migrations.RunPython(add_attendance_object, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from decimal import Decimal
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def convert_attendance_log_messages(apps, schema_editor):
+    """
+    Moves the attending heads and shares from the JSON message into columns.
+    """
+    AttendanceLog = apps.get_model('openslides_voting', 'AttendanceLog')
+    AttendanceLogShare = apps.get_model('openslides_voting', 'AttendanceLogShare')
+    VotingPrinciple = apps.get_model('openslides_voting', 'VotingPrinciple')
+    principle_ids = set(VotingPrinciple.objects.values_list('pk', flat=True))
+    shares = []
+    for log in AttendanceLog.objects.all():
+        message = log.message or {}
+        # Use update() because save() of the model would trigger autoupdate.
+        AttendanceLog.objects.filter(pk=log.pk).update(heads=int(message.get('heads', 0)))
+        for key, value in message.items():
+            if key != 'heads' and key.isdigit() and int(key) in principle_ids:
+                shares.append(AttendanceLogShare(log=log, principle_id=int(key), shares=Decimal(str(value))))
+    AttendanceLogShare.objects.bulk_create(shares)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openslides_voting', '0004_attendance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendancelog',
+            name='heads',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='attendancelog',
+            name='created',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name='AttendanceLogShare',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shares', models.DecimalField(decimal_places=6, max_digits=15)),
+                ('log', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shares', to='openslides_voting.AttendanceLog')),
+                ('principle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='openslides_voting.VotingPrinciple')),
+            ],
+            options={
+                'default_permissions': (),
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='attendancelogshare',
+            unique_together=set([('log', 'principle')]),
+        ),
+        migrations.RunPython(convert_attendance_log_messages, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='attendancelog',
+            name='message',
+        ),
+        migrations.AddField(
+            model_name='motionpolltype',
+            name='started',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='assignmentpolltype',
+            name='started',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
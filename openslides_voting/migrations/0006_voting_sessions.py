@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def link_authorized_voters(apps, schema_editor):
+    """
+    Links the existing AuthorizedVoters object to the first voting session.
+    """
+    AuthorizedVoters = apps.get_model('openslides_voting', 'AuthorizedVoters')
+    VotingController = apps.get_model('openslides_voting', 'VotingController')
+    controller = VotingController.objects.order_by('pk').first()
+    if controller is None:
+        controller = VotingController.objects.create()
+    # Use update() because save() of the model would trigger autoupdate.
+    AuthorizedVoters.objects.filter(controller=None).update(controller=controller)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0008_changed_logo_fields'),
+        ('openslides_voting', '0005_attendancelog_time_series'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='votingcontroller',
+            name='name',
+            field=models.CharField(blank=True, default='', max_length=128),
+        ),
+        migrations.AddField(
+            model_name='votingcontroller',
+            name='first_keypad',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='votingcontroller',
+            name='last_keypad',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='votingcontroller',
+            name='projector',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.Projector'),
+        ),
+        migrations.AlterField(
+            model_name='votingcontroller',
+            name='principle',
+            field=models.ForeignKey(
+                blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL,
+                related_name='voting_controllers', to='openslides_voting.VotingPrinciple'),
+        ),
+        migrations.AddField(
+            model_name='authorizedvoters',
+            name='controller',
+            field=models.OneToOneField(
+                null=True, on_delete=django.db.models.deletion.CASCADE, related_name='authorized_voters',
+                to='openslides_voting.VotingController'),
+        ),
+        migrations.RunPython(link_authorized_voters, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='authorizedvoters',
+            name='controller',
+            field=models.OneToOneField(
+                on_delete=django.db.models.deletion.CASCADE, related_name='authorized_voters',
+                to='openslides_voting.VotingController'),
+        ),
+        migrations.AddField(
+            model_name='authorizedvoter',
+            name='controller',
+            field=models.ForeignKey(
+                default=1, on_delete=django.db.models.deletion.CASCADE, related_name='voters',
+                to='openslides_voting.VotingController'),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='authorizedvoter',
+            name='voter',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='authorized_voters', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='authorizedvoter',
+            unique_together=set([('controller', 'voter')]),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def create_generations(apps, schema_editor):
+    """
+    Creates the generation counters.
+    """
+    VotingGeneration = apps.get_model('openslides_voting', 'VotingGeneration')
+    VotingGeneration.objects.bulk_create([
+        VotingGeneration(name=name) for name in ('voting', 'admission', 'shares', 'principles')])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('openslides_voting', '0006_voting_sessions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VotingGeneration',
+            fields=[
+                ('name', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'default_permissions': (),
+            },
+        ),
+        migrations.RunPython(create_generations, migrations.RunPython.noop),
+    ]
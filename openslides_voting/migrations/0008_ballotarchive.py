@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0005_auto_20180822_1042'),
+        ('motions', '0010_auto_20180822_1042'),
+        ('openslides_voting', '0007_votinggeneration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BallotArchive',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ballots', models.PositiveIntegerField(default=0)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('data', models.BinaryField()),
+                ('assignment_poll', models.OneToOneField(
+                    blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+',
+                    to='assignments.AssignmentPoll')),
+                ('motion_poll', models.OneToOneField(
+                    blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+',
+                    to='motions.MotionPoll')),
+            ],
+            options={
+                'default_permissions': (),
+            },
+        ),
+    ]
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+
+from django.db import migrations, models
+
+
+# A copy of the vote encoding of votecodec.py at the time of this migration, so later
+# changes of the codec do not change this migration.
+KIND_JSON = 0
+KIND_YNA = 1
+KIND_VOTES = 2
+KIND_SPECIAL = 3
+KIND_VOTES_ORDERED = 4
+
+YNA_VALUES = (None, 'Y', 'N', 'A')
+YNA_CODES = {'Y': 1, 'N': 2, 'A': 3}
+SPECIAL_VALUES = ('A', 'N', 'invalid')
+
+
+def encode_json(vote):
+    return bytes((KIND_JSON, )) + json.dumps(vote, separators=(',', ':')).encode('utf-8')
+
+
+def encode_vote(vote, candidate_ids):
+    index = {str(candidate_id): i for i, candidate_id in enumerate(candidate_ids)}
+    if isinstance(vote, dict):
+        if not vote:
+            return b''
+        codes = [0] * len(candidate_ids)
+        for candidate_id, value in vote.items():
+            candidate_id = str(candidate_id)
+            if candidate_id not in index or value not in YNA_CODES:
+                return encode_json(vote)
+            codes[index[candidate_id]] = YNA_CODES[value]
+        data = bytearray((KIND_YNA, ))
+        for i in range(0, len(codes), 4):
+            byte = 0
+            for shift, code in enumerate(codes[i:i + 4]):
+                byte |= code << (2 * shift)
+            data.append(byte)
+        return bytes(data)
+    if isinstance(vote, list):
+        indices = [index.get(candidate_id) for candidate_id in vote]
+        if not indices or None in indices or len(set(indices)) != len(indices):
+            return encode_json(vote)
+        if indices != sorted(indices):
+            if max(indices) > 255:
+                return encode_json(vote)
+            return bytes((KIND_VOTES_ORDERED, )) + bytes(indices)
+        mask = 0
+        for i in indices:
+            mask |= 1 << i
+        return bytes((KIND_VOTES, )) + mask.to_bytes((len(candidate_ids) + 7) // 8, 'little')
+    if vote in SPECIAL_VALUES:
+        return bytes((KIND_SPECIAL, SPECIAL_VALUES.index(vote)))
+    return encode_json(vote)
+
+
+def decode_vote(data, candidate_ids):
+    data = bytes(data or b'')
+    if not data:
+        return {}
+    kind = data[0]
+    if kind == KIND_YNA:
+        codes = [(byte >> shift) & 3 for byte in data[1:] for shift in (0, 2, 4, 6)]
+        return {
+            str(candidate_id): YNA_VALUES[code]
+            for candidate_id, code in zip(candidate_ids, codes) if code}
+    if kind == KIND_VOTES:
+        bits = [(byte >> shift) & 1 for byte in data[1:] for shift in range(8)]
+        return [str(candidate_id) for candidate_id, bit in zip(candidate_ids, bits) if bit]
+    if kind == KIND_VOTES_ORDERED:
+        return [str(candidate_ids[i]) for i in data[1:]]
+    if kind == KIND_SPECIAL:
+        return SPECIAL_VALUES[data[1]]
+    return json.loads(data[1:].decode('utf-8'))
+
+
+def get_candidate_ids(apps):
+    """
+    Returns the candidate ids of all assignment polls in option order.
+    """
+    AssignmentOption = apps.get_model('assignments', 'AssignmentOption')
+    candidates = {}
+    for poll_id, candidate_id in AssignmentOption.objects.order_by('poll_id', 'pk').values_list(
+            'poll_id', 'candidate_id'):
+        candidates.setdefault(poll_id, []).append(candidate_id)
+    return candidates
+
+
+def update_grouped(queryset, field, values):
+    """
+    Updates the field of all rows with one query per distinct value.
+    values: {<key>: (<value>, [<pk>, ...])}
+    """
+    for value, pks in values.values():
+        for i in range(0, len(pks), 500):
+            queryset.filter(pk__in=pks[i:i + 500]).update(**{field: value})
+
+
+def encode_votes(apps, schema_editor):
+    """
+    Encodes the votes of all assignment poll ballots.
+    """
+    AssignmentPollBallot = apps.get_model('openslides_voting', 'AssignmentPollBallot')
+    candidates = get_candidate_ids(apps)
+    values = {}
+    for pk, poll_id, vote in AssignmentPollBallot.objects.values_list('pk', 'poll_id', 'vote'):
+        data = encode_vote(vote, candidates.get(poll_id, ()))
+        values.setdefault(data, (data, []))[1].append(pk)
+    update_grouped(AssignmentPollBallot.objects.all(), 'vote_data', values)
+
+
+def decode_votes(apps, schema_editor):
+    """
+    Decodes the votes of all assignment poll ballots.
+    """
+    AssignmentPollBallot = apps.get_model('openslides_voting', 'AssignmentPollBallot')
+    candidates = get_candidate_ids(apps)
+    values = {}
+    for pk, poll_id, data in AssignmentPollBallot.objects.values_list('pk', 'poll_id', 'vote_data'):
+        vote = decode_vote(data, candidates.get(poll_id, ()))
+        values.setdefault(json.dumps(vote, sort_keys=True), (vote, []))[1].append(pk)
+    update_grouped(AssignmentPollBallot.objects.all(), 'vote', values)
+
+
+def create_generation(apps, schema_editor):
+    VotingGeneration = apps.get_model('openslides_voting', 'VotingGeneration')
+    VotingGeneration.objects.get_or_create(name='candidates')
+
+
+def delete_generation(apps, schema_editor):
+    VotingGeneration = apps.get_model('openslides_voting', 'VotingGeneration')
+    VotingGeneration.objects.filter(name='candidates').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assignments', '0005_auto_20180822_1042'),
+        ('openslides_voting', '0008_ballotarchive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignmentpollballot',
+            name='vote_data',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.RunPython(encode_votes, decode_votes),
+        migrations.RemoveField(
+            model_name='assignmentpollballot',
+            name='vote',
+        ),
+        migrations.RunPython(create_generation, delete_generation),
+    ]
@@ -1,20 +1,29 @@
+import math
 import random
 
-from django.db import models
+from django.conf import settings
+from django.db import connection, models
+from django.db.models import Count, Max, Min
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
 from django.utils.translation import ugettext as _
 from jsonfield import JSONField
 
 from openslides.assignments.models import Assignment, AssignmentPoll
 from openslides.motions.models import Motion, MotionPoll
 from openslides.users.models import User
+from openslides.utils.autoupdate import inform_changed_data, inform_deleted_data
 from openslides.utils.exceptions import OpenSlidesError
 from openslides.utils.models import RESTModelMixin
 
+from . import querybudget
 from .access_permissions import (
+    AttendanceAccessPermissions,
     AssignmentAbsenteeVoteAccessPermissions,
     AssignmentPollBallotAccessPermissions,
     AssignmentPollTypeAccessPermissions,
     AttendanceLogAccessPermissions,
+    AuthorizedVoterAccessPermissions,
     AuthorizedVotersAccessPermissions,
     KeypadAccessPermissions,
     MotionAbsenteeVoteAccessPermissions,
@@ -25,7 +34,21 @@ from .access_permissions import (
     VotingPrincipleAccessPermissions,
     VotingShareAccessPermissions,
     VotingProxyAccessPermissions,
+    VoteCollectorReceiverAccessPermissions,
 )
+from .votecodec import decode_vote, encode_vote
+
+
+# Larger lists of ids are not sent as IN clause (SQLite limits the number of parameters).
+MAX_IN_CLAUSE = 500
+
+
+def chunked(values, size):
+    """
+    Yields slices of the list values with at most size items, e. g. for IN clauses.
+    """
+    for index in range(0, len(values), size):
+        yield values[index:index + size]
 
 
 # Workaroud, that we cannot add a foreign key to motions or assignment to VotingPrinciple.
@@ -72,22 +95,10 @@ class VotingPrinciple(RESTModelMixin, models.Model):
         Gets a voting principle for a motion or assignment.
         If one and only one voting principle exists without any motion or assignment relationships
         that principle is returned as the principle to be used for all motions and assignments.
+        The principles are looked up in the in-process principle index.
         """
-        principle = None
-        try:
-            if motion:
-                principle = VotingPrinciple.objects.get(motions=motion)
-            elif assignment:
-                principle = VotingPrinciple.objects.get(assignments=assignment)
-        except VotingPrinciple.DoesNotExist:
-            if VotingPrinciple.objects.count() == 1:
-                try:
-                    principle = VotingPrinciple.objects.get(motions=None, assignments=None)
-                except VotingPrinciple.DoesNotExist:
-                    pass
-        except VotingPrinciple.MultipleObjectsReturned:
-            pass
-        return principle
+        from .cache import principle_index
+        return principle_index.get(motion=motion, assignment=assignment)
 
 
 class VotingShare(RESTModelMixin, models.Model):
@@ -105,10 +116,103 @@ class VotingShare(RESTModelMixin, models.Model):
         return '%s, %s, %s' % (self.delegate, self.principle, self.shares)
 
 
+class VotingController(RESTModelMixin, models.Model):
+    """
+    A voting session, e. g. of one room. Provides device and voting status information.
+    Each session has its own authorized voters, an optional range of keypad numbers and
+    an optional projector for the voting prompt. The first session (pk=1) is created
+    during migrations and cannot be deleted.
+    """
+    access_permissions = VotingControllerAccessPermissions()
+
+    name = models.CharField(max_length=128, blank=True, default='')
+    first_keypad = models.IntegerField(null=True, blank=True)
+    last_keypad = models.IntegerField(null=True, blank=True)
+    projector = models.ForeignKey(
+        'core.Projector', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    device_status = models.CharField(max_length=200, default='No device')
+    voting_mode = models.CharField(max_length=50, null=True)
+    voting_target = models.IntegerField(default=0)
+    voting_duration = models.IntegerField(default=0)
+    votes_count = models.IntegerField(default=0)
+    votes_received = models.IntegerField(default=0)
+    is_voting = models.BooleanField(default=False)
+    principle = models.ForeignKey(
+        VotingPrinciple, on_delete=models.SET_NULL, null=True, blank=True, related_name='voting_controllers')
+
+    class Meta:
+        default_permissions = ()
+        permissions = (
+            ('can_manage', 'Can manage voting'),
+            ('can_see_token_voting', 'Can see the token voting interface'),
+            ('can_vote', 'Can vote'),
+        )
+
+    def save(self, *args, **kwargs):
+        created = self.pk is None
+        super().save(*args, **kwargs)
+        if created:
+            AuthorizedVoters.objects.create(controller=self)
+
+    def delete(self, *args, **kwargs):
+        if self.pk == 1:
+            raise OpenSlidesError('The first voting session cannot be deleted.')
+        if self.is_voting:
+            raise OpenSlidesError('A voting session cannot be deleted while it is voting.')
+        return super().delete(*args, **kwargs)
+
+    def __str__(self):
+        return self.name or self.device_status
+
+    @classmethod
+    def get_voting(cls, voting_modes, voting_target):
+        """
+        Returns the session voting on the target in one of the given voting modes
+        (e. g. ('MotionPoll', 'AssignmentPoll') and a poll id) or None.
+        """
+        return cls.objects.filter(
+            is_voting=True, voting_mode__in=voting_modes, voting_target=voting_target).first()
+
+    def has_keypad_range(self):
+        return self.first_keypad is not None or self.last_keypad is not None
+
+    def owns(self, number):
+        """
+        Returns True if the keypad number is in the range of this session. Sessions
+        without a range own all keypads.
+        """
+        return ((self.first_keypad is None or number >= self.first_keypad) and
+                (self.last_keypad is None or number <= self.last_keypad))
+
+    def overlaps(self, first, last):
+        """
+        Returns True if the keypad range first..last (None for open ends) and the range
+        of this session overlap.
+        """
+        return ((self.first_keypad is None or last is None or last >= self.first_keypad) and
+                (self.last_keypad is None or first is None or first <= self.last_keypad))
+
+    def get_keypad_filter(self, field='number'):
+        """
+        Returns a Q object selecting the keypads of this session by the given number field,
+        e. g. 'keypad__number' for users.
+        """
+        q = models.Q()
+        if self.first_keypad is not None:
+            q &= models.Q(**{field + '__gte': self.first_keypad})
+        if self.last_keypad is not None:
+            q &= models.Q(**{field + '__lte': self.last_keypad})
+        return q
+
+
 class AuthorizedVoters(RESTModelMixin, models.Model):
+    """
+    The type and poll of the current voting of a session. The authorized voters are
+    stored as AuthorizedVoter objects.
+    """
     access_permissions = AuthorizedVotersAccessPermissions()
-    authorized_voters = JSONField(default=[])
 
+    controller = models.OneToOneField(VotingController, on_delete=models.CASCADE, related_name='authorized_voters')
     motion_poll = models.OneToOneField(MotionPoll, on_delete=models.SET_NULL, null=True, blank=True)
     assignment_poll = models.OneToOneField(AssignmentPoll, on_delete=models.SET_NULL, null=True, blank=True)
     type = models.CharField(max_length=128, default='analog')
@@ -119,57 +223,121 @@ class AuthorizedVoters(RESTModelMixin, models.Model):
     def delete(self, *args, **kwargs):
         raise OpenSlidesError('The AuthorizedVoters object cannot be deleted.')
 
-    @classmethod
-    def set_voting(cls, delegates, voting_type, motion_poll=None, assignment_poll=None):
-        instance = cls.objects.get()
-        instance.authorized_voters = delegates
-        instance.type = voting_type
-        instance.motion_poll = motion_poll
-        instance.assignment_poll = assignment_poll
-        instance.save()
+    def set_voting(self, delegates, voting_type, motion_poll=None, assignment_poll=None):
+        self.type = voting_type
+        self.motion_poll = motion_poll
+        self.assignment_poll = assignment_poll
+        self.save()
+        AuthorizedVoter.update_voters(self.controller_id, delegates)
+        from . import coherence
+        coherence.generations.bump(coherence.VOTING)
 
-    @classmethod
-    def update_delegates(cls, delegates):
-        instance = cls.objects.get()
-        print(delegates)
-        instance.authorized_voters = delegates
-        print(instance.authorized_voters)
-        instance.save()
+    def update_delegates(self, delegates):
+        AuthorizedVoter.update_voters(self.controller_id, delegates)
 
-    @classmethod
-    def clear_voting(cls):
-        cls.set_voting([], '', motion_poll=None, assignment_poll=None)
+    def clear_voting(self):
+        self.set_voting(None, '', motion_poll=None, assignment_poll=None)
 
 
-class VotingController(RESTModelMixin, models.Model):
+class AuthorizedVoter(RESTModelMixin, models.Model):
     """
-    VotingController model. Provides device and voting status information.
-    Currently only one votingcontroller is supported (pk=1).
+    A voter authorized to vote in the current voting of a session and the delegates the
+    voter represents.
     """
-    access_permissions = VotingControllerAccessPermissions()
+    access_permissions = AuthorizedVoterAccessPermissions()
 
-    device_status = models.CharField(max_length=200, default='No device')
-    voting_mode = models.CharField(max_length=50, null=True)
-    voting_target = models.IntegerField(default=0)
-    voting_duration = models.IntegerField(default=0)
-    votes_count = models.IntegerField(default=0)
-    votes_received = models.IntegerField(default=0)
-    is_voting = models.BooleanField(default=False)
-    principle = models.OneToOneField(VotingPrinciple, on_delete=models.SET_NULL, null=True, blank=True)
+    controller = models.ForeignKey(VotingController, on_delete=models.CASCADE, related_name='voters')
+    voter = models.ForeignKey(User, on_delete=models.CASCADE, related_name='authorized_voters')
+    delegates = JSONField(default=[])
 
     class Meta:
         default_permissions = ()
-        permissions = (
-            ('can_manage', 'Can manage voting'),
-            ('can_see_token_voting', 'Can see the token voting interface'),
-            ('can_vote', 'Can vote'),
-        )
+        unique_together = ('controller', 'voter')
 
-    def delete(self, *args, **kwargs):
-        raise OpenSlidesError('The VotingController object cannot be deleted.')
+    @classmethod
+    def update_voters(cls, controller_id, delegates):
+        """
+        Updates the authorized voters of a session to the given dictionary
+        {<voter_id>: [<delegate_id>]} (or None for no voters). Only changed voters are
+        written and sent to the clients.
+        """
+        voters = {int(voter_id): list(ids) for voter_id, ids in (delegates or {}).items()}
+        for voter_id in cls.objects.filter(controller_id=controller_id).values_list('voter_id', flat=True):
+            voters.setdefault(voter_id, [])
+        cls.set_voters(controller_id, voters)
 
-    def __str__(self):
-        return self.device_status
+    @classmethod
+    def set_voters(cls, controller_id, voters):
+        """
+        Sets the delegates of the given voters {<voter_id>: [<delegate_id>]} of a session.
+        Voters with an empty list are removed, other voters are not touched. Only changed
+        voters are written and sent to the clients.
+        """
+        session_voters = cls.objects.filter(controller_id=controller_id)
+        if len(voters) > MAX_IN_CLAUSE:
+            # Avoid huge IN clauses, e. g. when a voting starts.
+            existing = {voter.voter_id: voter for voter in session_voters if voter.voter_id in voters}
+        else:
+            existing = {voter.voter_id: voter for voter in session_voters.filter(voter_id__in=voters.keys())}
+
+        deleted = []
+        changed = []
+        created = []
+        for voter_id, ids in voters.items():
+            voter = existing.get(voter_id)
+            if not ids:
+                if voter is not None:
+                    deleted.append(voter)
+            elif voter is None:
+                created.append(cls(controller_id=controller_id, voter_id=voter_id, delegates=ids))
+            elif voter.delegates != ids:
+                voter.delegates = ids
+                changed.append(voter)
+
+        # One query per changed voter.
+        querybudget.allow(len(changed))
+        for voter in changed:
+            voter.save(skip_autoupdate=True)
+        if deleted:
+            pks = [voter.pk for voter in deleted]
+            querybudget.allow(len(pks) // MAX_IN_CLAUSE)
+            for index in range(0, len(pks), MAX_IN_CLAUSE):
+                cls.objects.filter(pk__in=pks[index:index + MAX_IN_CLAUSE]).delete()
+            inform_deleted_data([(cls.get_collection_string(), pk) for pk in pks])
+        if created:
+            cls.objects.bulk_create(created)
+            # Reload the created voters because bulk_create does not set the pks on all databases.
+            created_ids = {voter.voter_id for voter in created}
+            if len(created_ids) > MAX_IN_CLAUSE:
+                changed.extend(voter for voter in session_voters if voter.voter_id in created_ids)
+            else:
+                changed.extend(session_voters.filter(voter_id__in=created_ids))
+        if changed:
+            inform_changed_data(changed)
+        if changed or deleted:
+            from . import coherence
+            coherence.generations.bump(coherence.ADMISSION)
+
+    @classmethod
+    def get_authorized(cls, controller_id, user_ids):
+        """
+        Returns the set of the given user ids which are authorized voters of the session.
+        Looks up the given voters only, using the unique index of (controller, voter).
+        """
+        user_ids = sorted(set(user_ids))
+        querybudget.allow(len(user_ids) // MAX_IN_CLAUSE)
+        authorized = set()
+        for ids in chunked(user_ids, MAX_IN_CLAUSE):
+            authorized.update(cls.objects.filter(controller_id=controller_id, voter_id__in=ids).values_list(
+                'voter_id', flat=True))
+        return authorized
+
+    @classmethod
+    def is_authorized(cls, controller_id, user):
+        """
+        Returns True if the user is an authorized voter of the session.
+        """
+        return user is not None and cls.objects.filter(controller_id=controller_id, voter_id=user.id).exists()
 
 
 class Keypad(RESTModelMixin, models.Model):
@@ -183,6 +351,13 @@ class Keypad(RESTModelMixin, models.Model):
     class Meta:
         default_permissions = ()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded user to detect reassignments on save.
+        instance.loaded_user_id = instance.__dict__.get('user_id')
+        return instance
+
     def __str__(self):
         if self.user is not None:
             return _('Keypad %(kp)d (%(user)s)') % {
@@ -190,6 +365,52 @@ class Keypad(RESTModelMixin, models.Model):
         return _('Keypad %d') % self.number
 
 
+class VoteCollectorReceiver(RESTModelMixin, models.Model):
+    """
+    A VoteCollector endpoint owning a range of keypad numbers. If no receiver exists
+    the VoteCollector configured by voting_votecollector_uri owns all keypads.
+    """
+    access_permissions = VoteCollectorReceiverAccessPermissions()
+
+    name = models.CharField(max_length=128)
+    uri = models.CharField(max_length=200)
+    first_keypad = models.IntegerField(null=True, blank=True)
+    last_keypad = models.IntegerField(null=True, blank=True)
+    device_status = models.CharField(max_length=200, default='No device')
+    votes_received = models.IntegerField(default=0)
+    is_voting = models.BooleanField(default=False)
+
+    class Meta:
+        default_permissions = ()
+        ordering = ('first_keypad',)
+
+    def __str__(self):
+        return '%s (%s)' % (self.name, self.uri)
+
+    def owns(self, number):
+        """
+        Returns True if the keypad number is in the range of this receiver.
+        """
+        return ((self.first_keypad is None or number >= self.first_keypad) and
+                (self.last_keypad is None or number <= self.last_keypad))
+
+    @classmethod
+    def add_votes_received(cls, keypad_numbers):
+        """
+        Increments the received votes counter of the receivers owning the given keypads.
+        Called by the poller with the keypads of the accepted votes (see ReceiverCounter).
+        """
+        counts = {}
+        for receiver in cls.objects.all():
+            count = sum(1 for number in keypad_numbers if receiver.owns(number))
+            if count:
+                counts[receiver.pk] = count
+        for pk, count in counts.items():
+            cls.objects.filter(pk=pk).update(votes_received=models.F('votes_received') + count)
+        if counts:
+            inform_changed_data(cls.objects.filter(pk__in=counts.keys()))
+
+
 class VotingProxy(RESTModelMixin, models.Model):
     access_permissions = VotingProxyAccessPermissions()
 
@@ -234,6 +455,16 @@ class AssignmentAbsenteeVote(RESTModelMixin, models.Model):
 
 
 class PollBallot:
+    # The model field holding the vote, decoded by decode_vote.
+    vote_field = 'vote'
+
+    @classmethod
+    def decode_vote(cls, poll_id, value):
+        """
+        Returns the vote of a value of the vote field of a ballot of the given poll.
+        """
+        return value
+
     @classmethod
     def get_next_result_token(cls, used_tokens):
         if len(used_tokens) == 0:
@@ -276,14 +507,38 @@ class AssignmentPollBallot(RESTModelMixin, models.Model, PollBallot):
 
     poll = models.ForeignKey(AssignmentPoll, on_delete=models.CASCADE)
     delegate = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
-    vote = JSONField(default={})
+    # The vote in the compact encoding of votecodec.py. Use the vote property.
+    vote_data = models.BinaryField(default=b'')
     device = models.CharField(max_length=32, null=True)
     result_token = models.PositiveIntegerField()
     is_dummy = models.BooleanField(default=False)
 
+    vote_field = 'vote_data'
+
     class Meta:
         default_permissions = ()
 
+    @property
+    def vote(self):
+        """
+        The vote: {<candidate_id>: 'Y'|'N'|'A'} for yn/yna polls, [<candidate_id>, ...] or
+        'A', 'N', 'invalid' for votes polls.
+        """
+        return self.decode_vote(self.poll_id, self.vote_data)
+
+    @vote.setter
+    def vote(self, vote):
+        from .cache import candidate_index
+        self.vote_data = encode_vote(vote, candidate_index.get(self.poll_id))
+
+    @classmethod
+    def decode_vote(cls, poll_id, vote_data):
+        """
+        Decodes the vote_data of a ballot of the given poll.
+        """
+        from .cache import candidate_index
+        return decode_vote(vote_data, candidate_index.get(poll_id))
+
     def __str__(self):
         return '%s, %s, %s' % (self.poll, self.delegate, self.vote)
 
@@ -305,6 +560,7 @@ class MotionPollType(RESTModelMixin, models.Model):
 
     poll = models.OneToOneField(MotionPoll, on_delete=models.CASCADE)
     type = models.CharField(max_length=32, default=POLLTYPES[0][0], choices=POLLTYPES)
+    started = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         default_permissions = ()
@@ -315,24 +571,180 @@ class AssignmentPollType(RESTModelMixin, models.Model):
 
     poll = models.OneToOneField(AssignmentPoll, on_delete=models.CASCADE)
     type = models.CharField(max_length=32, default=POLLTYPES[0][0], choices=POLLTYPES)
+    started = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         default_permissions = ()
 
 
-# TODO: Add voting timestamp to Poll model.
+class Attendance(RESTModelMixin, models.Model):
+    """
+    The current attendance: total shares (all, attending, in person, represented) per
+    voting principle, see voting.get_total_shares. Only one object exists (pk=1).
+    """
+    access_permissions = AttendanceAccessPermissions()
+
+    shares = JSONField(default={})
+    updated = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        default_permissions = ()
+
+    def delete(self, *args, **kwargs):
+        raise OpenSlidesError('The Attendance object cannot be deleted.')
+
+
+# SQL of the interval number of a timestamp column for get_history, per database vendor.
+HISTORY_BUCKET_SQL = {
+    'sqlite': "CAST(strftime('%%s', {column}) AS INTEGER) / %s",
+    'postgresql': 'FLOOR(EXTRACT(EPOCH FROM {column}) / %s)',
+    'mysql': 'FLOOR(UNIX_TIMESTAMP({column}) / %s)',
+}
+
+
+def get_history_max_samples():
+    """
+    Returns the maximum number of attendance samples returned by the history.
+    """
+    return getattr(settings, 'VOTING_ATTENDANCE_HISTORY_MAX_SAMPLES', 1000)
+
+
+class AttendanceLogManager(models.Manager):
+    """
+    Customized model manager to support our get_full_queryset method.
+    """
+    def get_full_queryset(self):
+        return self.get_queryset().prefetch_related('shares')
+
+
 class AttendanceLog(RESTModelMixin, models.Model):
+    """
+    A sample of the attendance history: the attending heads and the attending shares
+    per voting principle (AttendanceLogShare) at a point of time.
+    """
     access_permissions = AttendanceLogAccessPermissions()
+    objects = AttendanceLogManager()
 
-    message = JSONField()
-    created = models.DateTimeField(auto_now=True)
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+    heads = models.IntegerField(default=0)
 
     class Meta:
         default_permissions = ()
         ordering = ['-created']
 
     def __str__(self):
-        return '%s | %s' % (self.created.strftime('%Y-%m-%d %H:%M') if self.created else '-', self.message)
+        return '%s | %d' % (self.created.strftime('%Y-%m-%d %H:%M') if self.created else '-', self.heads)
+
+    def get_shares(self):
+        """
+        Returns the attending shares {<principle_id>: <shares>}.
+        """
+        return {share.principle_id: share.shares for share in self.shares.all()}
+
+    @classmethod
+    def add(cls, total_shares):
+        """
+        Adds a sample of the attending heads and shares of voting.get_total_shares.
+        """
+        log = cls(heads=total_shares['heads'][1])
+        log.save(skip_autoupdate=True)
+        AttendanceLogShare.objects.bulk_create([
+            AttendanceLogShare(log=log, principle_id=key, shares=values[1])
+            for key, values in total_shares.items() if key != 'heads'])
+        inform_changed_data(log)
+        return log
+
+    @classmethod
+    def clear(cls, before=None):
+        """
+        Deletes all samples or all samples created before the given time with one query
+        per table. Returns the number of deleted samples.
+        """
+        logs = cls.objects.all()
+        if before is not None:
+            logs = logs.filter(created__lt=before)
+        pks = list(logs.values_list('pk', flat=True))
+        if pks:
+            AttendanceLogShare.objects.filter(log__in=logs).delete()
+            logs.delete()
+            inform_deleted_data([(cls.get_collection_string(), pk) for pk in pks])
+        return len(pks)
+
+    @classmethod
+    def get_at(cls, moment):
+        """
+        Returns the last sample created at or before the given time or None.
+        """
+        return cls.objects.filter(created__lte=moment).order_by('-created').first()
+
+    @classmethod
+    def get_history(cls, start=None, end=None, interval=None):
+        """
+        Returns the samples between start and end in chronological order as list of
+        {created, heads, shares: {<principle_id>: <shares>}}. If interval (seconds) is
+        given only the last sample of each interval is returned. The interval is
+        enlarged so at most VOTING_ATTENDANCE_HISTORY_MAX_SAMPLES samples are returned.
+        The intervals are grouped in the database, only the returned samples are loaded.
+        """
+        logs = cls.objects.order_by()
+        if start is not None:
+            logs = logs.filter(created__gte=start)
+        if end is not None:
+            logs = logs.filter(created__lte=end)
+
+        interval = int(interval or 0)
+        max_samples = get_history_max_samples()
+        if max_samples:
+            summary = logs.aggregate(count=Count('pk'), first=Min('created'), last=Max('created'))
+            if summary['count'] > max_samples:
+                span = (summary['last'] - summary['first']).total_seconds()
+                interval = max(interval, math.ceil(span / max_samples), 1)
+
+        bucket_sql = HISTORY_BUCKET_SQL.get(connection.vendor)
+        if interval and bucket_sql is not None:
+            # The time of the last sample of each interval.
+            column = '%s.%s' % (connection.ops.quote_name(cls._meta.db_table), connection.ops.quote_name('created'))
+            buckets = logs.annotate(bucket=RawSQL(bucket_sql.format(column=column), (interval, )))
+            lasts = sorted(row['last'] for row in buckets.values('bucket').annotate(last=Max('created')))
+            rows = []
+            for moments in chunked(lasts, MAX_IN_CLAUSE):
+                rows.extend(logs.filter(created__in=moments).values_list('pk', 'created', 'heads'))
+        else:
+            rows = list(logs.values_list('pk', 'created', 'heads'))
+
+        samples = []
+        bucket = None
+        for pk, created, heads in sorted(rows, key=lambda row: (row[1], row[0])):
+            sample = {'id': pk, 'created': created, 'heads': heads, 'shares': {}}
+            if interval:
+                # Drops samples created at the same time as the last sample of an interval
+                # and groups the samples on databases without bucket SQL.
+                current = int(created.timestamp() // interval)
+                if current == bucket:
+                    samples[-1] = sample
+                    continue
+                bucket = current
+            samples.append(sample)
+
+        by_pk = {sample['id']: sample for sample in samples}
+        for pks in chunked(sorted(by_pk), MAX_IN_CLAUSE):
+            for log_id, principle_id, value in AttendanceLogShare.objects.filter(log_id__in=pks).values_list(
+                    'log_id', 'principle_id', 'shares'):
+                by_pk[log_id]['shares'][principle_id] = value
+        return samples
+
+
+class AttendanceLogShare(models.Model):
+    """
+    The attending shares of a voting principle in an attendance log sample.
+    """
+    log = models.ForeignKey(AttendanceLog, on_delete=models.CASCADE, related_name='shares')
+    principle = models.ForeignKey(VotingPrinciple, on_delete=models.CASCADE)
+    shares = models.DecimalField(max_digits=15, decimal_places=6)
+
+    class Meta:
+        default_permissions = ()
+        unique_together = ('log', 'principle')
 
 
 class VotingToken(RESTModelMixin, models.Model):
@@ -342,3 +754,47 @@ class VotingToken(RESTModelMixin, models.Model):
 
     class Meta:
         default_permissions = ()
+
+
+class VotingGeneration(models.Model):
+    """
+    A generation counter of a part of the voting state (see coherence.py). The counter
+    is increased whenever this state changes so all worker processes notice the change.
+    """
+    name = models.CharField(max_length=32, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        default_permissions = ()
+
+
+class BallotArchive(models.Model):
+    """
+    The ballots of a closed poll packed into a compact columnar format (see archive.py).
+    The ballot rows of an archived poll are deleted.
+    """
+    motion_poll = models.OneToOneField(
+        MotionPoll, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    assignment_poll = models.OneToOneField(
+        AssignmentPoll, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    ballots = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(default=timezone.now)
+    data = models.BinaryField()
+
+    class Meta:
+        default_permissions = ()
+
+    @staticmethod
+    def get_poll_field(poll):
+        """
+        Returns the name of the field of the poll (object or model).
+        """
+        is_motion_poll = poll is MotionPoll or isinstance(poll, MotionPoll)
+        return 'motion_poll' if is_motion_poll else 'assignment_poll'
+
+    @classmethod
+    def get(cls, poll):
+        """
+        Returns the archive of the poll or None.
+        """
+        return cls.objects.filter(**{cls.get_poll_field(poll): poll}).first()
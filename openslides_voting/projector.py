@@ -6,6 +6,7 @@ from openslides.users.models import User
 from openslides.utils.projector import ProjectorElement
 
 from .models import (
+    AuthorizedVoter,
     AuthorizedVoters,
     AssignmentPollBallot,
     AssignmentPollType,
@@ -14,6 +15,15 @@ from .models import (
     VotingController,
     VotingPrinciple,
 )
+from .routers import read_database
+
+
+def get_session(voting_mode, poll_id):
+    """
+    Returns the voting session which votes or voted on the poll, else the first session.
+    """
+    sessions = VotingController.objects.filter(voting_mode=voting_mode, voting_target=poll_id)
+    return sessions.order_by('-is_voting').first() or VotingController.objects.get(pk=1)
 
 
 class MotionPollSlide(ProjectorElement):
@@ -27,29 +37,39 @@ class MotionPollSlide(ProjectorElement):
             raise ProjectorException('MotionPoll does not exist.')
 
     def get_requirements(self, config_entry):
+        # Read from the read database unless the poll is voted. The requirements are
+        # collected inside the block so the routing does not leak into the caller.
+        with read_database('MotionPoll', config_entry.get('id')):
+            requirements = list(self.get_poll_requirements(config_entry))
+        yield from requirements
+
+    def get_poll_requirements(self, config_entry):
         try:
             motionpoll = MotionPoll.objects.get(pk=config_entry.get('id'))
         except MotionPoll.DoesNotExist:
             # MotionPoll does not exist. Just do nothing.
             pass
         else:
+            vc = get_session('MotionPoll', motionpoll.pk)
             yield motionpoll.motion
             yield motionpoll.motion.agenda_item
             if config['voting_show_delegate_board']:
-                yield AuthorizedVoters.objects.get()
+                yield vc.authorized_voters
+                yield from AuthorizedVoter.objects.filter(controller=vc)
                 yield from User.objects.all()
                 yield from Keypad.objects.all()
                 yield from MotionPollBallot.objects.filter(poll=motionpoll)
             if config['voting_enable_principles']:
                 yield from VotingPrinciple.objects.filter(motions=motionpoll.motion)
-            yield VotingController.objects.get()
+            yield vc
 
     def get_collection_elements_required_for_this(self, collection_element, config_entry):
         if collection_element.collection_string == MotionPollBallot.get_collection_string():
             output = [collection_element]
         elif collection_element.collection_string == VotingController.get_collection_string():
             output = [collection_element]
-        elif collection_element.collection_string == AuthorizedVoters.get_collection_string():
+        elif collection_element.collection_string in (
+                AuthorizedVoters.get_collection_string(), AuthorizedVoter.get_collection_string()):
             output = [collection_element]
         elif collection_element.collection_string == Keypad.get_collection_string():
             output = [collection_element]
@@ -73,15 +93,24 @@ class AssignmentPollSlide(ProjectorElement):
             raise ProjectorException('AssignmentPoll does not exist.')
 
     def get_requirements(self, config_entry):
+        # Read from the read database unless the poll is voted. The requirements are
+        # collected inside the block so the routing does not leak into the caller.
+        with read_database('AssignmentPoll', config_entry.get('id')):
+            requirements = list(self.get_poll_requirements(config_entry))
+        yield from requirements
+
+    def get_poll_requirements(self, config_entry):
         try:
             assignmentpoll = AssignmentPoll.objects.get(pk=config_entry.get('id'))
         except AssignmentPoll.DoesNotExist:
             # AssignmentPoll does not exist. Just do nothing.
             pass
         else:
+            vc = get_session('AssignmentPoll', assignmentpoll.pk)
             yield assignmentpoll.assignment
             yield assignmentpoll.assignment.agenda_item
-            yield AuthorizedVoters.objects.get()
+            yield vc.authorized_voters
+            yield from AuthorizedVoter.objects.filter(controller=vc)
             for option in assignmentpoll.options.all():
                 yield option.candidate
             yield from User.objects.all()
@@ -90,14 +119,15 @@ class AssignmentPollSlide(ProjectorElement):
             yield from AssignmentPollType.objects.filter(poll=assignmentpoll)
             if config['voting_enable_principles']:
                 yield from VotingPrinciple.objects.filter(assignments=assignmentpoll.assignment)
-            yield VotingController.objects.get()
+            yield vc
 
     def get_collection_elements_required_for_this(self, collection_element, config_entry):
         if collection_element.collection_string == AssignmentPollBallot.get_collection_string():
             output = [collection_element]
         elif collection_element.collection_string == VotingController.get_collection_string():
             output = [collection_element]
-        elif collection_element.collection_string == AuthorizedVoters.get_collection_string():
+        elif collection_element.collection_string in (
+                AuthorizedVoters.get_collection_string(), AuthorizedVoter.get_collection_string()):
             output = [collection_element]
         elif collection_element.collection_string == Keypad.get_collection_string():
             output = [collection_element]
@@ -128,8 +158,17 @@ class VotingIcon(ProjectorElement):
     name = 'voting/icon'
 
 
+class VotingStats(ProjectorElement):
+    """
+    Live voting statistics of a voting session on the projector. The slide fetches them
+    from /voting/stats/.
+    """
+    name = 'voting/stats'
+
+
 def get_projector_elements():
     yield MotionPollSlide
     yield AssignmentPollSlide
     yield VotingPrompt
     yield VotingIcon
+    yield VotingStats
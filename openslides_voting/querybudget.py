@@ -0,0 +1,105 @@
+import threading
+import traceback
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def is_enforced():
+    """
+    Budgets are enforced if VOTING_QUERY_BUDGET is True, by default in debug mode.
+    """
+    return getattr(settings, 'VOTING_QUERY_BUDGET', settings.DEBUG)
+
+
+_local = threading.local()
+
+
+class QueryBudget:
+    """
+    Counts the queries of a block and raises QueryBudgetExceeded if there are more than
+    limit. The error reports the call sites with the most queries and their stacks.
+
+    Queries are recorded with an execute wrapper on Django 2.0+. Older versions capture
+    them with the debug cursor like CaptureQueriesContext, without call sites.
+    """
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self.queries = []
+
+    def __enter__(self):
+        if hasattr(connection, 'execute_wrapper'):
+            self.wrapper = connection.execute_wrapper(self.record)
+        else:
+            self.wrapper = CaptureQueriesContext(connection)
+        self.wrapper.__enter__()
+        if not hasattr(_local, 'budgets'):
+            _local.budgets = []
+        _local.budgets.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        _local.budgets.remove(self)
+        self.wrapper.__exit__(exc_type, exc_value, tb)
+        if exc_type is None and isinstance(self.wrapper, CaptureQueriesContext):
+            self.queries = [(query['sql'], []) for query in self.wrapper.captured_queries]
+        if exc_type is None and len(self.queries) > self.limit:
+            raise QueryBudgetExceeded(self.report())
+
+    def record(self, execute, sql, params, many, context):
+        self.queries.append((sql, traceback.extract_stack()[:-1]))
+        return execute(sql, params, many, context)
+
+    def report(self, sites=5):
+        """
+        Returns a message with the call sites in this app which caused most queries.
+        """
+        counter = Counter()
+        examples = {}
+        for sql, stack in self.queries:
+            frames = [frame for frame in stack
+                      if 'openslides_voting' in frame.filename and not frame.filename.endswith('querybudget.py')]
+            site = tuple((frame.filename, frame.lineno) for frame in frames[-3:])
+            counter[site] += 1
+            examples.setdefault(site, (sql, frames))
+        lines = ['{} ran {} queries, the budget is {}.'.format(self.name, len(self.queries), self.limit)]
+        for site, count in counter.most_common(sites):
+            sql, frames = examples[site]
+            lines.append('{} queries like: {}'.format(count, sql[:200]))
+            lines.extend('  ' + line.rstrip() for line in traceback.format_list(frames[-5:]))
+        return '\n'.join(lines)
+
+
+def allow(count):
+    """
+    Raises the budgets of the current thread by count queries. Used for work that grows
+    with the size of a request (e. g. ballots written for the votes of a request) and
+    not with the number of delegates.
+    """
+    for budget in getattr(_local, 'budgets', ()):
+        budget.limit += count
+
+
+def query_budget(limit):
+    """
+    Decorator declaring the maximum number of queries of a function. The budget does not
+    depend on the number of delegates. Extra work per item of a request has to be granted
+    with allow().
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not is_enforced():
+                return func(*args, **kwargs)
+            with QueryBudget(func.__qualname__, limit):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
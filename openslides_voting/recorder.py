@@ -0,0 +1,174 @@
+import glob
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+
+from django.conf import settings
+
+
+# Votings of these types are secret. Keypad numbers and user ids of the recorded requests
+# would reveal the votes after the ballots were pseudo anonymized.
+SECRET_VOTING_TYPES = ('votecollector_secret', 'votecollector_pseudo_secret')
+
+
+def get_record_dir():
+    """
+    Returns the directory voting sessions are recorded to or None if recording is disabled.
+    """
+    return getattr(settings, 'VOTING_RECORD_DIR', None)
+
+
+def is_recorded(voting_type):
+    """
+    Returns True if votings of the given type are recorded. Secret votings are only
+    recorded with VOTING_RECORD_SECRET = True.
+    """
+    if not get_record_dir():
+        return False
+    return voting_type not in SECRET_VOTING_TYPES or getattr(settings, 'VOTING_RECORD_SECRET', False)
+
+
+class Recorder:
+    """
+    Records voting sessions into NDJSON files, one file per voting:
+    <VOTING_RECORD_DIR>/<start time>-<session id>-<voting mode>-<voting target>.ndjson
+
+    The first line holds the starting state: session, voting mode, target, type, principle
+    and the admitted delegates {<voter_id>: [<delegate_id>]}. Each following line holds one
+    vote request with its time offset in seconds, the view, path and arguments, the user
+    and the verified payload (the decoded message of VoteCollector callbacks) and the
+    response status. The file is compressed with gzip when the voting stops.
+
+    All worker processes append to the same file. Each line is written with one write call.
+    Only start() creates the file, so requests after the stop are not recorded.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key (session id, voting mode, voting target): (path, start time)
+        self.files = {}
+
+    def get_file(self, key):
+        """
+        Returns the file of the voting key and its start time. Processes which did not
+        start the voting look up the newest file once.
+        """
+        path, started = self.files.get(key, (None, None))
+        if path is None or not os.path.exists(path):
+            # New voting or the file was compressed by the process which stopped the voting.
+            pattern = os.path.join(get_record_dir(), '*-%s-%s-%s.ndjson' % key)
+            paths = sorted(glob.glob(pattern))
+            path = paths[-1] if paths else None
+            started = None
+            if path:
+                try:
+                    with open(path) as f:
+                        started = json.loads(f.readline())['time']
+                except FileNotFoundError:
+                    # Stopped meanwhile.
+                    path = None
+            self.files[key] = (path, started)
+        return path, started
+
+    def write(self, path, data, create=False):
+        """
+        Appends a line to the file. Returns False if the file does not exist and create
+        is False, e. g. because the voting was stopped meanwhile.
+        """
+        line = json.dumps(data, separators=(',', ':')) + '\n'
+        flags = os.O_WRONLY | os.O_APPEND | (os.O_CREAT if create else 0)
+        with self.lock:
+            try:
+                fd = os.open(path, flags, 0o600)
+            except FileNotFoundError:
+                return False
+            with os.fdopen(fd, 'a') as f:
+                f.write(line)
+        return True
+
+    def start(self, vc, voting_type, admitted_delegates):
+        """
+        Starts recording a voting of the voting session with the given starting state.
+        Secret votings are not recorded (see is_recorded).
+        """
+        if not is_recorded(voting_type):
+            return
+        record_dir = get_record_dir()
+        os.makedirs(record_dir, exist_ok=True)
+        now = time.time()
+        key = (vc.pk, vc.voting_mode, vc.voting_target)
+        path = os.path.join(record_dir, '%s-%s-%s-%s.ndjson' % (
+            (time.strftime('%Y%m%d-%H%M%S', time.localtime(now)), ) + key))
+        self.write(path, {
+            'type': 'start',
+            'time': now,
+            'session': vc.pk,
+            'voting_mode': vc.voting_mode,
+            'voting_target': vc.voting_target,
+            'voting_type': voting_type,
+            'principle': vc.principle_id,
+            'votes_count': vc.votes_count,
+            'admitted': admitted_delegates,
+        }, create=True)
+        self.files[key] = (path, now)
+
+    def record(self, key, view, request, kwargs, payload, status):
+        """
+        Records a vote request of the voting key (session id, voting mode, voting target).
+        """
+        if not get_record_dir():
+            return
+        path, started = self.get_file(key)
+        if path is None:
+            return
+        # Form fields besides the authentication, e. g. of speaker list callbacks.
+        form = {name: value for name, value in request.POST.items() if name != 'auth'} or None
+        self.write(path, {
+            't': round(time.time() - started, 4),
+            'v': view,
+            'p': request.path,
+            'k': kwargs,
+            'u': request.user.pk if request.user.is_authenticated else None,
+            'b': payload,
+            'f': form,
+            's': status,
+        })
+
+    def stop(self, vc):
+        """
+        Stops recording the voting of the voting session and compresses the file.
+        """
+        if not get_record_dir():
+            return
+        key = (vc.pk, vc.voting_mode, vc.voting_target)
+        path, started = self.get_file(key)
+        if path is None:
+            return
+        self.write(path, {'type': 'stop', 't': round(time.time() - started, 4)})
+        with self.lock:
+            # Move the file away first, so other processes stop appending to it.
+            stopped = path + '.stopped'
+            try:
+                os.rename(path, stopped)
+            except FileNotFoundError:
+                return
+            with open(stopped, 'rb') as source, gzip.open(path + '.gz', 'wb') as target:
+                shutil.copyfileobj(source, target)
+            os.remove(stopped)
+            self.files.pop(key, None)
+
+
+recorder = Recorder()
+
+
+def open_recording(path):
+    """
+    Returns an iterator over the records of a recording (.ndjson or .ndjson.gz).
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,90 @@
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+ROUTER = 'openslides_voting.routers.ReadDatabaseRouter'
+
+_local = threading.local()
+
+
+def get_read_database():
+    """
+    Returns the read-only database alias of VOTING_READ_DATABASE or None if no read
+    database is configured or the router is not installed. The read database is not used
+    if the generation counters are disabled because they guard its freshness.
+    """
+    from .coherence import is_enabled
+    alias = getattr(settings, 'VOTING_READ_DATABASE', None)
+    if not alias or alias not in settings.DATABASES or ROUTER not in getattr(settings, 'DATABASE_ROUTERS', ()):
+        return None
+    if not is_enabled():
+        return None
+    return alias
+
+
+def is_fresh(alias):
+    """
+    Returns True if the read database has all changes of the voting state, i. e. its
+    generation counters (see coherence.py) equal the counters of the primary database.
+    Votings started or stopped, changed ballots and cleared ballots increase the counters.
+    """
+    from .models import VotingGeneration
+    primary = dict(VotingGeneration.objects.using(DEFAULT_DB_ALIAS).values_list('name', 'value'))
+    replica = dict(VotingGeneration.objects.using(alias).values_list('name', 'value'))
+    return primary == replica
+
+
+@contextmanager
+def read_database(voting_mode=None, poll_id=None):
+    """
+    Routes all reads of the block to the read database. Reads of a poll which is the
+    target of an active voting and reads while the read database lags behind the primary
+    go to the primary database. Writes always go to the primary database.
+
+    Yields the alias used for reads (None for the primary database).
+    """
+    from .models import VotingController
+    alias = get_read_database()
+    if alias is not None and poll_id is not None and VotingController.get_voting((voting_mode, ), poll_id):
+        # The ballots of an active voting change with every vote.
+        alias = None
+    if alias is not None and not is_fresh(alias):
+        alias = None
+    previous = getattr(_local, 'alias', None)
+    _local.alias = alias
+    try:
+        yield alias
+    finally:
+        _local.alias = previous
+
+
+class ReadDatabaseRouter:
+    """
+    Database router for the read paths of the voting app. Add it to the settings:
+
+    DATABASE_ROUTERS = ['openslides_voting.routers.ReadDatabaseRouter']
+    VOTING_READ_DATABASE = '<alias of the read-only database>'
+
+    Reads are routed inside read_database() blocks only. All writes go to the primary
+    database, also for objects loaded from the read database. The models are imported
+    lazily because routers are loaded before the apps are ready.
+    """
+    def db_for_read(self, model, **hints):
+        return getattr(_local, 'alias', None)
+
+    def db_for_write(self, model, **hints):
+        if get_read_database() is None:
+            return None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if get_read_database() is None:
+            return None
+        # The read database is a copy of the primary database.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
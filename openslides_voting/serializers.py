@@ -1,26 +1,37 @@
-from openslides.utils.rest_api import ModelSerializer, JSONField, ValidationError
+from openslides.utils.rest_api import ModelSerializer, JSONField, SerializerMethodField, ValidationError
 
 from . import models
 
 
 class AuthorizedVotersSerializer(ModelSerializer):
-    authorized_voters = JSONField()
     class Meta:
         model = models.AuthorizedVoters
         fields = (
             'id',
-            'authorized_voters',
+            'controller',
             'type',
             'motion_poll',
             'assignment_poll',
         )
 
 
+class AuthorizedVoterSerializer(ModelSerializer):
+    delegates = JSONField()
+
+    class Meta:
+        model = models.AuthorizedVoter
+        fields = ('id', 'controller', 'voter', 'delegates', )
+
+
 class VotingControllerSerializer(ModelSerializer):
     class Meta:
         model = models.VotingController
         fields = (
             'id',
+            'name',
+            'first_keypad',
+            'last_keypad',
+            'projector',
             'device_status',
             'voting_mode',
             'voting_target',
@@ -30,6 +41,23 @@ class VotingControllerSerializer(ModelSerializer):
             'is_voting',
             'principle',
         )
+        read_only_fields = ('device_status', 'voting_mode', 'voting_target', 'voting_duration', 'votes_count',
+                            'votes_received', 'is_voting', 'principle', )
+
+    def validate(self, data):
+        first = data.get('first_keypad', getattr(self.instance, 'first_keypad', None))
+        last = data.get('last_keypad', getattr(self.instance, 'last_keypad', None))
+        if first is not None and last is not None and first > last:
+            raise ValidationError({'detail': 'The first keypad number must not be greater than the last one.'})
+        # Open ends are unbounded, e. g. a session without a range owns all keypads.
+        others = models.VotingController.objects.all()
+        if self.instance is not None:
+            others = others.exclude(pk=self.instance.pk)
+        for other in others:
+            if other.overlaps(first, last):
+                raise ValidationError({'detail': 'The keypad range overlaps the range of the voting session {}. '
+                                                 'Give every voting session its own keypad range.'.format(other.pk)})
+        return data
 
 
 class KeypadSerializer(ModelSerializer):
@@ -38,6 +66,29 @@ class KeypadSerializer(ModelSerializer):
         fields = ('id', 'number', 'user', 'battery_level', 'in_range', )
 
 
+class VoteCollectorReceiverSerializer(ModelSerializer):
+    class Meta:
+        model = models.VoteCollectorReceiver
+        fields = ('id', 'name', 'uri', 'first_keypad', 'last_keypad', 'device_status',
+                  'votes_received', 'is_voting', )
+        read_only_fields = ('device_status', 'votes_received', 'is_voting', )
+
+    def validate(self, data):
+        first = data.get('first_keypad', getattr(self.instance, 'first_keypad', None))
+        last = data.get('last_keypad', getattr(self.instance, 'last_keypad', None))
+        if first is None or last is None:
+            raise ValidationError({'detail': 'The first and last keypad number have to be given.'})
+        if first > last:
+            raise ValidationError({'detail': 'The first keypad number must not be greater than the last one.'})
+
+        others = models.VoteCollectorReceiver.objects.all()
+        if self.instance is not None:
+            others = others.exclude(pk=self.instance.pk)
+        if others.filter(first_keypad__lte=last, last_keypad__gte=first).exists():
+            raise ValidationError({'detail': 'The keypad range overlaps the range of another receiver.'})
+        return data
+
+
 class VotingPrincipleSerializer(ModelSerializer):
     class Meta:
         model = models.VotingPrinciple
@@ -94,7 +145,8 @@ class MotionPollBallotSerializer(ModelSerializer):
 class MotionPollTypeSerializer(ModelSerializer):
     class Meta:
         model = models.MotionPollType
-        fields = ('id', 'poll', 'type', )
+        fields = ('id', 'poll', 'type', 'started', )
+        read_only_fields = ('started', )
 
 
 class AssignmentPollBallotSerializer(ModelSerializer):
@@ -107,13 +159,27 @@ class AssignmentPollBallotSerializer(ModelSerializer):
 class AssignmentPollTypeSerializer(ModelSerializer):
     class Meta:
         model = models.AssignmentPollType
-        fields = ('id', 'poll', 'type', )
+        fields = ('id', 'poll', 'type', 'started', )
+        read_only_fields = ('started', )
+
+
+class AttendanceSerializer(ModelSerializer):
+    shares = JSONField()
+
+    class Meta:
+        model = models.Attendance
+        fields = ('id', 'shares', 'updated', )
 
 
 class AttendanceLogSerializer(ModelSerializer):
+    shares = SerializerMethodField()
+
     class Meta:
         model = models.AttendanceLog
-        fields = ('id', 'message', 'created', )
+        fields = ('id', 'created', 'heads', 'shares', )
+
+    def get_shares(self, log):
+        return {principle_id: float(shares) for principle_id, shares in log.get_shares().items()}
 
 
 class VotingTokenSerializer(ModelSerializer):
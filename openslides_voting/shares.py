@@ -0,0 +1,234 @@
+import csv
+from decimal import Decimal, InvalidOperation
+from itertools import chain
+
+from django.db import transaction
+from openslides.users.models import User
+
+from .attendance import schedule_attendance_update
+from . import coherence
+from .coherence import generations
+from .models import VotingPrinciple, VotingShare
+
+
+MAX_IMPORT_ERRORS = 100
+
+
+class ShareWriter:
+    """
+    Writes voting shares in bulk.
+
+    The existing share matrix is loaded with one query. Rows are collected and applied
+    in chunks of chunk_size rows, each chunk in its own transaction: new shares are
+    bulk created, changed shares are updated with one query per distinct value and
+    shares set to zero are deleted with one query.
+
+    Autoupdate is not triggered. Clients have to reload the shares.
+    """
+    def __init__(self, chunk_size=1000, progress=None):
+        """
+        :param chunk_size: Number of rows written per transaction.
+        :param progress: Optional callable receiving a progress dict after each chunk.
+        """
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.existing = {
+            (delegate_id, principle_id): (pk, shares)
+            for pk, delegate_id, principle_id, shares in VotingShare.objects.values_list(
+                'pk', 'delegate_id', 'principle_id', 'shares')}
+        self.rows = {}
+        self.chunks = []
+        self.rows_written = 0
+        self.created = 0
+        self.updated = 0
+        self.deleted = 0
+
+    def add(self, delegate_id, principle_id, shares):
+        """
+        Adds a row. A later row for the same delegate and principle replaces an earlier one.
+        """
+        self.rows[(delegate_id, principle_id)] = shares
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all collected rows.
+        """
+        if not self.rows:
+            return
+        rows, self.rows = self.rows, {}
+
+        # Look up the pks of shares created by an earlier chunk.
+        unknown = {key[0] for key in rows if self.existing.get(key, (0,))[0] is None}
+        if unknown:
+            for pk, delegate_id, principle_id, shares in VotingShare.objects.filter(
+                    delegate_id__in=unknown).values_list('pk', 'delegate_id', 'principle_id', 'shares'):
+                self.existing[(delegate_id, principle_id)] = (pk, shares)
+
+        created = []
+        updated = {}  # key: shares, value: list of pks
+        deleted = []
+        for key, shares in rows.items():
+            existing = self.existing.get(key)
+            if existing is None:
+                if shares > 0:
+                    created.append(VotingShare(delegate_id=key[0], principle_id=key[1], shares=shares))
+            elif shares == 0:
+                deleted.append(existing[0])
+            elif shares != existing[1]:
+                updated.setdefault(shares, []).append(existing[0])
+
+        with transaction.atomic():
+            VotingShare.objects.bulk_create(created)
+            for shares, pks in updated.items():
+                VotingShare.objects.filter(pk__in=pks).update(shares=shares)
+            VotingShare.objects.filter(pk__in=deleted).delete()
+        # Bulk writes do not send signals.
+        generations.bump(coherence.SHARES)
+        schedule_attendance_update()
+
+        # Keep the in-memory matrix in sync for following chunks. The pks of created
+        # shares are unknown (None) until they are needed.
+        for key, shares in rows.items():
+            if shares == 0:
+                self.existing.pop(key, None)
+            elif key in self.existing:
+                self.existing[key] = (self.existing[key][0], shares)
+            elif shares > 0:
+                self.existing[key] = (None, shares)
+
+        self.rows_written += len(rows)
+        self.created += len(created)
+        self.updated += sum(len(pks) for pks in updated.values())
+        self.deleted += len(deleted)
+        chunk = {
+            'chunk': len(self.chunks) + 1,
+            'rows': self.rows_written,
+            'created': len(created),
+            'updated': sum(len(pks) for pks in updated.values()),
+            'deleted': len(deleted),
+        }
+        self.chunks.append(chunk)
+        if self.progress is not None:
+            self.progress(chunk)
+
+    def close(self):
+        """
+        Writes the remaining rows and returns a summary.
+        """
+        self.flush()
+        return {
+            'rows': self.rows_written,
+            'created': self.created,
+            'updated': self.updated,
+            'deleted': self.deleted,
+            'chunks': self.chunks,
+        }
+
+
+def parse_shares(value):
+    """
+    Returns the shares value as Decimal with six decimal places or raises ValueError.
+    """
+    try:
+        shares = Decimal(str(value)).quantize(Decimal('0.000001'))
+    except InvalidOperation:
+        raise ValueError('Invalid shares value: {}'.format(value))
+    if shares < 0:
+        raise ValueError('Shares must not be negative.')
+    return shares
+
+
+def parse_principle_header(header):
+    """
+    Returns the name and decimal places of the principle named in a CSV header. A header
+    'name.2' means a principle 'name' with two decimal places.
+    """
+    name, _sep, precision = header.strip().partition('.')
+    try:
+        decimal_places = int(precision)
+    except ValueError:
+        decimal_places = 0
+    if decimal_places <= 0:
+        name = header.strip()
+        decimal_places = 0
+    return name, decimal_places
+
+
+def import_shares_csv(lines, chunk_size=1000):
+    """
+    Imports voting shares from CSV lines (an iterable of strings).
+
+    The first row contains the column headers: first name, last name, participant number
+    and one column per voting principle. Delegates and principles are resolved with
+    dictionaries built by one query each. Rows of anonymous users (no name) are skipped.
+
+    All rows are validated first. Nothing is written if any row is invalid, e. g. an
+    unknown participant or an empty or invalid shares value. Otherwise missing principles
+    are created and the rows are fed into a ShareWriter.
+
+    :return: Summary of the ShareWriter with a list of row errors (at most MAX_IMPORT_ERRORS).
+    """
+    lines = iter(lines)
+    try:
+        header_line = next(lines)
+    except StopIteration:
+        raise ValueError('The file is empty.')
+    delimiter = ';' if header_line.count(';') > header_line.count(',') else ','
+    reader = csv.reader(chain([header_line], lines), delimiter=delimiter, quotechar='"')
+
+    header = next(reader)
+    if len(header) < 4:
+        raise ValueError('At least one voting principle column is required.')
+    principle_headers = [parse_principle_header(name) for name in header[3:]]
+
+    delegates = {
+        (first_name.strip(), last_name.strip(), number.strip()): pk
+        for pk, first_name, last_name, number in User.objects.values_list(
+            'pk', 'first_name', 'last_name', 'number')}
+
+    rows = []
+    errors = []
+    error_count = 0
+    for line_number, row in enumerate(reader, start=2):
+        if len(row) < 4:
+            continue
+        first_name, last_name, number = (value.strip() for value in row[:3])
+        if not first_name and not last_name:
+            continue
+        delegate_id = delegates.get((first_name, last_name, number))
+        error = None
+        if delegate_id is None:
+            error = 'Participant not found.'
+        else:
+            cells = [value.strip() for value in row[3:3 + len(principle_headers)]]
+            if len(cells) < len(principle_headers) or not all(cells):
+                error = 'Missing shares value.'
+            else:
+                try:
+                    rows.append((delegate_id, [parse_shares(value) for value in cells]))
+                except ValueError as e:
+                    error = str(e)
+        if error is not None:
+            error_count += 1
+            if len(errors) < MAX_IMPORT_ERRORS:
+                errors.append({'row': line_number, 'detail': error})
+
+    if error_count:
+        summary = {'rows': 0, 'created': 0, 'updated': 0, 'deleted': 0, 'chunks': []}
+    else:
+        principles = dict(VotingPrinciple.objects.values_list('name', 'pk'))
+        for name, decimal_places in principle_headers:
+            if name not in principles:
+                principles[name] = VotingPrinciple.objects.create(name=name, decimal_places=decimal_places).pk
+        principle_ids = [principles[name] for name, _decimal_places in principle_headers]
+
+        writer = ShareWriter(chunk_size=chunk_size)
+        for delegate_id, values in rows:
+            for principle_id, shares in zip(principle_ids, values):
+                writer.add(delegate_id, principle_id, shares)
+        summary = writer.close()
+    summary['error_count'] = error_count
+    summary['errors'] = errors
+    return summary
@@ -3,8 +3,9 @@ from django.contrib.contenttypes.models import ContentType
 from openslides.users.models import Group
 from openslides.utils.autoupdate import inform_deleted_data
 
-from .models import Keypad, AuthorizedVoters, VotingController
-from .voting import get_admitted_delegates
+from .attendance import schedule_attendance_update
+from .models import Keypad, VotingProxy
+from .voting import update_admitted_delegates
 
 
 def add_permissions_to_builtin_groups(**kwargs):
@@ -34,22 +35,67 @@ def add_permissions_to_builtin_groups(**kwargs):
         delegates.permissions.add(perm_can_vote)
 
 
+def remember_user_presence(sender, instance, **kwargs):
+    """
+    Signal receiver for post_init of User. Remembers the loaded presence to detect
+    presence changes on save.
+    """
+    instance.loaded_is_present = instance.__dict__.get('is_present')
+
+
 def update_authorized_voters(sender, instance, **kwargs):
-    vc = VotingController.objects.get()
-    av = AuthorizedVoters.objects.get()
+    """
+    Updates the authorized voters of a running voting and the attendance after the
+    presence of a user, the user of a keypad or a voting proxy was saved or deleted.
+    """
+    if sender == Keypad:
+        old_user_id = getattr(instance, 'loaded_user_id', None)
+        instance.loaded_user_id = instance.user_id
+        if kwargs.get('created') is False and old_user_id == instance.user_id:
+            # Only battery level or range changed.
+            return
+        user_ids = [instance.user_id, old_user_id]
+    elif sender == VotingProxy:
+        user_ids = [instance.delegate_id]
+    else:
+        old_is_present = getattr(instance, 'loaded_is_present', None)
+        instance.loaded_is_present = instance.is_present
+        created = kwargs.get('created')
+        if (created is False and old_is_present == instance.is_present) or (created and not instance.is_present):
+            # E. g. last_login, the password or the name changed, or an absent user was imported.
+            return
+        user_ids = [instance.pk]
+    update_admitted_delegates(user_ids)
+    schedule_attendance_update()
 
-    if not vc.is_voting:
+
+def update_authorized_voters_groups(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Signal receiver for m2m_changed of the groups of users. Updates the authorized voters
+    of a running voting and the attendance after the groups of users changed.
+    """
+    if action == 'pre_clear' and reverse:
+        # The users of the group are unknown after the clear.
+        instance.cleared_user_ids = list(instance.user_set.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
         return
+    if not reverse:
+        user_ids = [instance.pk]
+    elif action == 'post_clear':
+        user_ids = getattr(instance, 'cleared_user_ids', [])
+    else:
+        user_ids = list(pk_set)
+    if user_ids:
+        update_admitted_delegates(user_ids)
+        schedule_attendance_update()
 
-    admitted_delegates = None
-    if av.type == 'votecollector':
-        vc.votes_count, admitted_delegates = get_admitted_delegates(vc.principle, keypad=True)
-    elif av.type == 'named_electronic':
-        vc.votes_count, admitted_delegates = get_admitted_delegates(vc.principle)
 
-    if admitted_delegates:  # Something changed
-        AuthorizedVoters.update_delegates(admitted_delegates)
-        vc.save()
+def update_attendance(sender, **kwargs):
+    """
+    Updates the attendance after a voting share or principle was saved or deleted.
+    """
+    schedule_attendance_update()
 
 
 def inform_keypad_deleted(sender, instance, **kwargs):
@@ -9,9 +9,25 @@ angular.module('OpenSlidesApp.openslides_voting', [
     'OpenSlidesApp.assignments'
 ])
 
-.factory('AuthorizedVoters', [
+.factory('AuthorizedVoter', [
     'DS',
     function (DS) {
+        var name = 'openslides_voting/authorized-voter';
+        return DS.defineResource({
+            name: name,
+            methods: {
+                getResourceName: function () {
+                    return name;
+                },
+            },
+        });
+    }
+])
+
+.factory('AuthorizedVoters', [
+    'DS',
+    'AuthorizedVoter',
+    function (DS, AuthorizedVoter) {
         var name = 'openslides_voting/authorized-voters';
         return DS.defineResource({
             name: name,
@@ -19,6 +35,20 @@ angular.module('OpenSlidesApp.openslides_voting', [
                 getResourceName: function () {
                     return name;
                 },
+                // Returns the authorized voters as {<voter_id>: [<delegate_id>]}.
+                getAuthorizedVoters: function () {
+                    var voters = {};
+                    _.forEach(AuthorizedVoter.filter({controller_id: this.controller_id}), function (av) {
+                        voters[av.voter_id] = av.delegates;
+                    });
+                    return voters;
+                },
+                isAuthorized: function (userId) {
+                    return AuthorizedVoter.filter({
+                        controller_id: this.controller_id,
+                        voter_id: userId,
+                    }).length > 0;
+                },
             },
             relations: {
                 belongsTo: {
@@ -52,7 +82,16 @@ angular.module('OpenSlidesApp.openslides_voting', [
                         return gettext('The VoteCollector is not running!');
                     }
                     return status + ': ' + text;
-                }
+                },
+                // Returns the name of the voting session with its keypad range.
+                getTitle: function () {
+                    var title = this.name || gettext('Voting session') + ' ' + this.id;
+                    if (this.first_keypad !== null || this.last_keypad !== null) {
+                        title += ' (' + (this.first_keypad !== null ? this.first_keypad : '') + '–' +
+                            (this.last_keypad !== null ? this.last_keypad : '') + ')';
+                    }
+                    return title;
+                },
             },
             relations: {
                 belongsTo: {
@@ -628,6 +667,21 @@ angular.module('OpenSlidesApp.openslides_voting', [
     }
 ])
 
+.factory('Attendance', [
+    'DS',
+    function (DS) {
+        var name = 'openslides_voting/attendance';
+        return DS.defineResource({
+            name: name,
+            methods: {
+                getResourceName: function () {
+                    return name;
+                },
+            }
+        });
+    }
+])
+
 .factory('AttendanceLog', [
     'DS',
     function (DS) {
@@ -638,14 +692,26 @@ angular.module('OpenSlidesApp.openslides_voting', [
                 getResourceName: function () {
                     return name;
                 },
-                json: function () {
-                    return angular.fromJson(this.message.replace(/'/g, '"'));
-                },
             }
         });
     }
 ])
 
+.factory('VoteCollectorReceiver', [
+    'DS',
+    function (DS) {
+        var name = 'openslides_voting/vote-collector-receiver';
+        return DS.defineResource({
+            name: name,
+            methods: {
+                getResourceName: function () {
+                    return name;
+                },
+            },
+        });
+    }
+])
+
 .factory('VotingToken', [
     'DS',
     function (DS) {
@@ -923,7 +989,9 @@ angular.module('OpenSlidesApp.openslides_voting', [
     'AssignmentAbsenteeVote',
     'AssignmentPollBallot',
     'AssignmentPollType',
+    'Attendance',
     'AttendanceLog',
+    'AuthorizedVoter',
     'AuthorizedVoters',
     'Delegate',
     'Keypad',
@@ -935,21 +1003,26 @@ angular.module('OpenSlidesApp.openslides_voting', [
     'VotingShare',
     'VotingToken',
     'VotingController',
-    function (AssignmentAbsenteeVote, AssignmentPollBallot, AssignmentPollType,
-        AuthorizedVoters, Delegate, Keypad, MotionAbsenteeVote, MotionPollBallot,
-        MotionPollType, VotingPrinciple, VotingProxy, VotingShare, VotingToken,
-        VotingController) {}
+    'VoteCollectorReceiver',
+    function (AssignmentAbsenteeVote, AssignmentPollBallot, AssignmentPollType, Attendance,
+        AttendanceLog, AuthorizedVoter, AuthorizedVoters, Delegate, Keypad, MotionAbsenteeVote,
+        MotionPollBallot, MotionPollType, VotingPrinciple, VotingProxy, VotingShare, VotingToken,
+        VotingController, VoteCollectorReceiver) {}
 ])
 
 .run([
     '$rootScope',
     '$http',
-    function ($rootScope, $http) {
+    'VotingController',
+    function ($rootScope, $http, VotingController) {
+        // Stops the votings of all voting sessions.
         $rootScope.stopAnyVoting = function () {
-            $http.post('/rest/openslides_voting/voting-controller/1/stop/').then(function (s) {
-                console.log('success', s);
-            }, function (e) {
-                console.log('error', e);
+            _.forEach(VotingController.filter({is_voting: true}), function (vc) {
+                $http.post('/rest/openslides_voting/voting-controller/' + vc.id + '/stop/').then(function (s) {
+                    console.log('success', s);
+                }, function (e) {
+                    console.log('error', e);
+                });
             });
         };
     }
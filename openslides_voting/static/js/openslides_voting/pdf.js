@@ -219,10 +219,10 @@ angular.module('OpenSlidesApp.openslides_voting.pdf', ['OpenSlidesApp.core.pdf']
             _.forEach(AttendanceLog.filter({orderBy: ['created', 'DESC']}), function (log) {
                 // TODO: Use localized time format.
                 columns[0].push($filter('date')(log.created, 'yyyy-MM-dd HH:mm:ss'));
-                columns[1].push($filter('number')(log.json().heads, 0));
+                columns[1].push($filter('number')(log.heads, 0));
                 _.forEach(principles, function (principle, index) {
                     columns[index + 2].push(
-                        $filter('number')(log.json()[principle.id], principle.decimal_places)
+                        $filter('number')(log.shares[principle.id], principle.decimal_places)
                     );
                 });
             });
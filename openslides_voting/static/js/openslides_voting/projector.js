@@ -15,6 +15,9 @@ angular.module('OpenSlidesApp.openslides_voting.projector', [
         slidesProvider.registerSlide('voting/icon', {
             template: 'static/templates/openslides_voting/slide_icon.html'
         });
+        slidesProvider.registerSlide('voting/stats', {
+            template: 'static/templates/openslides_voting/slide_stats.html'
+        });
         slidesProvider.registerSlide('voting/motion-poll', {
             template: 'static/templates/openslides_voting/slide_motion_poll.html',
         });
@@ -24,6 +27,31 @@ angular.module('OpenSlidesApp.openslides_voting.projector', [
     }
 ])
 
+.factory('SlideVotingSession', [
+    'AuthorizedVoters',
+    'VotingController',
+    function (AuthorizedVoters, VotingController) {
+        return {
+            // Returns the voting session of a poll, preferring an active voting, like
+            // projector.get_session on server side.
+            get: function (votingMode, pollId) {
+                var sessions = _.sortBy(VotingController.filter({
+                    voting_mode: votingMode,
+                    voting_target: pollId,
+                }), function (vc) {
+                    return vc.is_voting ? 0 : 1;
+                });
+                return sessions[0] || VotingController.get(1);
+            },
+            // Returns the authorized voters object of the voting session of a poll.
+            getAuthorizedVoters: function (votingMode, pollId) {
+                var vc = this.get(votingMode, pollId);
+                return vc ? AuthorizedVoters.filter({controller_id: vc.id})[0] : undefined;
+            },
+        };
+    }
+])
+
 .controller('SlidePromptCtrl', [
     '$scope',
     function($scope) {
@@ -45,9 +73,29 @@ angular.module('OpenSlidesApp.openslides_voting.projector', [
     }
 ])
 
+.controller('SlideStatsCtrl', [
+    '$scope',
+    '$http',
+    '$interval',
+    function($scope, $http, $interval) {
+        // The statistics are not autoupdated. They are fetched every second.
+        var update = function () {
+            $http.get('/voting/stats/?session=' + ($scope.element.session || 1)).then(function (success) {
+                $scope.stats = success.data;
+            });
+        };
+        update();
+        var timer = $interval(update, 1000);
+        $scope.$on('$destroy', function () {
+            $interval.cancel(timer);
+        });
+    }
+])
+
 .controller('SlideMotionPollCtrl', [
     '$scope',
     '$timeout',
+    'AuthorizedVoter',
     'AuthorizedVoters',
     'Config',
     'Motion',
@@ -57,8 +105,9 @@ angular.module('OpenSlidesApp.openslides_voting.projector', [
     'User',
     'Delegate',
     'VotingController',
-    function ($scope, $timeout, AuthorizedVoters, Config, Motion, MotionPoll,
-              MotionPollBallot, MotionPollDecimalPlaces, User, Delegate, VotingController) {
+    'SlideVotingSession',
+    function ($scope, $timeout, AuthorizedVoter, AuthorizedVoters, Config, Motion, MotionPoll,
+              MotionPollBallot, MotionPollDecimalPlaces, User, Delegate, VotingController, SlideVotingSession) {
         // Each DS resource used here must be yielded on server side in ProjectElement.get_requirements!
         var pollId = $scope.element.id,
             draw = false; // prevents redundant drawing
@@ -78,8 +127,9 @@ angular.module('OpenSlidesApp.openslides_voting.projector', [
         });
 
         $scope.$watch(function () {
-            return VotingController.lastModified(1) +
-                AuthorizedVoters.lastModified(1) +
+            return VotingController.lastModified() +
+                AuthorizedVoters.lastModified() +
+                AuthorizedVoter.lastModified() +
                 Config.lastModified();
         }, function () {
             // Using timeout seems to give the browser more time to update the DOM.
@@ -100,8 +150,11 @@ angular.module('OpenSlidesApp.openslides_voting.projector', [
             }
 
             // Get authorized voters.
-            var av = AuthorizedVoters.get(1);
-            var voters = av.authorized_voters;
+            var av = SlideVotingSession.getAuthorizedVoters('MotionPoll', pollId);
+            if (!av) {
+                return;
+            }
+            var voters = av.getAuthorizedVoters();
             var showKey = av.type.indexOf('votecollector') === 0 && Config.get('voting_show_number').value;
             if (_.keys(voters).length > 0 &&
                 av.type !== 'votecollector_anonymous' && av.type !== 'votecollector_secret') {
@@ -167,6 +220,7 @@ angular.module('OpenSlidesApp.openslides_voting.projector', [
     '$filter',
     '$scope',
     '$timeout',
+    'AuthorizedVoter',
     'AuthorizedVoters',
     'Config',
     'Assignment',
@@ -176,8 +230,10 @@ angular.module('OpenSlidesApp.openslides_voting.projector', [
     'User',
     'Delegate',
     'VotingController',
-    function ($filter, $scope, $timeout, AuthorizedVoters, Config, Assignment, AssignmentPoll,
-              AssignmentPollBallot, AssignmentPollDecimalPlaces, User, Delegate, VotingController) {
+    'SlideVotingSession',
+    function ($filter, $scope, $timeout, AuthorizedVoter, AuthorizedVoters, Config, Assignment, AssignmentPoll,
+              AssignmentPollBallot, AssignmentPollDecimalPlaces, User, Delegate, VotingController,
+              SlideVotingSession) {
         // Each DS resource used here must be yielded on server side in ProjectElement.get_requirements!
         var pollId = $scope.element.id,
             draw = false; // prevents redundant drawing
@@ -199,10 +255,10 @@ angular.module('OpenSlidesApp.openslides_voting.projector', [
         });
 
         $scope.$watch(function () {
-            return AuthorizedVoters.lastModified(1);
+            return VotingController.lastModified() + AuthorizedVoters.lastModified() + AuthorizedVoter.lastModified();
         }, function () {
             // Get poll type for assignment.
-            $scope.av = AuthorizedVoters.get(1);
+            $scope.av = SlideVotingSession.getAuthorizedVoters('AssignmentPoll', pollId);
 
             // Using timeout seems to give the browser more time to update the DOM.
             draw = true;
@@ -210,7 +266,7 @@ angular.module('OpenSlidesApp.openslides_voting.projector', [
         });
 
         $scope.$watch(function () {
-            return VotingController.lastModified(1) +
+            return VotingController.lastModified() +
                 Config.lastModified();
         }, function () {
             // Using timeout seems to give the browser more time to update the DOM.
@@ -231,7 +287,7 @@ angular.module('OpenSlidesApp.openslides_voting.projector', [
             }
 
             // Get authorized voters.
-            var voters = $scope.av.authorized_voters;
+            var voters = $scope.av.getAuthorizedVoters();
             var showKey = $scope.av.type.indexOf('votecollector') === 0 && Config.get('voting_show_number').value;
             if (_.keys(voters).length > 0 &&
                 $scope.av.type !== 'votecollector_anonymous' && $scope.av.type !== 'votecollector_secret') {
@@ -5,7 +5,8 @@
 angular.module('OpenSlidesApp.openslides_voting.site', [
     'OpenSlidesApp.openslides_voting',
     'OpenSlidesApp.openslides_voting.templatehooks',
-    'OpenSlidesApp.openslides_voting.pdf'
+    'OpenSlidesApp.openslides_voting.pdf',
+    'ngFileUpload',
 ])
 
 .config([
@@ -332,9 +333,12 @@ angular.module('OpenSlidesApp.openslides_voting.site', [
                     show: true,
                 };
             }
-            $scope.av = AuthorizedVoters.get(1);
-            $scope.isTokenVoting =  (($scope.av.motionPoll || $scope.av.assignmentPoll) &&
-                $scope.av.type === 'token_based_electronic');
+            // The active token based voting of any voting session.
+            var av = _.find(AuthorizedVoters.getAll(), function (av) {
+                return (av.motionPoll || av.assignmentPoll) && av.type === 'token_based_electronic';
+            });
+            $scope.av = av || AuthorizedVoters.get(1);
+            $scope.isTokenVoting = !!av;
         });
 
         var resetInput = function () {
@@ -670,12 +674,13 @@ angular.module('OpenSlidesApp.openslides_voting.site', [
 .factory('Voter', [
     '$rootScope',
     'operator',
+    'AuthorizedVoter',
     'AuthorizedVoters',
     'MotionPollBallot',
     'AssignmentPollBallot',
     'Messaging',
     'gettextCatalog',
-    function ($rootScope, operator, AuthorizedVoters, MotionPollBallot,
+    function ($rootScope, operator, AuthorizedVoter, AuthorizedVoters, MotionPollBallot,
         AssignmentPollBallot, Messaging, gettextCatalog) {
         var av;
         var messageId;
@@ -691,16 +696,12 @@ angular.module('OpenSlidesApp.openslides_voting.site', [
                 return;
             }
 
-            av = AuthorizedVoters.get(1);
-            // No av or no active voting
-            if (!av || (!av.motion_poll_id && !av.assignment_poll_id)) {
-                Messaging.deleteMessage(messageId);
-                return;
-            }
-
-            var included = operator.user &&
-                _.includes(_.keys(av.authorized_voters), operator.user.id.toString());
-            // This user is not affected by the current voting.
+            // The active voting of any voting session the user is authorized for.
+            av = _.find(AuthorizedVoters.getAll(), function (av) {
+                return (av.motion_poll_id || av.assignment_poll_id) && av.isAuthorized(operator.user.id);
+            });
+            var included = !!av;
+            // This user is not affected by any active voting.
             if (!included) {
                 Messaging.deleteMessage(messageId);
                 oldIncluded = false;
@@ -755,7 +756,7 @@ angular.module('OpenSlidesApp.openslides_voting.site', [
 
         operator.registerSetUserCallback(function (user) {
             $rootScope.$watch(function () {
-                return AuthorizedVoters.lastModified();
+                return AuthorizedVoters.lastModified() + AuthorizedVoter.lastModified();
             }, updateMessage);
         });
 
@@ -774,7 +775,7 @@ angular.module('OpenSlidesApp.openslides_voting.site', [
                 if (!av || !motion || !av.motionPoll || motion.id !== av.motionPoll.motion.id) {
                     return;
                 }
-                if (_.includes(_.keys(av.authorized_voters), operator.user.id.toString())) {
+                if (av.isAuthorized(operator.user.id)) {
                     return av.motion_poll_id;
                 }
             },
@@ -800,7 +801,7 @@ angular.module('OpenSlidesApp.openslides_voting.site', [
                 if (!av || !assignment || !av.assignmentPoll || assignment.id !== av.assignmentPoll.assignment.id) {
                     return;
                 }
-                if (_.includes(_.keys(av.authorized_voters), operator.user.id.toString())) {
+                if (av.isAuthorized(operator.user.id)) {
                     return av.assignment_poll_id;
                 }
             },
@@ -1069,28 +1070,32 @@ angular.module('OpenSlidesApp.openslides_voting.site', [
 .controller('AttendanceCtrl', [
     '$scope',
     '$http',
-    '$interval',
     'gettextCatalog',
     'VotingPrinciple',
+    'Attendance',
     'AttendanceLog',
     'AttendanceHistoryContentProvider',
     'PdfMakeDocumentProvider',
     'PdfCreate',
-    function ($scope, $http, $interval, gettextCatalog, VotingPrinciple,
+    function ($scope, $http, gettextCatalog, VotingPrinciple, Attendance,
               AttendanceLog, AttendanceHistoryContentProvider, PdfMakeDocumentProvider, PdfCreate) {
         VotingPrinciple.bindAll({}, $scope, 'principles');
         AttendanceLog.bindAll({}, $scope, 'attendanceLogs');
 
-        var getAttendance = function () {
-            // Get attendance data from server.
-            $http.get('/voting/attendance/shares/').then(function (success) {
-                $scope.attendance = success.data;
-            });
-        };
-        
-        // Update attendance every 10 seconds.
-        var updateAttendance = $interval(getAttendance, 10000);
-        getAttendance();
+        // The attendance is pushed by the server on every change.
+        $scope.$watch(function () {
+            return Attendance.lastModified(1);
+        }, function () {
+            var attendance = Attendance.get(1);
+            if (attendance && attendance.updated) {
+                $scope.attendance = attendance.shares;
+            } else {
+                // Not computed yet. Let the server compute it.
+                $http.get('/voting/attendance/shares/').then(function (success) {
+                    $scope.attendance = success.data;
+                });
+            }
+        });
 
         // Delete all attendance logs.
         $scope.deleteHistory = function () {
@@ -1106,10 +1111,6 @@ angular.module('OpenSlidesApp.openslides_voting.site', [
                 PdfCreate.download(documentProvider, filename);
             });
         };
-        
-        $scope.$on('$destroy', function () {
-            $interval.cancel(updateAttendance);
-        });
     }
 ])
 
@@ -1342,175 +1343,55 @@ angular.module('OpenSlidesApp.openslides_voting.site', [
 
 .controller('SharesImportCtrl', [
     '$scope',
-    '$q',
-    '$http',
-    'gettext',
-    'VotingPrinciple',
+    'Upload',
+    'ErrorMessage',
     'VotingShare',
-    'User',
-    'osTablePagination',
-    function ($scope, $q, $http, gettext, VotingPrinciple, VotingShare, User, osTablePagination) {
-        var getPrincipleNamePrecision = function (principle) {
-            var precision = parseInt(principle.split('.')[1]);
-            var name = precision > 0 ? principle.split('.')[0] : principle;
-            return [name, precision > 0 ? precision : 0]
-        };
-
-        // Set up pagination.
-        $scope.pagination = osTablePagination.createInstance('SharesImportPagination', 100);
-
-        // Configure csv.
-        var fields = [];
-        $scope.principles = [];
-        $scope.delegateShares = [];
-        $scope.csvConfig = {
-            accept: '.csv, .txt',
-            encodingOptions: ['UTF-8', 'ISO-8859-1'],
-            parseConfig: {
-                skipEmptyLines: true
-            }
-        };
-
-        // Load csv file.
-        $scope.onCsvChange = function (csv) {
-            var records = [],
-                users = User.getAll();
-
+    function ($scope, Upload, ErrorMessage, VotingShare) {
+        // The file is parsed and imported on the server.
+        $scope.selectFile = function (file) {
             $scope.clear();
-
-            // Get voting principles and fields from header row.
-            if (csv.meta !== undefined) {
-                $scope.principles = csv.meta.fields.splice(3);
-            }
-
-            // Define field names.
-            fields = ['first_name', 'last_name', 'number'].concat($scope.principles);
-
-            // Read csv rows.
-            _.forEach(csv.data, function (row) {
-                if (row.length >= 4) {
-                    var filledRow = _.zipObject(fields, row);
-                    records.push(filledRow);
-                }
-            });
-            // Validate each record.
-            _.forEach(records, function (record) {
-                record.selected = true;
-                if (record.first_name === '' && record.last_name === '') {
-                    // User is anonymous.
-                    record.user_id = null;
-                }
-                else {
-                    // Find user.
-                    record.error = {};
-                    record.fullname = [record.first_name, record.last_name, record.number].join(' ');
-                    var user = _.find(users, function (item) {
-                        item.fullname = [item.first_name, item.last_name, item.number].join(' ');
-                        return item.fullname === record.fullname;
-                    });
-                    if (user !== undefined) {
-                        record.user_id = user.id;
-                        record.fullname = user.get_full_name();
-                    }
-                    else {
-                        record.user_id = -1;
-                        record.importerror = true;
-                        record.error.user = gettext('Error: Participant not found.');
-                    }
-                }
-                // Validate voting shares.
-                _.forEach($scope.principles, function (principle) {
-                    var num = parseFloat(record[principle]);
-                    if (isNaN(num) || num < 0) {
-                        record.importerror = true;
-                        record.error[principle] = gettext('Error: Not a valid number.');
-                    }
-                    else {
-                        record[principle] = num;
-                    }
-                });
-                $scope.delegateShares.push(record);
-            });
-            $scope.calcStats();
+            $scope.file = file;
         };
 
-        $scope.calcStats = function () {
-            $scope.sharesWillNotBeImported = 0;
-            $scope.sharesWillBeImported = 0;
-
-            $scope.delegateShares.forEach(function (item) {
-                if (!item.importerror && item.selected) {
-                    $scope.sharesWillBeImported++;
-                } else {
-                    $scope.sharesWillNotBeImported++;
-                }
-            });
-        };
-
-        // Import voting shares.
+        // Upload the csv file for import.
         $scope.import = function () {
-            var principlesMap = {},
-                promises = [];
             $scope.csvImporting = true;
-
-            // Create principles if they do not exist.
-            _.forEach($scope.principles, function (principle) {
-                var precision = parseInt(principle.split('.')[1]);
-                var name = precision > 0 ? principle.split('.')[0] : principle;
-                var principles = VotingPrinciple.filter({name: name});
-                if (principles.length >= 1) {
-                    principlesMap[principle] = principles[0].id;
-                }
-                else {
-                    promises.push(VotingPrinciple.create({
-                        name: name,
-                        decimal_places: precision > 0 ? precision: 0,
-                    }).then(function (success) {
-                        principlesMap[principle] = success.id;
-                    }));
+            $scope.alert = {};
+            Upload.upload({
+                url: '/rest/openslides_voting/voting-share/import_csv/',
+                method: 'POST',
+                data: {file: $scope.file},
+            }).then(
+                function (success) {
+                    $scope.summary = success.data;
+                    $scope.csvImporting = false;
+                    $scope.csvImported = true;
+
+                    // Reload VotingShare data store
+                    // since the server does NOT update the clients on import.
+                    VotingShare.ejectAll();
+                    VotingShare.findAll();
+                },
+                function (error) {
+                    $scope.csvImporting = false;
+                    $scope.alert = ErrorMessage.forAlert(error);
+                },
+                function (progress) {
+                    $scope.progress = parseInt(100.0 * progress.loaded / progress.total);
                 }
-            });
-
-            $q.all(promises).then(function () {
-                // Prepare a list of voting shares for mass import.
-                var data = {'shares': []};
-                _.forEach($scope.delegateShares, function (delegateShare) {
-                    if (delegateShare.selected && !delegateShare.importerror) {
-                        _.forEach($scope.principles, function (principle) {
-                            if (delegateShare[principle] >= 0) {
-                                // Server deletes voting shares that have a shares value of 0.
-                                data.shares.push({
-                                    delegate_id: delegateShare.user_id,
-                                    principle_id: principlesMap[principle],
-                                    shares: delegateShare[principle]
-                                });
-                                delegateShare.imported = true;
-                            }
-                        });
-                    }
-                });
-                // POST the list for bulk import.
-                $http.post('/rest/openslides_voting/voting-share/mass_import/', data).then(
-                    function (success) {
-                        $scope.delegateSharesImported = success.data.count;
-                        // $scope.csvImporting = false;
-
-                        // Reload VotingShare data store
-                        // since the server does NOT update the clients on mass_import.
-                        VotingShare.ejectAll();
-                        VotingShare.findAll();
-                    }
-                );
-            });
-            $scope.csvImported = true;
+            );
         };
 
-        // Clear csv import preview.
+        // Clear the selected file and the import summary.
         $scope.clear = function () {
-            $scope.delegateShares = [];
+            $scope.file = null;
+            $scope.summary = null;
+            $scope.progress = 0;
+            $scope.alert = {};
             $scope.csvImporting = false;
             $scope.csvImported = false;
         };
+        $scope.clear();
     }
 ])
 
@@ -1573,13 +1454,14 @@ angular.module('OpenSlidesApp.openslides_voting.site', [
     'Keypad',
     'User',
     'VotingController',
+    'VotingSession',
     'ErrorMessage',
     'osTableFilter',
     'osTableSort',
     'osTablePagination',
-    function ($scope, $http, $timeout, ngDialog, KeypadForm, Keypad, User, VotingController, ErrorMessage,
-              osTableFilter, osTableSort, osTablePagination) {
-        VotingController.bindOne(1, $scope, 'vc');
+    function ($scope, $http, $timeout, ngDialog, KeypadForm, Keypad, User, VotingController, VotingSession,
+              ErrorMessage, osTableFilter, osTableSort, osTablePagination) {
+        VotingController.bindOne(VotingSession.getSelectedId(), $scope, 'vc');
         $scope.alert = {};
 
         $scope.$watch(function () {
@@ -1650,12 +1532,12 @@ angular.module('OpenSlidesApp.openslides_voting.site', [
             });
 
             // Get votecollector device status.
-            $http.post('/rest/openslides_voting/voting-controller/1/update_votecollector_device_status/').then(
+            $http.post('/rest/openslides_voting/voting-controller/' + $scope.vc.id + '/update_votecollector_device_status/').then(
                 function (success) {
                     $scope.device = success.data.device;
                     if (success.data.connected) {
                         // Ping votecollector keypads.
-                        $http.post('/rest/openslides_voting/voting-controller/1/ping_votecollector/').then(
+                        $http.post('/rest/openslides_voting/voting-controller/' + $scope.vc.id + '/ping_votecollector/').then(
                             function (success) {
                                 // Stop pinging after 30 seconds if still running.
                                 $timeout(function () {
@@ -1677,7 +1559,7 @@ angular.module('OpenSlidesApp.openslides_voting.site', [
         };
 
         $scope.stopSystemTest = function () {
-            $http.post('/rest/openslides_voting/voting-controller/1/stop/');
+            $http.post('/rest/openslides_voting/voting-controller/' + $scope.vc.id + '/stop/');
         };
     }
 ])
@@ -2240,6 +2122,42 @@ angular.module('OpenSlidesApp.openslides_voting.site', [
     }
 ])
 
+.factory('VotingSession', [
+    'VotingController',
+    function (VotingController) {
+        // The voting session selected to start votings in. Shared by all poll forms.
+        var selectedId = 1;
+
+        // Returns the voting session which votes on the target or the selected voting session.
+        var get = function (votingMode, targetId) {
+            var vc = _.find(VotingController.filter({is_voting: true}), function (vc) {
+                return vc.voting_mode === votingMode && vc.voting_target === targetId;
+            });
+            return vc || VotingController.get(selectedId) || VotingController.get(1);
+        };
+
+        return {
+            get: get,
+            getSelectedId: function () {
+                return selectedId;
+            },
+            // Binds the voting session of the target to $scope.vc and all sessions to $scope.sessions.
+            bindScope: function ($scope, votingMode, getTargetId) {
+                $scope.session = {id: selectedId};
+                $scope.$watch(function () {
+                    return VotingController.lastModified() + ' ' + $scope.session.id + ' ' + getTargetId();
+                }, function () {
+                    $scope.sessions = _.sortBy(VotingController.getAll(), 'id');
+                    $scope.vc = get(votingMode, getTargetId());
+                });
+                $scope.selectSession = function () {
+                    selectedId = $scope.session.id;
+                };
+            },
+        };
+    }
+])
+
 .factory('PollFormVotingCtrlBase', [
     '$http',
     'gettextCatalog',
@@ -2289,7 +2207,7 @@ angular.module('OpenSlidesApp.openslides_voting.site', [
                 $scope.startVoting = function () {
                     $scope.$parent.$parent.$parent.alert = {};
 
-                    $http.post('/rest/openslides_voting/voting-controller/1/' + startUrl + '/', {
+                    $http.post('/rest/openslides_voting/voting-controller/' + $scope.vc.id + '/' + startUrl + '/', {
                         poll_id: $scope.poll.id,
                     }).then(null, function (error) {
                         $scope.$parent.$parent.$parent.alert = ErrorMessage.forAlert(error);
@@ -2300,12 +2218,13 @@ angular.module('OpenSlidesApp.openslides_voting.site', [
                     $scope.$parent.$parent.$parent.alert = {};
 
                     var thisPollActive = $scope.isThisPollActive();
+                    var url = '/rest/openslides_voting/voting-controller/' + $scope.vc.id + '/';
 
                     // Stop votingcontroller.
-                    $http.post('/rest/openslides_voting/voting-controller/1/stop/').then(
+                    $http.post(url + 'stop/').then(
                         function (success) {
                             if (thisPollActive)  {
-                                $http.post('/rest/openslides_voting/voting-controller/1/' + resultsUrl + '/', {
+                                $http.post(url + resultsUrl + '/', {
                                     poll_id: $scope.poll.id,
                                 }).then($scope.enterResults, function (error) {
                                     $scope.$parent.$parent.$parent.alert = ErrorMessage.forAlert(error);
@@ -2320,7 +2239,7 @@ angular.module('OpenSlidesApp.openslides_voting.site', [
 
                 $scope.clearVotes = function () {
                     $scope.$parent.$parent.$parent.alert = {};
-                    $http.post('/rest/openslides_voting/voting-controller/1/' + clearUrl + '/', {
+                    $http.post('/rest/openslides_voting/voting-controller/' + $scope.vc.id + '/' + clearUrl + '/', {
                         poll_id: $scope.poll.id,
                     }).then($scope.clearForm);
                 };
@@ -2393,10 +2312,13 @@ angular.module('OpenSlidesApp.openslides_voting.site', [
     'Projector',
     'VotingController',
     'PollFormVotingCtrlBase',
+    'VotingSession',
     function ($scope, $http, gettextCatalog, MotionPollBallot, MotionPollType, Projector, VotingController,
-              PollFormVotingCtrlBase) {
+              PollFormVotingCtrlBase, VotingSession) {
         Projector.bindAll({}, $scope, 'projectors');
-        VotingController.bindOne(1, $scope, 'vc');
+        VotingSession.bindScope($scope, 'MotionPoll', function () {
+            return $scope.poll.id;
+        });
 
         PollFormVotingCtrlBase.populateScope($scope, 'MotionPoll', 'motionPollForm', MotionPollType, 'voting/motion-poll',
             'start_motion', 'results_motion_votes', 'clear_motion_votes');
@@ -2463,10 +2385,13 @@ angular.module('OpenSlidesApp.openslides_voting.site', [
     'AssignmentPollType',
     'AssignmentPollBallot',
     'PollFormVotingCtrlBase',
+    'VotingSession',
     function ($scope, $http, gettextCatalog, Projector, VotingController, AssignmentPollType, AssignmentPollBallot,
-              PollFormVotingCtrlBase) {
+              PollFormVotingCtrlBase, VotingSession) {
         Projector.bindAll({}, $scope, 'projectors');
-        VotingController.bindOne(1, $scope, 'vc');
+        VotingSession.bindScope($scope, 'AssignmentPoll', function () {
+            return $scope.poll.id;
+        });
 
         PollFormVotingCtrlBase.populateScope($scope, 'AssignmentPoll', 'assignmentPollForm', AssignmentPollType,
             'voting/assignment-poll', 'start_assignment', 'results_assignment_votes',
@@ -2577,10 +2502,12 @@ angular.module('OpenSlidesApp.openslides_voting.site', [
 .controller('SpeakerListCtrl', [
     '$scope',
     '$http',
-    'VotingController',
+    'VotingSession',
     'ErrorMessage',
-    function ($scope, $http, VotingController, ErrorMessage) {
-        VotingController.bindOne(1, $scope, 'vc');
+    function ($scope, $http, VotingSession, ErrorMessage) {
+        VotingSession.bindScope($scope, 'Item', function () {
+            return $scope.item.id;
+        });
 
         $scope.canStartVoting = function () {
             return $scope.vc && !$scope.vc.is_voting;
@@ -2598,7 +2525,7 @@ angular.module('OpenSlidesApp.openslides_voting.site', [
         $scope.startVoting = function () {
             $scope.$parent.$parent.$parent.alert = {};
 
-            $http.post('/rest/openslides_voting/voting-controller/1/start_speaker_list/', {
+            $http.post('/rest/openslides_voting/voting-controller/' + $scope.vc.id + '/start_speaker_list/', {
                 item_id: $scope.item.id,
             }).then(null, function (error) {
                 $scope.$parent.$parent.$parent.alert = ErrorMessage.forAlert(error);
@@ -2608,7 +2535,7 @@ angular.module('OpenSlidesApp.openslides_voting.site', [
         $scope.stopVoting = function () {
             $scope.$parent.$parent.$parent.alert = {};
 
-            $http.post('/rest/openslides_voting/voting-controller/1/stop/').then(null, function (error) {
+            $http.post('/rest/openslides_voting/voting-controller/' + $scope.vc.id + '/stop/').then(null, function (error) {
                 $scope.$parent.$parent.$parent.alert = ErrorMessage.forAlert(error);
             });
         };
@@ -0,0 +1,192 @@
+import math
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from .votecollector.poller import status_cache
+
+
+REJECT_REASONS = ('not_authorized', 'wrong_poll', 'malformed', 'hmac', 'invalid')
+
+
+def get_latency_samples():
+    """
+    Returns the number of request latencies kept for the percentiles.
+    """
+    return getattr(settings, 'VOTING_STATS_LATENCY_SAMPLES', 1000)
+
+
+def percentile(values, p):
+    """
+    Returns the p-th percentile (0..100) of a sorted list using the nearest rank.
+    """
+    if not values:
+        return 0
+    index = max(0, min(len(values) - 1, math.ceil(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+class RateRing:
+    """
+    Counts events per second in a ring of size seconds.
+    """
+    def __init__(self, size=60):
+        self.size = size
+        self.seconds = [0] * size
+        self.counts = [0] * size
+
+    def add(self, count=1, now=None):
+        second = int(now or time.time())
+        index = second % self.size
+        if self.seconds[index] != second:
+            self.seconds[index] = second
+            self.counts[index] = 0
+        self.counts[index] += count
+
+    def rate(self, window=10, now=None):
+        """
+        Returns the events per second in the last window full seconds.
+        """
+        second = int(now or time.time())
+        window = min(window, self.size - 1)
+        total = sum(count for s, count in zip(self.seconds, self.counts) if second - window <= s < second)
+        return total / window
+
+
+class SessionStats:
+    """
+    Live statistics of the vote submissions of the current voting of a voting session,
+    kept in memory per process: accepted votes and their rate, rejected votes by reason,
+    suppressed duplicate votes and the latencies of the last requests. Each worker
+    process only counts the requests it served.
+    """
+    def __init__(self, key=None):
+        self.lock = threading.Lock()
+        self.key = key
+        self.started = time.time()
+        self.accepted = 0
+        self.accepted_rate = RateRing()
+        self.rejected = dict.fromkeys(REJECT_REASONS, 0)
+        self.rejected_rate = RateRing()
+        self.duplicates = 0
+        self.latencies = deque(maxlen=get_latency_samples())
+
+    def add_accepted(self, count=1):
+        if count:
+            with self.lock:
+                self.accepted += count
+                self.accepted_rate.add(count)
+
+    def add_rejected(self, reason, count=1):
+        with self.lock:
+            self.rejected[reason] = self.rejected.get(reason, 0) + count
+            self.rejected_rate.add(count)
+
+    def add_duplicate(self):
+        with self.lock:
+            self.duplicates += 1
+
+    def add_latency(self, duration):
+        self.latencies.append(duration)
+
+    def as_dict(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            received = self.accepted + sum(self.rejected.values())
+            data = {
+                'started': self.started,
+                'accepted': self.accepted,
+                'votes_per_second': round(self.accepted_rate.rate(), 2),
+                'rejected': dict(self.rejected),
+                'rejected_per_second': round(self.rejected_rate.rate(), 2),
+                'duplicates': self.duplicates,
+                'latency_ms': {
+                    'p50': round(percentile(latencies, 50) * 1000, 1),
+                    'p95': round(percentile(latencies, 95) * 1000, 1),
+                    'p99': round(percentile(latencies, 99) * 1000, 1),
+                    'max': round(latencies[-1] * 1000, 1) if latencies else 0,
+                },
+            }
+
+        # Votes counted by the VoteCollector but not received yet. Read from the status
+        # cache of the background poller, no call to the VoteCollector. The status is
+        # summed up over the receivers of the session.
+        backlog = None
+        entry = status_cache.get_voting_status(self.key[0]) if self.key else None
+        if entry is not None and entry[0]:
+            backlog = max(0, entry[0][1] - received)
+        data['backlog'] = backlog
+        return data
+
+
+class StatsRegistry:
+    """
+    The statistics of all voting sessions. The key of a voting is a tuple (session id,
+    voting mode, voting target). Vote requests call begin() with the key of their voting;
+    the add methods count for the voting of the current thread until end() is called.
+    Rejects without a voting are counted in unassigned.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.local = threading.local()
+        # Rejected requests which do not belong to a voting (e. g. wrong poll ids), counted
+        # since the start of the process.
+        self.unassigned = dict.fromkeys(REJECT_REASONS, 0)
+
+    def reset(self, key):
+        with self.lock:
+            self.sessions[key[0]] = SessionStats(key)
+
+    def begin(self, key):
+        """
+        Makes the voting of key the current voting of this thread. Resets the statistics
+        of the session if key differs from its current voting, e. g. in processes that
+        did not start the voting.
+        """
+        with self.lock:
+            stats = self.sessions.get(key[0])
+            if stats is None or stats.key != key:
+                stats = self.sessions[key[0]] = SessionStats(key)
+        self.local.stats = stats
+
+    def end(self):
+        self.local.stats = None
+
+    def current(self):
+        return getattr(self.local, 'stats', None)
+
+    def add_accepted(self, count=1):
+        stats = self.current()
+        if stats is not None:
+            stats.add_accepted(count)
+
+    def add_rejected(self, reason, count=1):
+        stats = self.current()
+        if stats is not None:
+            stats.add_rejected(reason, count)
+        else:
+            with self.lock:
+                self.unassigned[reason] = self.unassigned.get(reason, 0) + count
+
+    def add_duplicate(self):
+        stats = self.current()
+        if stats is not None:
+            stats.add_duplicate()
+
+    def add_latency(self, duration):
+        stats = self.current()
+        if stats is not None:
+            stats.add_latency(duration)
+
+    def as_dict(self, session_id=1):
+        stats = self.sessions.get(session_id)
+        data = (stats or SessionStats()).as_dict()
+        with self.lock:
+            data['unassigned_rejected'] = dict(self.unassigned)
+        return data
+
+
+session_stats = StatsRegistry()
@@ -7,4 +7,13 @@ urlpatterns = [
     url(r'^voting/attendance/shares/$',
         views.AttendanceView.as_view(),
         name='voting_attendance'),
+    url(r'^voting/export/ballots/(?P<poll_type>motion|assignment)/$',
+        views.BallotExportView.as_view(),
+        name='voting_export_ballots'),
+    url(r'^voting/metrics/$',
+        views.MetricsView.as_view(),
+        name='voting_metrics'),
+    url(r'^voting/stats/$',
+        views.StatsView.as_view(),
+        name='voting_stats'),
 ] + urls.urlpatterns
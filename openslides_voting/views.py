@@ -1,9 +1,15 @@
+import codecs
+import csv
 import random
 
 from decimal import Decimal
+from itertools import chain
 
+from django.conf import settings
 from django.db import transaction
-from django.http.response import HttpResponse, JsonResponse
+from django.http.response import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.utils.decorators import method_decorator
 from django.utils.translation import ugettext as _
 from django.views import View
@@ -15,23 +21,37 @@ from openslides.core.models import Projector, Countdown
 from openslides.motions.models import Category, Motion, MotionPoll
 from openslides.users.models import User
 from openslides.utils.auth import has_perm
-from openslides.utils.autoupdate import inform_changed_data, inform_deleted_data
+from openslides.utils.autoupdate import inform_changed_data
+from openslides.utils.exceptions import OpenSlidesError
 from openslides.utils.rest_api import (
     detail_route,
+    GenericViewSet,
+    ListModelMixin,
     ModelViewSet,
+    RetrieveModelMixin,
     ValidationError,
     list_route,
     Response
 )
+from rest_framework.parsers import MultiPartParser
 
-from .votecollector import rpc
+from . import archive, coherence, export, metrics, querybudget
+from .attendance import get_attendance
+from .cache import principle_index
+from .coherence import generations
+from .recorder import recorder
+from .routers import read_database
+from .stats import session_stats
+from .votecollector import poller, reconcile, rollcall, rpc
 
 from .access_permissions import (
     permission_required,
     AssignmentAbsenteeVoteAccessPermissions,
     AssignmentPollBallotAccessPermissions,
     AssignmentPollTypeAccessPermissions,
+    AttendanceAccessPermissions,
     AttendanceLogAccessPermissions,
+    AuthorizedVoterAccessPermissions,
     AuthorizedVotersAccessPermissions,
     KeypadAccessPermissions,
     MotionAbsenteeVoteAccessPermissions,
@@ -41,14 +61,18 @@ from .access_permissions import (
     VotingProxyAccessPermissions,
     VotingPrincipleAccessPermissions,
     VotingShareAccessPermissions,
-    VotingTokenAccessPermissions
+    VotingTokenAccessPermissions,
+    VoteCollectorReceiverAccessPermissions,
 )
 from .models import (
     AssignmentAbsenteeVote,
     AssignmentPollBallot,
     AssignmentPollType,
+    Attendance,
     AttendanceLog,
+    AuthorizedVoter,
     AuthorizedVoters,
+    BallotArchive,
     Keypad,
     MotionAbsenteeVote,
     MotionPollBallot,
@@ -57,17 +81,21 @@ from .models import (
     VotingPrinciple,
     VotingProxy,
     VotingShare,
-    VotingToken
+    VotingToken,
+    VoteCollectorReceiver,
 )
+from .shares import ShareWriter, import_shares_csv, parse_shares
 from .voting import (
     AssignmentBallot,
     MotionBallot,
     find_authorized_voter,
     get_admitted_delegates,
-    get_total_shares,
 )
 
 
+MAX_ROLL_CALL_WINDOW = 60
+
+
 class PermissionMixin:
     def check_view_permissions(self):
         return self.get_access_permissions().check_permissions(self.request.user)
@@ -108,24 +136,69 @@ class AuthorizedVotersViewSet(PermissionMixin, ModelViewSet):
     queryset  = AuthorizedVoters.objects.all()
 
 
+class AuthorizedVoterViewSet(PermissionMixin, ListModelMixin, RetrieveModelMixin, GenericViewSet):
+    """
+    Read-only API for the authorized voters of the current voting.
+    """
+    access_permissions = AuthorizedVoterAccessPermissions()
+    queryset = AuthorizedVoter.objects.all()
+
+
 class VotingControllerViewSet(PermissionMixin, ModelViewSet):
     access_permissions = VotingControllerAccessPermissions()
     queryset = VotingController.objects.all()
 
     prompt_key = 'a016f7ecaf2147b2b656c6edf45c24ef'
     countdown_key = '134ddb26831743d586cbfa17e4712be9'
+    stats_key = '5b1c3a3e0f7d4b8a9c2e6d4f8a1b7c3e'
 
     def check_view_permissions(self):
         """
-        The one and only voting controller is created during migrations.
+        The first voting session is created during migrations. Managers can add voting
+        sessions, e. g. one per room, each with its own keypad range and projector.
         """
-        if self.action in ('list', 'retrieve', 'start_motion', 'start_assignment',
+        if self.action in (
+                'list', 'retrieve', 'create', 'update', 'partial_update', 'destroy',
+                'start_motion', 'start_assignment',
                 'start_speaker_list', 'results_motion_votes', 'results_assignment_votes',
                 'clear_motion_votes', 'clear_assignment_votes', 'stop',
-                'update_votecollector_device_status', 'ping_votecollector'):
+                'update_votecollector_device_status', 'votecollector_voting_status',
+                'ping_votecollector', 'roll_call', 'finish_roll_call'):
             return self.get_access_permissions().check_permissions(self.request.user)
         return False
 
+    def perform_destroy(self, instance):
+        try:
+            instance.delete()
+        except OpenSlidesError as e:
+            raise ValidationError({'detail': str(e)})
+
+    def get_projector_key(self, vc, key):
+        """
+        Returns the key of a projector element of the voting session. The first session
+        uses the plain key.
+        """
+        return key if vc.pk == 1 else '%s-%d' % (key, vc.pk)
+
+    def get_countdown(self, vc, create=True):
+        """
+        Returns the countdown of the voting session or None. The first session uses
+        countdown 2 since 1 is reserved for speakers.
+        """
+        defaults = {'default_time': config['projector_default_countdown'],
+                    'countdown_time': config['projector_default_countdown']}
+        if vc.pk == 1:
+            lookup = {'pk': 2}
+            defaults['description'] = _('Poll is open')
+        else:
+            lookup = {'description': '%s (%s)' % (_('Poll is open'), vc.name or vc.pk)}
+        if not create:
+            return Countdown.objects.filter(**lookup).first()
+        countdown, created = Countdown.objects.get_or_create(defaults=defaults, **lookup)
+        if not created:
+            countdown.control(action='reset')
+        return countdown
+
     @detail_route(['post'])
     def start_motion(self, request, **kwargs):
         """
@@ -142,6 +215,22 @@ class VotingControllerViewSet(PermissionMixin, ModelViewSet):
         """
         return self.start_voting(request, AssignmentPoll)
 
+    def lock_poll(self, vc, poll, poll_id):
+        """
+        Locks the poll until the end of the transaction, so it cannot be archived
+        meanwhile. Raises a ValidationError if the poll is archived or another session
+        is voting on a poll with this id.
+        """
+        archive.lock_poll(poll)
+        # The vote URLs do not contain the session. A poll id may only be voted on in one session.
+        if VotingController.objects.filter(
+                is_voting=True, voting_mode__in=('MotionPoll', 'AssignmentPoll'),
+                voting_target=poll_id).exclude(pk=vc.pk).exists():
+            raise ValidationError({'detail': _('Another voting session is voting on a poll with this id.')})
+        if BallotArchive.get(poll) is not None:
+            raise ValidationError({'detail': _('The ballots of this poll are archived. Clear the votes first.')})
+
+    @querybudget.query_budget(60)
     def start_voting(self, request, model):
         vc = self.get_object()
         poll, poll_id = self.get_request_object(request, model)
@@ -247,56 +336,91 @@ class VotingControllerViewSet(PermissionMixin, ModelViewSet):
         else:
             raise ValidationError({'detail': 'Not supported type {}.'.format(type(poll))})
 
-        # Delete all old votes and create absentee ballots
-        ballot.delete_ballots()
-        absentee_ballots_created = 0
-        if config['voting_enable_proxies']:
-            absentee_ballots_created = ballot.create_absentee_ballots()
-
         if voting_type.startswith('votecollector'):
             if not config['voting_enable_votecollector']:
                 raise ValidationError({'detail': 'The VoteCollector is not enabled'})
+            self.check_receivers_free(vc)
 
-            # Stop any active voting no matter what mode.
-            self.force_stop_active_votecollector()
+        # Delete all old votes and create absentee ballots
+        with transaction.atomic():
+            self.lock_poll(vc, poll, poll_id)
+            ballot.delete_ballots()
+            absentee_ballots_created = 0
+            if config['voting_enable_proxies']:
+                absentee_ballots_created = ballot.create_absentee_ballots()
 
-            url = rpc.get_callback_url(request) + votecollector_resource
-            url += '%s/' % poll_id
+        # The VoteCollector is called outside of transactions, so the database is not
+        # locked while waiting for the receivers.
+        if voting_type.startswith('votecollector'):
+            # Stop any active voting of the session no matter what mode.
+            self.force_stop_active_votecollector(vc)
+
+            if config['voting_votecollector_pull_only']:
+                # Votes are pulled from the votecollector on stop.
+                url = None
+            else:
+                url = rpc.get_callback_url(request) + votecollector_resource
+                url += '%s/' % poll_id
 
             try:
-                vc.votes_count, vc.device_status = rpc.start_voting(votecollector_mode, url, votecollector_options)
+                vc.votes_count, vc.device_status = rpc.start_voting(
+                    votecollector_mode, url, votecollector_options, device_status=poller.get_device_status(),
+                    session=vc)
             except rpc.VoteCollectorError as e:
                 raise ValidationError({'detail': e.value})
 
-            # Limit voters count to length of admitted delegates list.
-            admitted_count, admitted_delegates = get_admitted_delegates(principle, keypad=True)
-            if not voting_type == 'votecollector_anonymous':
-                vc.votes_count = admitted_count
-
-        elif voting_type == 'named_electronic':
-            # Limit voters count to length of admitted delegates list.
-            vc.votes_count, admitted_delegates = get_admitted_delegates(principle)
-
-        else:  # 'token_based_electronic'
-            admitted_delegates = None
-            vc.votes_count = 0  # We do not know, how many votes will come..
-
-        vc.voting_mode = model.__name__
-        vc.voting_target = poll_id
-        vc.votes_received = absentee_ballots_created
-        vc.is_voting = True
-        vc.principle = principle
-        vc.save()
-
-        # Update AuthorizedVoter object
-        if type(poll) == MotionPoll:
-            AuthorizedVoters.set_voting(admitted_delegates, voting_type, motion_poll=poll)
-        else:
-            AuthorizedVoters.set_voting(admitted_delegates, voting_type, assignment_poll=poll)
+        try:
+            with transaction.atomic():
+                # Lock the poll again until the voting is committed. It may have been
+                # archived while the VoteCollector was started.
+                self.lock_poll(vc, poll, poll_id)
+                if voting_type.startswith('votecollector'):
+                    # Limit voters count to length of admitted delegates list.
+                    admitted_count, admitted_delegates = get_admitted_delegates(principle, keypad=True, session=vc)
+                    if not voting_type == 'votecollector_anonymous':
+                        vc.votes_count = admitted_count
+
+                elif voting_type == 'named_electronic':
+                    # Limit voters count to length of admitted delegates list.
+                    vc.votes_count, admitted_delegates = get_admitted_delegates(principle, session=vc)
+
+                else:  # 'token_based_electronic'
+                    admitted_delegates = None
+                    vc.votes_count = 0  # We do not know, how many votes will come..
+
+                # Remember the start of the voting.
+                poll_type_model = MotionPollType if isinstance(poll, MotionPoll) else AssignmentPollType
+                poll_type, _created = poll_type_model.objects.get_or_create(poll=poll, defaults={'type': voting_type})
+                poll_type.started = timezone.now()
+                poll_type.save()
+
+                vc.voting_mode = model.__name__
+                vc.voting_target = poll_id
+                vc.votes_received = absentee_ballots_created
+                vc.is_voting = True
+                vc.principle = principle
+                vc.save()
+
+                # Update AuthorizedVoter object
+                if type(poll) == MotionPoll:
+                    vc.authorized_voters.set_voting(admitted_delegates, voting_type, motion_poll=poll)
+                else:
+                    vc.authorized_voters.set_voting(admitted_delegates, voting_type, assignment_poll=poll)
+        except Exception:
+            # Do not leave the receivers voting on a voting which was not saved.
+            if voting_type.startswith('votecollector'):
+                try:
+                    rpc.stop_voting(rpc.get_receivers(vc))
+                except rpc.VoteCollectorError:
+                    pass
+            raise
+        session_stats.reset((vc.pk, vc.voting_mode, vc.voting_target))
+        recorder.start(vc, voting_type, admitted_delegates)
 
         # Add projector message
-        # search projector with an projected "related item". This item might be the motion/assignment
-        # itself or the voting/(motion/assignment)-poll slide. If none was found, use the default projector
+        # Use the projector of the voting session. Else search projector with an projected "related item".
+        # This item might be the motion/assignment itself or the voting/(motion/assignment)-poll slide.
+        # If none was found, use the default projector
 
         if type(poll) == MotionPoll:
             objectElementName = 'motions/motion'
@@ -307,8 +431,8 @@ class VotingControllerViewSet(PermissionMixin, ModelViewSet):
             objectElementId = poll.assignment.id
             pollElementName = 'voting/assignment-poll'
 
-        projector = None
-        found_projector = False
+        projector = vc.projector
+        found_projector = projector is not None
         for p in Projector.objects.all():
             if found_projector:
                 break
@@ -324,26 +448,25 @@ class VotingControllerViewSet(PermissionMixin, ModelViewSet):
         if not found_projector:
             projector = Projector.objects.get(id=1)
 
-        projector.config[self.prompt_key] = {
+        projector.config[self.get_projector_key(vc, self.prompt_key)] = {
             'name': 'voting/prompt',
             'message': projector_message,
             'stable': True
         }
+        if config['voting_show_stats']:
+            projector.config[self.get_projector_key(vc, self.stats_key)] = {
+                'name': 'voting/stats',
+                'session': vc.pk,
+                'stable': True
+            }
 
         # Auto start countdown and add it to projector.
         if config['voting_auto_countdown']:
-            # Use countdown 2 since 1 is reserved for speakers list.
-            countdown, created = Countdown.objects.get_or_create(
-                pk=2, description=_('Poll is open'),
-                defaults={'default_time': config['projector_default_countdown'],
-                          'countdown_time': config['projector_default_countdown']}
-            )
-            if not created:
-                countdown.control(action='reset')
+            countdown = self.get_countdown(vc)
             countdown.control(action='start')
-            projector.config[self.countdown_key] = {
+            projector.config[self.get_projector_key(vc, self.countdown_key)] = {
                 'name': 'core/countdown',
-                'id': 2,
+                'id': countdown.pk,
                 'stable': True
             }
         projector.save(information={'voting_prompt': True})
@@ -362,14 +485,19 @@ class VotingControllerViewSet(PermissionMixin, ModelViewSet):
 
         vc = self.get_object()
         item, item_id = self.get_request_object(request, Item, attr_name='item_id')
+        if VotingController.objects.filter(
+                is_voting=True, voting_mode='Item', voting_target=item_id).exclude(pk=vc.pk).exists():
+            raise ValidationError({'detail': _('Another voting session is voting on this agenda item.')})
+        self.check_receivers_free(vc)
 
-        # Stop any active voting no matter what mode.
-        self.force_stop_active_votecollector()
+        # Stop any active voting of the session no matter what mode.
+        self.force_stop_active_votecollector(vc)
 
         url = rpc.get_callback_url(request) + '/speaker/' + str(item_id) + '/'
 
         try:
-            vc.votes_count, vc.device_status = rpc.start_voting('SpeakerList', url)
+            vc.votes_count, vc.device_status = rpc.start_voting(
+                'SpeakerList', url, device_status=poller.get_device_status(), session=vc)
         except rpc.VoteCollectorError as e:
             raise ValidationError({'detail': e.value})
 
@@ -379,9 +507,10 @@ class VotingControllerViewSet(PermissionMixin, ModelViewSet):
         vc.is_voting = True
         vc.principle = None
         vc.save()
+        recorder.start(vc, 'votecollector', None)
 
-        projector = Projector.objects.get(id=1)
-        projector.config[self.prompt_key] = {
+        projector = vc.projector or Projector.objects.get(id=1)
+        projector.config[self.get_projector_key(vc, self.prompt_key)] = {
             'name': 'voting/icon',
             'stable': True
         }
@@ -403,6 +532,7 @@ class VotingControllerViewSet(PermissionMixin, ModelViewSet):
         """
         return self.results_votes(request, AssignmentPoll, AssignmentBallot, 'assignmentpolltype')
 
+    @querybudget.query_budget(20)
     def results_votes(self, request, poll_model, ballot_model, poll_type_str):
         poll, poll_id = self.get_request_object(request, poll_model)
         vc = self.get_object()
@@ -412,7 +542,8 @@ class VotingControllerViewSet(PermissionMixin, ModelViewSet):
 
         # Count the votes of the ballot.
         ballot = ballot_model(poll, vc.principle)
-        result = ballot.count_votes()
+        with read_database(poll_model.__name__, poll_id):
+            result = ballot.count_votes()
 
         # Destroy the ballots for secret voting types.
         voting_type = getattr(poll, poll_type_str).type
@@ -450,6 +581,8 @@ class VotingControllerViewSet(PermissionMixin, ModelViewSet):
         else:  # AssignmentPoll
             ballot = AssignmentBallot(poll)
         ballot.delete_ballots()
+        # Reads of the read database wait until it has the cleared ballots.
+        generations.bump(coherence.VOTING)
 
         vc = self.get_object()
         vc.votes_received = 0
@@ -460,41 +593,55 @@ class VotingControllerViewSet(PermissionMixin, ModelViewSet):
     @detail_route(['post'])
     def stop(self, request, **kwargs):
         """
-        Stops a current voting/election
+        Stops a current voting/election.
+
+        For votecollector polls the full result is pulled from the votecollector after
+        stopping it. Missing votes are inserted and the reconciliation report is returned:
+        {reconciliation: {received, inserted, missing, differences, rejected}}.
         """
         vc = self.get_object()
+        av = vc.authorized_voters
 
-        # Remove voting prompt from all projectors.
+        # Stop countdown. Do not create a new countdown on stop action.
+        keys = [self.get_projector_key(vc, self.prompt_key), self.get_projector_key(vc, self.stats_key)]
+        if config['voting_auto_countdown']:
+            countdown = self.get_countdown(vc, create=False)
+            if countdown is not None:
+                countdown.control(action='stop')
+            keys.append(self.get_projector_key(vc, self.countdown_key))
+
+        # Remove voting prompt, statistics and countdown of the session from all projectors.
         for projector in Projector.objects.all():
-            try:
-                del projector.config[self.prompt_key]
-            except KeyError:
-                pass
+            removed = [projector.config.pop(key) for key in keys if key in projector.config]
+            if removed:
+                projector.save(information={'voting_prompt': True})
+
+        report = None
+        if config['voting_enable_votecollector']:
+            self.force_stop_active_votecollector(vc)
+            # Write the received votes counters of this process.
+            poller.receiver_counter.flush()
 
-            # Stop countdown and remove it from projector.
-            if config['voting_auto_countdown']:
+            # Insert votes the server did not receive.
+            if vc.is_voting and av.type.startswith('votecollector'):
                 try:
-                    countdown = Countdown.objects.get(pk=2)
-                except Countdown.DoesNotExist:
-                    pass  # Do not create a new countdown on stop action
+                    report = reconcile.reconcile_votes(vc, av)
+                except rpc.VoteCollectorError as e:
+                    report = {'detail': e.value}
                 else:
-                    countdown.control(action='stop')
-                    try:
-                        del projector.config[self.countdown_key]
-                    except KeyError:
-                        pass
-            projector.save(information={'voting_prompt': True})
+                    if report:
+                        vc.votes_received += report['inserted']
+
+        if vc.is_voting:
+            recorder.stop(vc)
 
         # Attention: We purposely set is_voting to False even if stop_voting fails.
         vc.is_voting = False
         vc.save()
 
-        AuthorizedVoters.clear_voting()
+        av.clear_voting()
 
-        if config['voting_enable_votecollector']:
-            self.force_stop_active_votecollector()
-
-        return Response()
+        return Response({'reconciliation': report})
 
     def get_request_object(self, request, model, attr_name='poll_id'):
         obj_id = request.data.get(attr_name, None)
@@ -509,28 +656,46 @@ class VotingControllerViewSet(PermissionMixin, ModelViewSet):
     @detail_route(['post'])
     def update_votecollector_device_status(self, request, **kwargs):
         """
-        Gets the device status from the votecollector. Updates the device_status
-        field from the votingcontroller.
+        Returns the device status of the votecollector. The status is read from the
+        status cache which is refreshed by a background poller. Send {force: true}
+        to query the votecollector now. The device_status field of the votingcontroller
+        is updated whenever the status changes.
         """
         if not config['voting_enable_votecollector']:
             raise ValidationError({'detail': _('The VoteCollector is not enabled.')})
 
-        vc = self.get_object()
+        force = isinstance(request.data, dict) and request.data.get('force') is True
         try:
-            status = rpc.get_device_status()
+            status = poller.get_device_status(force=force)
         except rpc.VoteCollectorError as e:
-            vc.device_status = e.value
-            vc.save()
             raise ValidationError({'detail': e.value})
 
         # Typical status messages: 'Device: None. Status: Disconnected', 'Device: Simulator. Status: Connected'
-        vc.device_status = status
-        vc.save()
         return Response({
             'device': status,
-            'connected': ' connected' in status.lower()
+            'connected': ' connected' in status.lower(),
+            'updated': poller.get_device_status_time()
         })
 
+    @detail_route(['post'])
+    def votecollector_voting_status(self, request, **kwargs):
+        """
+        Returns the cached voting status of the votecollector: {elapsed: <seconds>, received: <count>}.
+        Send {force: true} to query the votecollector now.
+        """
+        if not config['voting_enable_votecollector']:
+            raise ValidationError({'detail': _('The VoteCollector is not enabled.')})
+
+        force = isinstance(request.data, dict) and request.data.get('force') is True
+        try:
+            status = poller.get_voting_status(self.get_object(), force=force)
+        except rpc.VoteCollectorError as e:
+            raise ValidationError({'detail': e.value})
+
+        if status is None:
+            return Response({'elapsed': 0, 'received': 0})
+        return Response({'elapsed': status[0], 'received': status[1]})
+
     @detail_route(['post'])
     def ping_votecollector(self,request, **kwargs):
         """
@@ -540,19 +705,21 @@ class VotingControllerViewSet(PermissionMixin, ModelViewSet):
             raise ValidationError({'detail': _('The VoteCollector is not enabled.')})
 
         vc = self.get_object()
+        self.check_receivers_free(vc)
 
-        # Stop any active voting no matter what mode.
-        self.force_stop_active_votecollector()
+        # Stop any active voting of the session no matter what mode.
+        self.force_stop_active_votecollector(vc)
         url = rpc.get_callback_url(request) + '/keypad/'
 
         try:
-            vc.votes_count, vc.device_status = rpc.start_voting('Ping', url)
+            vc.votes_count, vc.device_status = rpc.start_voting(
+                'Ping', url, device_status=poller.get_device_status(), session=vc)
         except rpc.VoteCollectorError as e:
             raise ValidationError({'detail': e.value})
 
-        # Clear in_range and battery_level of all keypads.
+        # Clear in_range and battery_level of all keypads of the session.
         # We intentionally do not trigger an autoupdate.
-        Keypad.objects.all().update(in_range=False, battery_level=-1)
+        Keypad.objects.filter(vc.get_keypad_filter()).update(in_range=False, battery_level=-1)
 
         vc.voting_mode = 'ping'
         vc.voting_target = vc.votes_received = 0
@@ -562,13 +729,69 @@ class VotingControllerViewSet(PermissionMixin, ModelViewSet):
 
         return Response()
 
-    def force_stop_active_votecollector(self):
+    @detail_route(['post'])
+    def roll_call(self, request, **kwargs):
+        """
+        Starts a roll call: pings all keypads of the voting session and returns at once with
+        {window: <seconds>}, the number of seconds (request data, default VOTING_ROLL_CALL_WINDOW,
+        at most MAX_ROLL_CALL_WINDOW) the client waits before it calls finish_roll_call.
+        Refused while a voting of the session is active.
+        """
+        if not config['voting_enable_votecollector']:
+            raise ValidationError({'detail': _('The VoteCollector is not enabled.')})
+
+        window = request.data.get('window') if isinstance(request.data, dict) else None
+        if window is None:
+            window = rollcall.get_roll_call_window()
+        elif not isinstance(window, int) or not 0 < window <= MAX_ROLL_CALL_WINDOW:
+            raise ValidationError({'detail': 'The window has to be a number of seconds between 1 and {}.'.format(
+                MAX_ROLL_CALL_WINDOW)})
+
+        vc = self.get_object()
+        if vc.is_voting:
+            raise ValidationError({'detail': _('A voting of this voting session is active.')})
+        self.check_receivers_free(vc)
+        url = rpc.get_callback_url(request) + '/keypad/'
+        if config['voting_votecollector_pull_only']:
+            url = None
+        try:
+            rollcall.start_roll_call(url, session=vc)
+        except rpc.VoteCollectorError as e:
+            raise ValidationError({'detail': e.value})
+        return Response({'window': window})
+
+    @detail_route(['post'])
+    def finish_roll_call(self, request, **kwargs):
+        """
+        Stops the roll call of the voting session and marks exactly the users whose keypad
+        responded as present. Returns {responded, present, absent, changed}.
+        """
+        vc = self.get_object()
+        try:
+            report = rollcall.finish_roll_call(vc)
+        except rpc.VoteCollectorError as e:
+            raise ValidationError({'detail': e.value})
+        return Response(report)
+
+    def check_receivers_free(self, vc):
         """
-        Stops any orphaned votecollector voting.
+        Raises a ValidationError if a receiver of the voting session is used by a
+        VoteCollector voting of another session.
+        """
+        if {receiver.uri for receiver in rpc.get_receivers(vc)} & rpc.get_busy_receivers(vc):
+            raise ValidationError({'detail': _(
+                'The VoteCollector of this voting session is used by another voting session.')})
+
+    def force_stop_active_votecollector(self, vc):
+        """
+        Stops any orphaned votecollector voting on the receivers of the voting session.
+        Receivers used by VoteCollector votings of other sessions are not stopped.
         """
         if config['voting_enable_votecollector']:
+            busy = rpc.get_busy_receivers(vc)
+            receivers = [receiver for receiver in rpc.get_receivers(vc) if receiver.uri not in busy]
             try:
-                rpc.stop_voting()
+                rpc.stop_voting(receivers)
             except rpc.VoteCollectorError:
                 pass
 
@@ -578,6 +801,11 @@ class KeypadViewSet(VoteCollectorPermissionMixin, ModelViewSet):
     queryset = Keypad.objects.all()
 
 
+class VoteCollectorReceiverViewSet(VoteCollectorPermissionMixin, ModelViewSet):
+    access_permissions = VoteCollectorReceiverAccessPermissions()
+    queryset = VoteCollectorReceiver.objects.all()
+
+
 class VotingPrincipleViewSet(PrinciplesPermissionMixin, ModelViewSet):
     access_permissions = VotingPrincipleAccessPermissions()
     queryset = VotingPrinciple.objects.all()
@@ -597,24 +825,18 @@ class VotingPrincipleViewSet(PrinciplesPermissionMixin, ModelViewSet):
         motions_id = request.data.get('motions_id', [])
         assignments_id = request.data.get('assignments_id', [])
 
-        principles = VotingPrinciple.objects
-        if exclude is not None:
-            principles = principles.exclude(id=exclude.pk)
-
-        for principle in principles.all():
-            #from pdb import set_trace;set_trace();
-            for motion_id in motions_id:
-                if motion_id in principle.motions.values_list('pk', flat=True):
-                    raise ValidationError({
-                        'detail': 'Motion {} has already the principle {}!'.format(
-                            Motion.objects.get(pk=motion_id).title,
-                            principle.name)})
-            for assignment_id in assignments_id:
-                if assignment_id in principle.assignments.values_list('pk', flat=True):
-                    raise ValidationError({
-                        'detail': 'Election {} has already the principle {}!'.format(
-                            Assignment.objects.get(pk=assignment_id).title,
-                            principle.name)})
+        conflict = principle_index.find_conflict(motions_id, assignments_id, exclude=exclude)
+        if conflict is not None:
+            kind, pk, principle = conflict
+            if kind == 'motion':
+                raise ValidationError({
+                    'detail': 'Motion {} has already the principle {}!'.format(
+                        Motion.objects.get(pk=pk).title,
+                        principle.name)})
+            raise ValidationError({
+                'detail': 'Election {} has already the principle {}!'.format(
+                    Assignment.objects.get(pk=pk).title,
+                    principle.name)})
 
     def create(self, request, *args, **kwargs):
         self.validate_motions_and_assignments(request)
@@ -631,53 +853,76 @@ class VotingShareViewSet(PrinciplesPermissionMixin, ModelViewSet):
     queryset = VotingShare.objects.all()
 
     @list_route(methods=['post'])
-    @transaction.atomic
     def mass_import(self, request):
         """
-        Imports a list of VotingShare objects.
+        Imports a list of VotingShare objects: {shares: [{delegate_id, principle_id, shares}, ...]}
 
         Updates existing objects and creates new ones. Deletes existing objects if shares are zero.
+        The existing shares are loaded with one query and changes are written in bulk in chunks
+        of 1000 rows, each chunk in its own transaction. All rows are validated before the first
+        chunk is written.
 
         Clients are not being updated to avoid worker being overloaded. Clients need to refresh the store:
         >> VotingShare.ejectAll();
         >> VotingShare.findAll();
-        :return: Number of delegates with voting shares
+        :return: Number of delegates with voting shares and the import summary with per chunk progress.
         """
         data = request.data.get('shares')
         if not isinstance(data, list):
             raise ValidationError({'detail': _('Shares has to be a list.')})
 
-        created_shares = []
-        deleted = []
+        # Validate all rows before the first chunk is written.
+        rows = []
         for d in data:
-            vs = VotingShare(**d)
+            if not isinstance(d, dict):
+                raise ValidationError({'detail': _('Each share has to be a dict.')})
+            if d.get('delegate_id') is None:
+                # Rows of anonymous users are skipped.
+                continue
+            if not isinstance(d['delegate_id'], int):
+                raise ValidationError({'detail': _('The delegate_id has to be an int.')})
+            principle_id = d.get('principle_id')
+            if principle_id is not None and not isinstance(principle_id, int):
+                raise ValidationError({'detail': _('The principle_id has to be an int.')})
             try:
-                # Look for an existing object and update its shares.
-                existing = VotingShare.objects.get(delegate_id=vs.delegate_id, principle_id=vs.principle_id)
-                if vs.shares == 0:
-                    deleted.append(existing.id)
-                elif vs.shares != float(existing.shares):
-                    vs.id = existing.id
-                    vs.save(skip_autoupdate=True)
-            except VotingShare.DoesNotExist:
-                # Append the data object for bulk create.
-                if vs.shares > 0:
-                    created_shares.append(vs)
-
-        # Delete shares.
-        del_shares = VotingShare.objects.filter(id__in=deleted)
-        del_shares.delete()
-
-        # Bulk create new shares.
-        VotingShare.objects.bulk_create(created_shares)
-
-        # FIXME: Delete cache keys so clients will get fresh data from db wit VotingShare.findAll().
-        # from django.core import cache
-        # cache.delete_pattern('*voting-share*')  # This works only for redis.
-        # cache.delete()
+                shares = parse_shares(d.get('shares'))
+            except ValueError as e:
+                raise ValidationError({'detail': str(e)})
+            rows.append((d['delegate_id'], principle_id, shares))
+
+        writer = ShareWriter()
+        for delegate_id, principle_id, shares in rows:
+            writer.add(delegate_id, principle_id, shares)
+        summary = writer.close()
 
         # Return number of delegates with shares.
-        return Response({'count': User.objects.exclude(shares=None).count()})
+        summary['count'] = User.objects.exclude(shares=None).count()
+        return Response(summary)
+
+    @list_route(methods=['post'], parser_classes=[MultiPartParser])
+    def import_csv(self, request):
+        """
+        Imports voting shares from an uploaded CSV file (multipart form field 'file').
+
+        The file is parsed on the server row by row. Columns: first name, last name,
+        participant number and one column per voting principle (header 'name' or
+        'name.<decimal places>'). Nothing is imported if any row is invalid. Otherwise
+        missing principles are created.
+
+        Clients are not being updated. They need to refresh the VotingShare store.
+        :return: Number of delegates with voting shares, import summary and row errors.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'detail': _('A CSV file has to be uploaded.')})
+
+        try:
+            summary = import_shares_csv(codecs.iterdecode(upload, 'utf-8-sig'))
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            raise ValidationError({'detail': str(e)})
+
+        summary['count'] = User.objects.exclude(shares=None).count()
+        return Response(summary)
 
 
 class VotingProxyViewSet(ProxiesPermissionMixin, ModelViewSet):
@@ -696,6 +941,20 @@ class AssignmentAbsenteeVoteViewSet(ProxiesPermissionMixin, ModelViewSet):
 
 
 class BasePollBallotViewSet(PermissionMixin, ModelViewSet):
+    # Ballots changed through the REST API change the results, so the read database
+    # (see routers.py) must not be used until it has the changes.
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        generations.bump(coherence.VOTING)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        generations.bump(coherence.VOTING)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        generations.bump(coherence.VOTING)
+
     def get_poll(self, request, model):
         if not isinstance(request.data, dict):
             raise ValidationError({'detail': 'Data must be a dictionary.'})
@@ -715,6 +974,7 @@ class MotionPollBallotViewSet(BasePollBallotViewSet):
     queryset = MotionPollBallot.objects.all()
 
     @list_route(methods=['post'])
+    @querybudget.query_budget(25)
     def recount_votes(self, request):
         """
         Recounts all votes for a given poll.
@@ -725,7 +985,8 @@ class MotionPollBallotViewSet(BasePollBallotViewSet):
         # Count ballot votes.
         principle = VotingPrinciple.get(motion=poll.motion)
         ballot = MotionBallot(poll, principle)
-        result = ballot.count_votes()
+        with read_database('MotionPoll', poll.pk):
+            result = ballot.count_votes()
 
         # Update motion poll.
         votes = {
@@ -754,6 +1015,7 @@ class AssignmentPollBallotViewSet(BasePollBallotViewSet):
     queryset = AssignmentPollBallot.objects.all()
 
     @list_route(methods=['post'])
+    @querybudget.query_budget(25)
     def recount_votes(self, request):
         """
         Recounts all votes for a given poll.
@@ -764,11 +1026,15 @@ class AssignmentPollBallotViewSet(BasePollBallotViewSet):
         # Count ballot votes.
         principle = VotingPrinciple.get(assignment=poll.assignment)
         ballot = AssignmentBallot(poll, principle)
-        result = ballot.count_votes()
+        with read_database('AssignmentPoll', poll.pk):
+            result = ballot.count_votes()
 
         # Update assignment poll.
+        # Writing the votes of an option needs some queries per vote value.
+        options = poll.get_options()
+        querybudget.allow(len(options) * 10)
         if poll.pollmethod in ('yn', 'yna'):
-            for option in poll.get_options():
+            for option in options:
                 cid = str(option.candidate_id)
                 votes = {
                     'Yes': result[cid]['Y'][1],
@@ -778,7 +1044,7 @@ class AssignmentPollBallotViewSet(BasePollBallotViewSet):
                     votes['Abstain'] = result[cid]['A'][1]
                 poll.set_vote_objects_with_values(option, votes, skip_autoupdate=True)
         else:  # votes
-            for option in poll.get_options():
+            for option in options:
                 cid = str(option.candidate_id)
                 votes = {'Votes': result[cid][1]}
                 poll.set_vote_objects_with_values(option, votes, skip_autoupdate=True)
@@ -835,21 +1101,96 @@ class AssignmentPollTypeViewSet(BasePollTypeViewSet):
     queryset = AssignmentPollType.objects.all()
 
 
+class AttendanceViewSet(VoteCollectorPermissionMixin, ListModelMixin, RetrieveModelMixin, GenericViewSet):
+    """
+    Read-only API for the current attendance.
+    """
+    access_permissions = AttendanceAccessPermissions()
+    queryset = Attendance.objects.all()
+
+
 class AttendanceLogViewSet(VoteCollectorPermissionMixin, ModelViewSet):
     access_permissions = AttendanceLogAccessPermissions()
-    queryset = AttendanceLog.objects.all()
+    queryset = AttendanceLog.objects.get_full_queryset()
+
+    def get_time_param(self, request, name):
+        value = request.query_params.get(name) or request.data.get(name)
+        if not value:
+            return None
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValidationError({'detail': 'Invalid date and time for {}: {}'.format(name, value)})
+        if timezone.is_naive(moment) and settings.USE_TZ:
+            moment = timezone.make_aware(moment)
+        return moment
+
+    def serialize_sample(self, sample):
+        return {
+            'created': sample['created'],
+            'heads': sample['heads'],
+            'shares': {principle_id: float(shares) for principle_id, shares in sample['shares'].items()},
+        }
 
     @list_route(methods=['post'])
-    def clear(cls, request):
-        logs = AttendanceLog.objects.all()
-        args = []
-        for log in logs:
-            args.append((log.get_collection_string(), log.pk))
-        logs.delete()
-        # Trigger autoupdate and setup response.
-        if len(args) > 0:
-            inform_deleted_data(args)
-        return Response({'detail': 'All attendance logs deleted successfully.'})
+    def clear(self, request):
+        """
+        Deletes all attendance logs or all logs created before {before: <datetime>}.
+        """
+        count = AttendanceLog.clear(before=self.get_time_param(request, 'before'))
+        return Response({'detail': 'All attendance logs deleted successfully.', 'count': count})
+
+    @list_route(methods=['get'])
+    def history(self, request):
+        """
+        Returns the attendance samples between ?start=<datetime> and ?end=<datetime> in
+        chronological order. With ?interval=<seconds> only the last sample of each
+        interval is returned.
+        """
+        try:
+            interval = int(request.query_params.get('interval') or 0)
+        except ValueError:
+            raise ValidationError({'detail': 'The interval has to be a number of seconds.'})
+        if interval < 0:
+            raise ValidationError({'detail': 'The interval must not be negative.'})
+        samples = AttendanceLog.get_history(
+            start=self.get_time_param(request, 'start'),
+            end=self.get_time_param(request, 'end'),
+            interval=interval)
+        return Response([self.serialize_sample(sample) for sample in samples])
+
+    @list_route(methods=['get'])
+    def at(self, request):
+        """
+        Returns the attendance at ?time=<datetime> or at the start of ?motion_poll=<id>
+        or ?assignment_poll=<id>. The response is null if there is no sample before.
+        """
+        if request.query_params.get('motion_poll'):
+            moment = self.get_poll_start(MotionPollType, request.query_params['motion_poll'])
+        elif request.query_params.get('assignment_poll'):
+            moment = self.get_poll_start(AssignmentPollType, request.query_params['assignment_poll'])
+        else:
+            moment = self.get_time_param(request, 'time')
+            if moment is None:
+                raise ValidationError({'detail': 'time, motion_poll or assignment_poll is required.'})
+
+        log = AttendanceLog.get_at(moment)
+        if log is None:
+            return Response(None)
+        return Response(self.serialize_sample({
+            'created': log.created,
+            'heads': log.heads,
+            'shares': log.get_shares(),
+        }))
+
+    def get_poll_start(self, model, poll_id):
+        try:
+            poll_id = int(poll_id)
+        except ValueError:
+            raise ValidationError({'detail': 'The poll id has to be a number.'})
+        started = model.objects.filter(poll_id=poll_id).values_list('started', flat=True).first()
+        if started is None:
+            raise ValidationError({'detail': 'The poll has not been started.'})
+        return started
 
 
 class VotingTokenViewSet(ModelViewSet):
@@ -904,9 +1245,9 @@ class VotingTokenViewSet(ModelViewSet):
         Returns True or False, if the token is valid.
         The token has to be given as {token: <token>}.
         """
-        # Check, if there is a token voting active.
-        av = AuthorizedVoters.objects.get()
-        if (not av.motion_poll and not av.assignment_poll) or av.type != 'token_based_electronic':
+        # Check, if there is a token voting active in any voting session.
+        if not AuthorizedVoters.objects.filter(type='token_based_electronic').exclude(
+                motion_poll=None, assignment_poll=None).exists():
             raise ValidationError({'detail': 'No active token voting.'})
         if not isinstance(request.data, dict):
             raise ValidationError({'detail': 'The request data has to be a dict'})
@@ -921,25 +1262,85 @@ class VotingTokenViewSet(ModelViewSet):
         return Response(token_valid)
 
 
+@method_decorator(permission_required('openslides_voting.can_manage'), name='dispatch')
+class BallotExportView(View):
+    """
+    Streams the ballots of polls for audits as CSV or NDJSON:
+    /voting/export/ballots/<motion|assignment>/?polls=<ids>&items=<ids>&format=<csv|ndjson>
+
+    polls and items are comma separated ids or ranges like 1,3,5-9. items selects all
+    polls of the motions or assignments of these agenda items.
+    """
+    http_method_names = ['get']
+
+    def get(self, request, poll_type):
+        model = export.get_ballot_model(poll_type)
+        export_format = request.GET.get('format', 'csv')
+        if model is None or export_format not in export.EXPORT_FORMATS:
+            return JsonResponse({'detail': 'Invalid poll type or format.'}, status=400)
+
+        try:
+            poll_ids = export.parse_id_ranges(request.GET['polls']) if request.GET.get('polls') else None
+            item_ids = export.parse_id_ranges(request.GET['items']) if request.GET.get('items') else None
+        except ValueError as e:
+            return JsonResponse({'detail': str(e)}, status=400)
+        if poll_ids is None and item_ids is None:
+            return JsonResponse({'detail': 'polls or items is required.'}, status=400)
+
+        content_type, stream = export.EXPORT_FORMATS[export_format]
+        # The ballots of archived polls follow the ballots of the other polls.
+        rows = chain(
+            export.iter_ballot_rows(export.query_ballots(model, poll_ids, item_ids)),
+            export.iter_archived_rows(model, poll_ids, item_ids))
+        response = StreamingHttpResponse(stream(rows), content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename="%s-ballots.%s"' % (poll_type, export_format)
+        return response
+
+
 @method_decorator(permission_required('openslides_voting.can_manage'), name='dispatch')
 class AttendanceView(View):
     http_method_names = ['get']
 
+    @querybudget.query_budget(5)
     def get(self, request):
         if not config['voting_enable_votecollector']:
             return JsonResponse({'detail': _('The votecollector is not active')})
 
-        total_shares = get_total_shares()
+        # The attendance is kept up to date on every change and pushed to the clients.
+        return JsonResponse(get_attendance())
+
 
-        # Add an attendance log entry if attendance has changed since last log.
-        latest_head_count = -1
-        if AttendanceLog.objects.exists():
-            latest_head_count = AttendanceLog.objects.first().message['heads']
-        if total_shares['heads'][1] != latest_head_count:
-            message = {}
-            for k, v in total_shares.items():
-                message[str(k)] = float(v[1])
-            log = AttendanceLog(message=message)
-            log.save()
+@method_decorator(permission_required('openslides_voting.can_manage'), name='dispatch')
+class MetricsView(View):
+    """
+    Returns the latency histograms and query counts per stage of the vote submission
+    views collected by this process. Enable with VOTING_METRICS_ENABLED = True.
+    """
+    http_method_names = ['get']
+
+    def get(self, request):
+        return JsonResponse(metrics.metrics.as_dict())
 
-        return JsonResponse(total_shares)
+
+@method_decorator(permission_required('core.can_see_projector'), name='dispatch')
+class StatsView(View):
+    """
+    Returns the live statistics of the current voting of a voting session
+    (?session=<id>, default 1): accepted votes and votes per second, rejected votes by
+    reason, duplicates, request latencies and the backlog of votes counted by the
+    VoteCollector but not received yet.
+    """
+    http_method_names = ['get']
+
+    def get(self, request):
+        try:
+            vc = VotingController.objects.get(pk=int(request.GET.get('session', 1)))
+        except (ValueError, VotingController.DoesNotExist):
+            return JsonResponse({'detail': 'The voting session does not exist.'}, status=400)
+        data = session_stats.as_dict(vc.pk)
+        data.update({
+            'is_voting': vc.is_voting,
+            'votes_count': vc.votes_count,
+            'votes_received': vc.votes_received,
+        })
+        return JsonResponse(data)
@@ -0,0 +1,119 @@
+"""
+Compact encoding of assignment poll ballot votes.
+
+The votes are encoded relative to the candidate ids of the poll in option order:
+
+- yn/yna votes {<candidate_id>: 'Y'|'N'|'A'}: KIND_YNA followed by 2-bit codes per
+  option (0 no vote, 1 Y, 2 N, 3 A), four options per byte starting with the low bits.
+- votes [<candidate_id>, ...] in option order: KIND_VOTES followed by a bitmask of the
+  voted options, eight options per byte starting with the low bit.
+- votes in any other order: KIND_VOTES_ORDERED followed by the option index of each
+  vote in submission order, one byte per vote (options up to 256).
+- 'A', 'N' and 'invalid': KIND_SPECIAL followed by the index of the value.
+- Any other vote (e. g. of a candidate who is no option): KIND_JSON followed by the
+  UTF-8 encoded JSON.
+
+An empty value is the empty dict.
+"""
+import json
+from itertools import compress
+
+
+KIND_JSON = 0
+KIND_YNA = 1
+KIND_VOTES = 2
+KIND_SPECIAL = 3
+KIND_VOTES_ORDERED = 4
+
+YNA_VALUES = (None, 'Y', 'N', 'A')
+YNA_CODES = {'Y': 1, 'N': 2, 'A': 3}
+SPECIAL_VALUES = ('A', 'N', 'invalid')
+
+# Lookup tables for decoding: the four 2-bit codes and the eight bits of each byte.
+YNA_TABLE = [tuple((byte >> shift) & 3 for shift in (0, 2, 4, 6)) for byte in range(256)]
+BIT_TABLE = [tuple((byte >> shift) & 1 for shift in range(8)) for byte in range(256)]
+
+
+def encode_json(vote):
+    return bytes((KIND_JSON, )) + json.dumps(vote, separators=(',', ':')).encode('utf-8')
+
+
+def encode_vote(vote, candidate_ids):
+    """
+    Encodes a vote. candidate_ids are the candidate ids of the poll in option order.
+    """
+    index = {str(candidate_id): i for i, candidate_id in enumerate(candidate_ids)}
+    if isinstance(vote, dict):
+        if not vote:
+            return b''
+        codes = [0] * len(candidate_ids)
+        for candidate_id, value in vote.items():
+            # JSON object keys are strings, so are the decoded keys.
+            candidate_id = str(candidate_id)
+            if candidate_id not in index or value not in YNA_CODES:
+                return encode_json(vote)
+            codes[index[candidate_id]] = YNA_CODES[value]
+        data = bytearray((KIND_YNA, ))
+        for i in range(0, len(codes), 4):
+            byte = 0
+            for shift, code in enumerate(codes[i:i + 4]):
+                byte |= code << (2 * shift)
+            data.append(byte)
+        return bytes(data)
+    if isinstance(vote, list):
+        indices = [index.get(candidate_id) for candidate_id in vote]
+        if not indices or None in indices or len(set(indices)) != len(indices):
+            return encode_json(vote)
+        if indices != sorted(indices):
+            # Keep the submission order.
+            if max(indices) > 255:
+                return encode_json(vote)
+            return bytes((KIND_VOTES_ORDERED, )) + bytes(indices)
+        mask = 0
+        for i in indices:
+            mask |= 1 << i
+        return bytes((KIND_VOTES, )) + mask.to_bytes((len(candidate_ids) + 7) // 8, 'little')
+    if vote in SPECIAL_VALUES:
+        return bytes((KIND_SPECIAL, SPECIAL_VALUES.index(vote)))
+    return encode_json(vote)
+
+
+def decode_codes(data):
+    """
+    Returns the 2-bit codes of KIND_YNA data (including trailing zeros).
+    """
+    codes = []
+    for byte in data[1:]:
+        codes.extend(YNA_TABLE[byte])
+    return codes
+
+
+def decode_bits(data):
+    """
+    Returns the bits of KIND_VOTES data (including trailing zeros).
+    """
+    bits = []
+    for byte in data[1:]:
+        bits.extend(BIT_TABLE[byte])
+    return bits
+
+
+def decode_vote(data, candidate_ids):
+    """
+    Decodes a vote. Lists of candidate ids are returned in submission order.
+    """
+    data = bytes(data or b'')
+    if not data:
+        return {}
+    kind = data[0]
+    if kind == KIND_YNA:
+        return {
+            str(candidate_id): YNA_VALUES[code]
+            for candidate_id, code in zip(candidate_ids, decode_codes(data)) if code}
+    if kind == KIND_VOTES:
+        return [str(candidate_id) for candidate_id in compress(candidate_ids, decode_bits(data))]
+    if kind == KIND_VOTES_ORDERED:
+        return [str(candidate_ids[i]) for i in data[1:]]
+    if kind == KIND_SPECIAL:
+        return SPECIAL_VALUES[data[1]]
+    return json.loads(data[1:].decode('utf-8'))
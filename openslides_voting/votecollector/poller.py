@@ -0,0 +1,222 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from openslides.core.config import config
+
+from ..models import VoteCollectorReceiver, VotingController
+from . import rpc
+
+
+class StatusCache:
+    """
+    Holds the last device status and the last voting status of each voting session
+    received from the VoteCollector together with the time they were fetched.
+
+    Each entry is a tuple (value, error, timestamp). If the VoteCollector could not be
+    reached value is None and error contains the error message.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.device_status = None
+        # {<session id>: <entry>}
+        self.voting_status = {}
+
+    def set_device_status(self, value=None, error=None):
+        with self.lock:
+            self.device_status = (value, error, time.time())
+
+    def set_voting_status(self, session_id, value=None, error=None):
+        with self.lock:
+            self.voting_status[session_id] = (value, error, time.time())
+
+    def get_voting_status(self, session_id):
+        return self.voting_status.get(session_id)
+
+    def clear_voting_status(self, session_ids=None):
+        """
+        Removes the voting status of all sessions except the given ones.
+        """
+        with self.lock:
+            self.voting_status = {
+                session_id: entry for session_id, entry in self.voting_status.items()
+                if session_ids and session_id in session_ids}
+
+
+status_cache = StatusCache()
+
+
+class ReceiverCounter:
+    """
+    Collects the keypad numbers of the votes accepted by this process. The received votes
+    counters of the receivers are written by the background poller once per interval, so
+    vote requests do not write them. Without poller they are written at once.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.keypad_numbers = []
+
+    def add(self, keypad_numbers):
+        if not keypad_numbers:
+            return
+        with self.lock:
+            self.keypad_numbers.extend(keypad_numbers)
+        ensure_poller()
+        if get_poll_interval() <= 0:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the collected counts.
+        """
+        with self.lock:
+            keypad_numbers, self.keypad_numbers = self.keypad_numbers, []
+        if keypad_numbers:
+            VoteCollectorReceiver.add_votes_received(keypad_numbers)
+
+
+receiver_counter = ReceiverCounter()
+
+
+def get_poll_interval():
+    """
+    Returns the poll interval in seconds. 0 disables the background poller.
+    """
+    return getattr(settings, 'VOTING_VOTECOLLECTOR_POLL_INTERVAL', 5)
+
+
+def get_max_age():
+    """
+    Returns the age in seconds after which a cached status is refreshed on read.
+    """
+    return max(get_poll_interval() * 3, 5)
+
+
+def refresh_device_status():
+    """
+    Fetches the device status from the VoteCollector and caches it. Saves the status
+    on the voting sessions if it has changed so clients are informed by autoupdate.
+    """
+    try:
+        status = rpc.get_device_status()
+    except rpc.VoteCollectorError as e:
+        status_cache.set_device_status(error=e.value)
+        status = e.value
+    else:
+        status_cache.set_device_status(value=status)
+
+    for vc in VotingController.objects.exclude(device_status=status):
+        vc.device_status = status
+        vc.save(update_fields=['device_status'])
+    return status_cache.device_status
+
+
+def refresh_voting_status(session=None):
+    """
+    Fetches the voting status ([elapsed_seconds, votes_received]) of the given or all
+    voting sessions which are voting from the VoteCollector and caches it. The votes
+    received are summed up over the receivers of each session. Returns the status of
+    the given session or None if it is not voting.
+    """
+    sessions = list(VotingController.objects.filter(is_voting=True))
+    status_cache.clear_voting_status({vc.pk for vc in sessions})
+    if session is not None:
+        sessions = [vc for vc in sessions if vc.pk == session.pk]
+    for vc in sessions:
+        try:
+            status = rpc.get_voting_status(vc)
+        except rpc.VoteCollectorError as e:
+            status_cache.set_voting_status(vc.pk, error=e.value)
+        else:
+            status_cache.set_voting_status(vc.pk, value=status)
+    return status_cache.get_voting_status(session.pk) if session is not None else None
+
+
+def _get_cached(entry, refresh, force):
+    ensure_poller()
+    if force or entry is None or time.time() - entry[2] > get_max_age():
+        entry = refresh()
+    value, error, _timestamp = entry
+    if error is not None:
+        raise rpc.VoteCollectorError(error)
+    return value
+
+
+def get_device_status(force=False):
+    """
+    Returns the cached device status. Fetches it from the VoteCollector if force is True
+    or the cached value is missing or outdated. Raises VoteCollectorError if the
+    VoteCollector could not be reached.
+    """
+    return _get_cached(status_cache.device_status, refresh_device_status, force)
+
+
+def get_device_status_time():
+    """
+    Returns the timestamp of the cached device status or None.
+    """
+    entry = status_cache.device_status
+    return entry[2] if entry else None
+
+
+def get_voting_status(session, force=False):
+    """
+    Returns the cached voting status [elapsed_seconds, votes_received] of the voting
+    session or None if it is not voting. Raises VoteCollectorError if the VoteCollector
+    could not be reached.
+    """
+    ensure_poller()
+    entry = status_cache.get_voting_status(session.pk)
+    if force or entry is None or time.time() - entry[2] > get_max_age():
+        entry = refresh_voting_status(session)
+        if entry is None:
+            return None
+    value, error, _timestamp = entry
+    if error is not None:
+        raise rpc.VoteCollectorError(error)
+    return value
+
+
+class StatusPoller(threading.Thread):
+    """
+    Background thread refreshing the VoteCollector device and voting status.
+    """
+    def __init__(self, interval):
+        super().__init__(name='votecollector-status-poller', daemon=True)
+        self.interval = interval
+
+    def run(self):
+        while True:
+            try:
+                receiver_counter.flush()
+                if config['voting_enable_votecollector']:
+                    refresh_device_status()
+                    refresh_voting_status()
+            except Exception:
+                # Never let the poller die. The next run tries again.
+                pass
+            finally:
+                close_old_connections()
+            time.sleep(self.interval)
+
+
+_poller = None
+_poller_lock = threading.Lock()
+
+
+def ensure_poller():
+    """
+    Starts the background poller of this process if it is not running yet.
+    """
+    global _poller
+    if _poller is not None:
+        return
+    interval = get_poll_interval()
+    if interval <= 0:
+        return
+    with _poller_lock:
+        if _poller is None:
+            _poller = StatusPoller(interval)
+            _poller.start()
@@ -0,0 +1,147 @@
+from openslides.assignments.models import AssignmentOption, AssignmentPoll
+from openslides.motions.models import MotionPoll
+
+from ..models import MAX_IN_CLAUSE, AuthorizedVoter, Keypad, chunked
+from ..voting import AssignmentBallot, MotionBallot
+from . import rpc
+from .views import (
+    ValidationError,
+    validate_and_format_votecollector_candidates_votes,
+    validate_candidates_votes,
+    validate_simple_yna_votes,
+)
+
+
+def normalize_result_entry(entry):
+    """
+    Converts an entry of getVotingResult into a vote dict like the ones posted by the
+    VoteCollector: {'id': <keypad number>, 'value': <value>, 'sn': <serial number>}.
+    Entries are either such dicts or sequences [<keypad number>, <value>, <serial number>].
+    Returns None for malformed entries.
+    """
+    if isinstance(entry, dict):
+        vote = dict(entry)
+    elif isinstance(entry, (list, tuple)) and len(entry) >= 2:
+        vote = {'id': entry[0], 'value': entry[1], 'sn': entry[2] if len(entry) > 2 else None}
+    else:
+        return None
+    try:
+        vote['id'] = int(vote['id'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if 'value' not in vote:
+        return None
+    if vote.get('sn') is not None:
+        vote['sn'] = str(vote['sn'])
+    return vote
+
+
+def normalize_value(value):
+    """
+    Returns a vote value comparable to values loaded from the database (dict keys are strings).
+    """
+    if isinstance(value, dict):
+        return {str(key): item for key, item in value.items()}
+    return value
+
+
+def reconcile_votes(vc, av):
+    """
+    Pulls the full voting result from the receivers of the voting session and compares
+    it with the stored ballots of the current poll of the session. Votes without a ballot (e. g. lost callbacks or pull-only
+    mode) are inserted with one bulk write. Differing votes are reported, not changed.
+
+    Returns a report: {
+        'received': <entries pulled from the VoteCollector>,
+        'inserted': <ballots created>,
+        'missing': [<keypad numbers without ballot>],
+        'differences': [{'keypad': <number>, 'device': <value>, 'stored': <value>}],
+        'rejected': [<keypad numbers of malformed or unauthorized votes>],
+        'unmatched': [<keypad numbers of anonymous votes without serial number, not inserted>],
+    }
+    """
+    if vc.voting_mode == 'MotionPoll':
+        poll = MotionPoll.objects.get(pk=vc.voting_target)
+        ballot = MotionBallot(poll, vc.principle)
+    elif vc.voting_mode == 'AssignmentPoll':
+        poll = AssignmentPoll.objects.get(pk=vc.voting_target)
+        ballot = AssignmentBallot(poll, vc.principle)
+    else:
+        return None
+
+    result = rpc.get_voting_result(vc)
+    rejected = []
+    if vc.voting_mode == 'AssignmentPoll':
+        options = list(AssignmentOption.objects.filter(poll=poll).order_by('weight').select_related('candidate'))
+
+    # Format the values like the callback views do.
+    formatted = []
+    for entry in result:
+        vote = normalize_result_entry(entry)
+        if vote is None:
+            rejected.append(None)
+            continue
+        if not vc.owns(vote['id']):
+            # The keypad belongs to another voting session.
+            continue
+        try:
+            if vc.voting_mode == 'MotionPoll':
+                validate_simple_yna_votes([vote])
+            else:
+                if poll.pollmethod == 'votes':
+                    validate_candidates_votes([vote], options, False, poll.assignment.open_posts)
+                else:
+                    validate_and_format_votecollector_candidates_votes([vote], poll.pollmethod, options)
+        except ValidationError:
+            rejected.append(vote['id'])
+        else:
+            formatted.append(vote)
+
+    # Compare with the stored ballots by device serial number in one query.
+    stored = {
+        device: normalize_value(ballot.model.decode_vote(poll.pk, value))
+        for device, value in ballot.model.objects.filter(poll=poll).exclude(device=None).values_list(
+            'device', ballot.model.vote_field)}
+    keypads = {}
+    for numbers in chunked(sorted({vote['id'] for vote in formatted}), MAX_IN_CLAUSE):
+        keypads.update(
+            (keypad.number, keypad) for keypad in Keypad.objects.select_related('user').filter(number__in=numbers))
+    with_user = av.type in ('votecollector', 'votecollector_secret', 'votecollector_pseudo_secret')
+    authorized = AuthorizedVoter.get_authorized(
+        vc.pk, [keypad.user_id for keypad in keypads.values() if keypad.user_id]) if with_user else set()
+
+    missing = []
+    differences = []
+    unmatched = []
+    new_votes = []
+    for vote in formatted:
+        if vote.get('sn') is None and av.type == 'votecollector_anonymous':
+            # Anonymous ballots are matched by serial number only. Without one the vote
+            # may have been stored by a callback already.
+            unmatched.append(vote['id'])
+            continue
+        device = vote.get('sn') or str(vote['id'])
+        if device in stored:
+            if stored[device] != normalize_value(vote['value']):
+                differences.append({'keypad': vote['id'], 'device': vote['value'], 'stored': stored[device]})
+            continue
+        keypad = keypads.get(vote['id'])
+        user = None
+        if with_user:
+            if keypad:
+                user = keypad.user
+            if user is None or user.id not in authorized:
+                rejected.append(vote['id'])
+                continue
+        missing.append(vote['id'])
+        new_votes.append((vote['value'], user, device))
+
+    inserted = ballot.register_votes_bulk(new_votes) if new_votes else 0
+    return {
+        'received': len(result),
+        'inserted': inserted,
+        'missing': missing,
+        'differences': differences,
+        'rejected': rejected,
+        'unmatched': unmatched,
+    }
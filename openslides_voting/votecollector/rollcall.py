@@ -0,0 +1,137 @@
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.translation import ugettext as _
+from openslides.users.models import User
+from openslides.utils.autoupdate import inform_changed_data
+
+from ..attendance import schedule_attendance_update
+from ..models import Keypad, VotingController
+from ..voting import update_admitted_delegates
+from . import rpc
+from .reconcile import normalize_result_entry
+
+
+def get_roll_call_window():
+    """
+    Returns the default number of seconds keypad responses are collected in a roll call.
+    """
+    return getattr(settings, 'VOTING_ROLL_CALL_WINDOW', 15)
+
+
+def start_roll_call(callback_url=None, session=None):
+    """
+    Starts pinging all keypads of the voting session (default: the first session).
+
+    Keypads report in range by callbacks to callback_url until finish_roll_call is
+    called. Raises VoteCollectorError if a voting of the session is active.
+    """
+    vc = session or VotingController.objects.get(pk=1)
+    if vc.is_voting:
+        raise rpc.VoteCollectorError(_('A voting of this voting session is active.'))
+    receivers = rpc.get_receivers(vc)
+
+    # Stop an orphaned voting of the receivers.
+    try:
+        rpc.stop_voting(receivers)
+    except rpc.VoteCollectorError:
+        pass
+
+    vc.votes_count, vc.device_status = rpc.start_voting('Ping', callback_url, session=vc)
+    Keypad.objects.filter(vc.get_keypad_filter()).update(in_range=False, battery_level=-1)
+    vc.voting_mode = 'ping'
+    vc.voting_target = vc.votes_received = 0
+    vc.is_voting = True
+    vc.principle = None
+    vc.save()
+    return vc
+
+
+def finish_roll_call(session=None):
+    """
+    Stops pinging the keypads of the voting session (default: the first session) and
+    sets is_present of exactly the users whose keypad responded.
+
+    The full result is pulled from the VoteCollector, so lost callbacks do not matter.
+    Presence, keypads, admission and attendance are updated once with bulk updates.
+    Raises VoteCollectorError if the session does not ping the keypads.
+
+    Returns a report: {responded, present, absent, changed}.
+    """
+    vc = session or VotingController.objects.get(pk=1)
+    if not vc.is_voting or vc.voting_mode != 'ping':
+        raise rpc.VoteCollectorError(_('No roll call of this voting session is active.'))
+    try:
+        rpc.stop_voting(rpc.get_receivers(vc))
+    finally:
+        vc.is_voting = False
+        vc.save()
+
+    responses = {}
+    for entry in rpc.get_voting_result(vc):
+        vote = normalize_result_entry(entry)
+        if vote is not None and vc.owns(vote['id']):
+            responses[vote['id']] = vote
+    return apply_roll_call(responses, vc)
+
+
+def roll_call(window=None, callback_url=None, session=None):
+    """
+    Runs a roll call: pings all keypads of the voting session, collects the responses
+    for window seconds and applies them (see start_roll_call and finish_roll_call).
+    Blocks for the window, so it is used by the management command only. Requests
+    start and finish the roll call with two calls.
+
+    Returns a report: {responded, present, absent, changed}.
+    """
+    if window is None:
+        window = get_roll_call_window()
+    vc = start_roll_call(callback_url, session)
+    try:
+        time.sleep(window)
+    finally:
+        report = finish_roll_call(vc)
+    return report
+
+
+@transaction.atomic()
+def apply_roll_call(responses, session=None):
+    """
+    Sets is_present and in_range from the ping responses {<keypad number>: <vote dict>}
+    with bulk updates and updates admission and attendance once. If a voting session is
+    given only the holders of keypads of its keypad range are marked present or absent.
+    """
+    numbers = list(responses.keys())
+    # Store battery levels. Keypads with the same battery level are updated together.
+    battery_levels = {}
+    for number, vote in responses.items():
+        try:
+            battery_levels.setdefault(int(vote.get('bl', -1)), []).append(number)
+        except (TypeError, ValueError):
+            battery_levels.setdefault(-1, []).append(number)
+    for battery_level, keypad_numbers in battery_levels.items():
+        Keypad.objects.filter(number__in=keypad_numbers).update(in_range=True, battery_level=battery_level)
+
+    holders = User.objects.exclude(keypad=None)
+    if session is not None:
+        holders = holders.filter(session.get_keypad_filter('keypad__number'))
+    present_before = set(holders.filter(is_present=True).values_list('pk', flat=True))
+    responding = set(holders.filter(keypad__number__in=numbers).values_list('pk', flat=True))
+    holders.filter(pk__in=responding).exclude(is_present=True).update(is_present=True)
+    holders.exclude(pk__in=responding).exclude(is_present=False).update(is_present=False)
+    changed = present_before ^ responding
+
+    # Bulk updates do not send signals.
+    if changed:
+        update_admitted_delegates(changed)
+        schedule_attendance_update()
+        inform_changed_data(User.objects.filter(pk__in=changed))
+    inform_changed_data(Keypad.objects.all())
+
+    return {
+        'responded': len(numbers),
+        'present': len(responding),
+        'absent': holders.count() - len(responding),
+        'changed': len(changed),
+    }
@@ -1,11 +1,18 @@
-from xmlrpc.client import ServerProxy
+import http.client
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, Full, LifoQueue
+from xml.parsers.expat import ExpatError
+from xmlrpc.client import Fault, ProtocolError, ResponseError, SafeTransport, ServerProxy, Transport
 
+from django.conf import settings
 from django.utils.translation import ugettext as _
 from django.utils.translation import ugettext_noop
 
 from openslides.core.config import config
 
-from ..models import Keypad
+from ..models import Keypad, VoteCollectorReceiver, VotingController
 
 
 VOTECOLLECTOR_ERROR_MESSAGES = {
@@ -40,15 +47,209 @@ class VoteCollectorError(Exception):
         return repr("VoteCollector Exception: %s" % self.value)
 
 
-def get_server():
+class TimeoutHTTPConnection(http.client.HTTPConnection):
     """
-    Gets a server proxy object.
+    HTTP connection using separate timeouts for connecting and reading.
     """
-    try:
-        server = ServerProxy(config['voting_votecollector_uri'])
-    except TypeError:
-        raise VoteCollectorError(_('Server not found.'))
-    return server
+    def __init__(self, host, connect_timeout, read_timeout, **kwargs):
+        super().__init__(host, timeout=connect_timeout, **kwargs)
+        self.read_timeout = read_timeout
+
+    def connect(self):
+        super().connect()
+        self.sock.settimeout(self.read_timeout)
+
+
+class TimeoutHTTPSConnection(http.client.HTTPSConnection):
+    """
+    HTTPS connection using separate timeouts for connecting and reading.
+    """
+    def __init__(self, host, connect_timeout, read_timeout, **kwargs):
+        super().__init__(host, timeout=connect_timeout, **kwargs)
+        self.read_timeout = read_timeout
+
+    def connect(self):
+        super().connect()
+        self.sock.settimeout(self.read_timeout)
+
+
+class KeepAliveTransport(Transport):
+    """
+    XML-RPC transport keeping its HTTP/1.1 connection open between calls.
+    Transports are not thread-safe. Each one is used by a single call at a time (see TransportPool).
+    """
+    connection_class = TimeoutHTTPConnection
+
+    def __init__(self, connect_timeout, read_timeout, **kwargs):
+        super().__init__(**kwargs)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+    def make_connection(self, host):
+        if self._connection and host == self._connection[0]:
+            return self._connection[1]
+        chost, self._extra_headers, x509 = self.get_host_info(host)
+        self._connection = host, self.connection_class(
+            chost, self.connect_timeout, self.read_timeout, **self._get_connection_kwargs(x509))
+        return self._connection[1]
+
+    def _get_connection_kwargs(self, x509):
+        return {}
+
+
+class SafeKeepAliveTransport(KeepAliveTransport, SafeTransport):
+    """
+    Keep-alive transport for https URIs.
+    """
+    connection_class = TimeoutHTTPSConnection
+
+    def _get_connection_kwargs(self, x509):
+        kwargs = {'context': self.context}
+        kwargs.update(x509)
+        return kwargs
+
+
+class TransportPool:
+    """
+    Bounded pool of keep-alive transports for one VoteCollector URI.
+    """
+    def __init__(self, uri, size, connect_timeout, read_timeout):
+        self.transport_class = SafeKeepAliveTransport if uri.startswith('https') else KeepAliveTransport
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.transports = LifoQueue(maxsize=size)
+
+    def acquire(self):
+        try:
+            return self.transports.get_nowait()
+        except Empty:
+            return self.transport_class(self.connect_timeout, self.read_timeout)
+
+    def release(self, transport):
+        try:
+            self.transports.put_nowait(transport)
+        except Full:
+            # Pool is full. Drop the surplus connection.
+            transport.close()
+
+    def discard(self, transport):
+        transport.close()
+
+
+class CircuitBreaker:
+    """
+    Stops calling a VoteCollector after consecutive connection failures.
+
+    After `threshold` failures the circuit opens and calls fail immediately for `reset_timeout`
+    seconds. Afterwards a single trial call is let through; on success the circuit closes again.
+    """
+    def __init__(self, threshold, reset_timeout):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Half open: Let one trial call pass and hold back the others.
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+
+class VoteCollectorClient:
+    """
+    XML-RPC client for one VoteCollector with pooled keep-alive connections,
+    connect/read timeouts, retries for idempotent calls and a circuit breaker.
+
+    Settings (settings.py):
+        VOTING_VOTECOLLECTOR_CONNECT_TIMEOUT: seconds, default 2
+        VOTING_VOTECOLLECTOR_READ_TIMEOUT: seconds, default 10
+        VOTING_VOTECOLLECTOR_RETRIES: retries of idempotent calls, default 2
+        VOTING_VOTECOLLECTOR_POOL_SIZE: kept-alive connections, default 4
+        VOTING_VOTECOLLECTOR_FAILURE_THRESHOLD: failures until the circuit opens, default 3
+        VOTING_VOTECOLLECTOR_RESET_TIMEOUT: seconds until a trial call is made, default 30
+    """
+    def __init__(self, uri):
+        if not isinstance(uri, str) or not uri.startswith(('http://', 'https://')):
+            raise VoteCollectorError(_('Server not found.'))
+        self.uri = uri
+        self.retries = getattr(settings, 'VOTING_VOTECOLLECTOR_RETRIES', 2)
+        self.pool = TransportPool(
+            uri,
+            getattr(settings, 'VOTING_VOTECOLLECTOR_POOL_SIZE', 4),
+            getattr(settings, 'VOTING_VOTECOLLECTOR_CONNECT_TIMEOUT', 2),
+            getattr(settings, 'VOTING_VOTECOLLECTOR_READ_TIMEOUT', 10))
+        self.breaker = CircuitBreaker(
+            getattr(settings, 'VOTING_VOTECOLLECTOR_FAILURE_THRESHOLD', 3),
+            getattr(settings, 'VOTING_VOTECOLLECTOR_RESET_TIMEOUT', 30))
+
+    def call(self, method, *args, idempotent=False):
+        """
+        Calls voteCollector.<method>(*args). Only idempotent calls are retried.
+        Raises VoteCollectorError if the VoteCollector cannot be reached.
+        """
+        if not self.breaker.allow():
+            raise VoteCollectorError(_('VoteCollector is not reachable.'))
+
+        attempts = 1 + self.retries if idempotent else 1
+        for attempt in range(attempts):
+            transport = self.pool.acquire()
+            try:
+                proxy = ServerProxy(self.uri, transport=transport)
+                result = getattr(proxy.voteCollector, method)(*args)
+            except Fault as e:
+                # The VoteCollector answered, so the connection is fine.
+                self.pool.release(transport)
+                self.breaker.success()
+                raise VoteCollectorError(_('VoteCollector error: %s') % e.faultString)
+            except (OSError, ProtocolError, ResponseError, ExpatError, http.client.HTTPException):
+                # Do not reuse a connection in an unknown state. Malformed responses (e. g.
+                # the error page of a proxy) count as failures, too.
+                self.pool.discard(transport)
+            else:
+                self.pool.release(transport)
+                self.breaker.success()
+                return result
+
+        self.breaker.failure()
+        raise VoteCollectorError(_('No connection to VoteCollector.'))
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(uri=None):
+    """
+    Returns the shared client for the given or the configured VoteCollector URI.
+    """
+    if uri is None:
+        uri = config['voting_votecollector_uri']
+    with _clients_lock:
+        client = _clients.get(uri)
+        if client is None:
+            client = _clients[uri] = VoteCollectorClient(uri)
+    return client
 
 
 def get_callback_url(request):
@@ -61,79 +262,202 @@ def get_callback_url(request):
         return 'http://%s%s' % (host, resource_path)
 
 
+def get_receivers(session=None):
+    """
+    Returns a list of VoteCollectorReceiver objects. If no receiver is configured a
+    transient receiver for voting_votecollector_uri owning all keypads is returned.
+    If a voting session is given only the receivers owning keypads of the keypad range
+    of the session are returned.
+    """
+    receivers = list(VoteCollectorReceiver.objects.all())
+    if not receivers:
+        receivers = [VoteCollectorReceiver(name='VoteCollector', uri=config['voting_votecollector_uri'])]
+    elif session is not None:
+        receivers = [
+            receiver for receiver in receivers if session.overlaps(receiver.first_keypad, receiver.last_keypad)]
+    return receivers
+
+
+def get_busy_receivers(session):
+    """
+    Returns the URIs of the receivers used by the VoteCollector votings of all other
+    voting sessions.
+    """
+    busy = set()
+    others = VotingController.objects.filter(is_voting=True).exclude(pk=session.pk).select_related(
+        'authorized_voters')
+    for other in others:
+        if other.voting_mode in ('Item', 'ping') or other.authorized_voters.type.startswith('votecollector'):
+            busy.update(receiver.uri for receiver in get_receivers(other))
+    return busy
+
+
+def call_receivers(receivers, method, *args_list, idempotent=False):
+    """
+    Calls a method on several receivers in parallel. args_list contains one tuple of
+    arguments per receiver or is empty if the method takes no arguments.
+    Returns a list of (receiver, result, error) tuples in the order of receivers.
+    """
+    def call(index):
+        receiver = receivers[index]
+        args = args_list[index] if args_list else ()
+        try:
+            return receiver, get_client(receiver.uri).call(method, *args, idempotent=idempotent), None
+        except VoteCollectorError as e:
+            return receiver, None, e
+
+    if not receivers:
+        return []
+    if len(receivers) == 1:
+        return [call(0)]
+    with ThreadPoolExecutor(max_workers=len(receivers)) as executor:
+        return list(executor.map(call, range(len(receivers))))
+
+
+def _raise_first_error(results):
+    for receiver, result, error in results:
+        if error is not None:
+            if len(results) > 1:
+                error.value = '%s: %s' % (receiver.name, error.value)
+            raise error
+
+
+def _join_status(results):
+    """
+    Returns the status of a single receiver or a combined status of all receivers.
+    """
+    if len(results) == 1:
+        return results[0][1]
+    return ' | '.join('%s: %s' % (receiver.name, result) for receiver, result, error in results)[:200]
+
+
+def _save_receivers(results, **fields):
+    """
+    Updates fields of the stored receivers. A value may be a callable taking result and error.
+    Receivers are only saved if a value has changed.
+    """
+    for receiver, result, error in results:
+        if receiver.pk is None:
+            continue
+        changed = False
+        for name, value in fields.items():
+            if callable(value):
+                value = value(result, error)
+            if getattr(receiver, name) != value:
+                setattr(receiver, name, value)
+                changed = True
+        if changed:
+            receiver.save()
+
+
 def get_device_status():
-    server = get_server()
-    try:
-        status = server.voteCollector.getDeviceStatus()
-    except:
-        raise VoteCollectorError(_('No connection to VoteCollector.'))
-    return status
+    """
+    Returns the device status of the VoteCollector. If several receivers are configured the
+    combined status of all receivers is returned.
+    """
+    results = call_receivers(get_receivers(), 'getDeviceStatus', idempotent=True)
+    _save_receivers(results, device_status=lambda result, error: (result or (error.value if error else ''))[:200])
+    _raise_first_error(results)
+    return _join_status(results)
 
 
-def start_voting(mode, callback_url, options=None):
-    server = get_server()
-    keypads = Keypad.objects.exclude(user__is_present=False).values_list(
-        'number', flat=True).order_by('number')
+def start_voting(mode, callback_url, options=None, device_status=None, session=None):
+    """
+    Prepares and starts a voting on all receivers owning keypads of present users.
+    Receivers are prepared and started in parallel. The device status is queried unless
+    it is given, e. g. from the status cache. If callback_url is None the VoteCollector
+    does not post votes; they have to be pulled with get_voting_result. If a voting
+    session is given only the keypads of its keypad range are included.
+    """
+    keypads = Keypad.objects.exclude(user__is_present=False)
+    if session is not None:
+        keypads = keypads.filter(session.get_keypad_filter())
+    keypads = list(keypads.values_list('number', flat=True).order_by('number'))
     # NOTE: Keypads not belonging to a user are included here for the purpose of doing a system test
     # but motion or assignment polling is not possible.
 
-    if not keypads.exists():
+    if not keypads:
         raise VoteCollectorError(_('No keypads exists for active users.'))
 
-    try:
-        status = server.voteCollector.getDeviceStatus()
-    except:
-        raise VoteCollectorError(_('No connection to VoteCollector.'))
+    # Shard keypads by receiver range. Receivers without keypads are not started.
+    shards = []
+    for receiver in get_receivers(session):
+        numbers = [number for number in keypads if receiver.owns(number)]
+        if numbers:
+            shards.append((receiver, numbers))
+    if not shards:
+        raise VoteCollectorError(_('No keypads exists for active users.'))
+    receivers = [receiver for receiver, numbers in shards]
+
+    if device_status is not None and len(receivers) == 1:
+        results = [(receivers[0], device_status, None)]
+    else:
+        results = call_receivers(receivers, 'getDeviceStatus', idempotent=True)
+        _raise_first_error(results)
     # VoteCollector MUST be configured with a secret key for posted votes to be accepted!
-    if "Secret Key: Yes" not in status:
-        raise VoteCollectorError(_('VoteCollector does not use a secret key.'))
+    for receiver, status, error in results:
+        if "Secret Key: Yes" not in status:
+            raise VoteCollectorError(_('VoteCollector does not use a secret key.'))
+    status = _join_status(results)
 
-    ext_mode = options + ';' + callback_url if options else callback_url
-    try:
-        count = server.voteCollector.prepareVoting(mode + '-' + ext_mode, 0, 0, list(keypads))
-    except Exception as e:
-        raise VoteCollectorError(_('No connection to VoteCollector.'))
-    if count < 0:
-        raise VoteCollectorError(nr=count)
+    # prepareVoting and startVoting change the device state and are never retried.
+    ext_mode = ';'.join(part for part in (options, callback_url) if part)
+    if ext_mode:
+        mode += '-' + ext_mode
+    prepared = call_receivers(
+        receivers, 'prepareVoting', *[(mode, 0, 0, numbers) for receiver, numbers in shards])
+    _raise_first_error(prepared)
+    for receiver, count, error in prepared:
+        if count < 0:
+            raise VoteCollectorError(nr=count)
 
-    try:
-        count = server.voteCollector.startVoting()
-    except:
-        raise VoteCollectorError(_('No connection to VoteCollector.'))
-    if count < 0:
-        raise VoteCollectorError(nr=count)
+    started = call_receivers(receivers, 'startVoting')
+    failed = [result for result in started if result[2] is not None or result[1] < 0]
+    if failed:
+        # Do not leave some receivers running.
+        call_receivers(receivers, 'stopVoting', idempotent=True)
+        receiver, count, error = failed[0]
+        raise error or VoteCollectorError(nr=count)
 
-    return count, status
+    _save_receivers(started, votes_received=0, is_voting=True)
+    return sum(count for receiver, count, error in started), status
 
 
-def stop_voting():
-    server = get_server()
-    try:
-        server.voteCollector.stopVoting()
-    except:
-        raise VoteCollectorError(_('No connection to VoteCollector.'))
+def stop_voting(receivers=None):
+    """
+    Stops the voting on the given or all receivers in parallel.
+    """
+    if receivers is None:
+        receivers = get_receivers()
+    results = call_receivers(receivers, 'stopVoting', idempotent=True)
+    _save_receivers(results, is_voting=False)
+    _raise_first_error(results)
     return True
 
 
-def get_voting_status():
+def get_voting_status(session=None):
     """
-    Returns voting status as a list: [elapsed_seconds, votes_received]
+    Returns voting status as a list: [elapsed_seconds, votes_received]. The votes received
+    are summed up over all receivers or the receivers of the given voting session.
     """
-    server = get_server()
-    try:
-        status = server.voteCollector.getVotingStatus()
-    except:
-        raise VoteCollectorError(_('No connection to VoteCollector.'))
-    return status
+    results = call_receivers(get_receivers(session), 'getVotingStatus', idempotent=True)
+    _raise_first_error(results)
+    if not results:
+        return [0, 0]
+    return [
+        max(result[0] for receiver, result, error in results),
+        sum(result[1] for receiver, result, error in results)
+    ]
 
 
-def get_voting_result():
+def get_voting_result(session=None):
     """
-    Returns the voting result as a list.
+    Returns the voting result as a list. The results of all receivers or the receivers
+    of the given voting session are concatenated.
     """
-    server = get_server()
-    try:
-        result = server.voteCollector.getVotingResult()
-    except:
-        raise VoteCollectorError(_('No connection to VoteCollector.'))
-    return result
+    results = call_receivers(get_receivers(session), 'getVotingResult', idempotent=True)
+    _raise_first_error(results)
+    voting_result = []
+    for receiver, result, error in results:
+        voting_result.extend(result)
+    return voting_result
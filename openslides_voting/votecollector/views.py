@@ -2,6 +2,8 @@ import base64
 import hmac
 import hashlib
 import json
+import logging
+import time
 
 from django.db import transaction
 from django.conf import settings
@@ -16,26 +18,65 @@ from openslides.utils.auth import has_perm
 from openslides.utils import views as utils_views
 from openslides.utils.autoupdate import inform_changed_data
 
+from .. import metrics, querybudget
 from ..models import (
-    AuthorizedVoters,
+    AuthorizedVoter,
     Keypad,
     VotingController,
     VotingToken,
 )
+from ..recorder import get_record_dir, is_recorded, recorder
+from ..stats import session_stats
 from ..voting import AssignmentBallot, MotionBallot
+from .poller import receiver_counter
+
+logger = logging.getLogger(__name__)
 
 
 class ValidationError(Exception):
-    def __init__(self, msg):
+    def __init__(self, msg, reason='invalid'):
         self.msg = msg
+        self.reason = reason  # Reject reason for the session statistics.
 
 
 class ValidationView(utils_views.View):
-    def dispatch(self, *args, **kwargs):
-        try:
-            return super().dispatch(*args, **kwargs)
-        except ValidationError as e:
-            return JsonResponse(e.msg, status=400)
+    def dispatch(self, request, *args, **kwargs):
+        start = time.perf_counter()
+        # Set by the views once the voting is known and the message is verified.
+        self.voting_key = None
+        self.recorded = False
+        self.verified_message = None
+        with metrics.measure(type(self).__name__):
+            try:
+                response = super().dispatch(request, *args, **kwargs)
+            except ValidationError as e:
+                session_stats.add_rejected(e.reason)
+                response = JsonResponse(e.msg, status=400)
+            finally:
+                session_stats.add_latency(time.perf_counter() - start)
+                session_stats.end()
+
+        if self.voting_key is not None and self.recorded:
+            payload = self.verified_message
+            if payload is None:
+                payload = request.body.decode('utf-8', 'replace')
+            # The vote is committed already. Recording errors must not fail the response,
+            # else the keypads submit the vote again.
+            try:
+                recorder.record(self.voting_key, type(self).__name__, request, kwargs, payload, response.status_code)
+            except Exception:
+                logger.exception('Recording the request failed.')
+        return response
+
+    def begin_voting_request(self, vc):
+        """
+        Marks the request as part of the current voting of the voting session for
+        statistics and recording.
+        """
+        self.voting_key = (vc.pk, vc.voting_mode, vc.voting_target)
+        # The voting type is only looked up if recording is enabled.
+        self.recorded = bool(get_record_dir()) and is_recorded(vc.authorized_voters.type)
+        session_stats.begin(self.voting_key)
 
     def decode_votecollector_message(self, message):
         """
@@ -53,10 +94,11 @@ class ValidationView(utils_views.View):
             hash = base64.b64encode(digest).decode('utf-8')
             # hash must match the hmac value sent.
             if hash != d['hmac']:
-                raise ValidationError({'detail': 'HMAC authentication failed.'})
+                raise ValidationError({'detail': 'HMAC authentication failed.'}, reason='hmac')
+            self.verified_message = d['message']
             return d['message']
         except (ValueError, TypeError, KeyError):
-            raise ValidationError({'detail': 'The content is malformed.'})
+            raise ValidationError({'detail': 'The content is malformed.'}, reason='malformed')
 
     def validate_input_data(self, data, voting_type, user):
         """
@@ -83,34 +125,31 @@ class ValidationView(utils_views.View):
         try:
             votes = json.loads(data)
         except ValueError:
-            raise ValidationError({'detail': 'The content is malformed.'})
+            raise ValidationError({'detail': 'The content is malformed.'}, reason='malformed')
         if not isinstance(votes, list):
             votes = [votes]
 
         if not voting_type.startswith('votecollector') and len(votes) != 1:
-            raise ValidationError({'detail': 'Just one vote has to be given'})
+            raise ValidationError({'detail': 'Just one vote has to be given'}, reason='malformed')
 
         for vote in votes:
             if not isinstance(vote, dict):
-                raise ValidationError({'detail': 'All votes have to be a dict'})
+                raise ValidationError({'detail': 'All votes have to be a dict'}, reason='malformed')
             if 'value' not in vote:
-                raise ValidationError({'detail': 'A vote value is missing'})
+                raise ValidationError({'detail': 'A vote value is missing'}, reason='malformed')
 
             if voting_type.startswith('votecollector'):
                 # Check, if bl, id and sn is given and valid.
                 if not {'bl', 'id', 'sn'}.issubset(vote):
-                    raise ValidationError({'detail': 'bl, id and sn are necessary for the votecollector'})
+                    raise ValidationError(
+                        {'detail': 'bl, id and sn are necessary for the votecollector'}, reason='malformed')
                 if not isinstance(vote['bl'], int) or not isinstance(vote['id'], int):
-                    raise ValidationError({'detail': 'bl and id has to be int.'})
-                try:
-                    keypad = Keypad.objects.get(number=vote['id'])
-                except Keypad.DoesNotExist:
-                    # Keypad might have been deleted after voting has started.
-                    keypad = None
-                vote['keypad'] = keypad
+                    raise ValidationError({'detail': 'bl and id has to be int.'}, reason='malformed')
             elif voting_type == 'token_based_electronic':  # Check, if a valid token is given
                 if not has_perm(user, 'openslides_voting.can_see_token_voting'):
-                    raise ValidationError({'detail': 'The user does not have the permission to vote with tokens.'})
+                    raise ValidationError(
+                        {'detail': 'The user does not have the permission to vote with tokens.'},
+                        reason='not_authorized')
                 token = vote.get('token')
                 if not isinstance(token, str):
                     raise ValidationError({'detail': 'The token has to be a string.'})
@@ -122,79 +161,145 @@ class ValidationView(utils_views.View):
                     raise ValidationError({'detail': 'The voting token is not valid.'})
                 vote['token_instance'] = token_instance
 
+        if voting_type.startswith('votecollector'):
+            # Get all keypads with one query. A keypad might have been deleted after voting has started.
+            keypads = {
+                keypad.number: keypad
+                for keypad in Keypad.objects.select_related('user').filter(number__in=[vote['id'] for vote in votes])}
+            for vote in votes:
+                vote['keypad'] = keypads.get(vote['id'])
+
         return votes
 
     def update_keypads_from_votes(self, votes, voting_type):
         """
-        Updates the keypds from votes. The voting type has to be a VoteCollector one.
-        The votes has to be validated first.
+        Updates the keypds from votes.
+        The voting type has to be a VoteCollector one. The votes has to be validated first.
         """
         if voting_type.startswith('votecollector'):
+            # Mark keypads as in range and update battery levels with one query per level.
             keypads = []
+            levels = {}
             for vote in votes:
                 keypad = vote['keypad']
-                # Mark keypad as in range and update battery level.
                 if keypad:
                     keypad.in_range = True
                     keypad.battery_level = vote['bl']
-                    keypad.save(skip_autoupdate=True)
+                    levels.setdefault(vote['bl'], []).append(keypad.pk)
                     keypads.append(keypad)
+            querybudget.allow(len(levels))
+            for level, pks in levels.items():
+                Keypad.objects.filter(pk__in=pks).update(in_range=True, battery_level=level)
 
             # Trigger auto-update for keypads.
             inform_changed_data(keypads)
 
 
-class SubmitVotes(ValidationView):
-    http_method_names = ['post']
+def validate_simple_yna_votes(votes):
+    """
+    Checks, if all values are in ('Y', 'N' or 'A').
+    """
+    for vote in votes:
+        value = vote['value']
+        if not isinstance(value, str):
+            raise ValidationError({'detail': 'Value has to be a string.'})
+        if not value in ('Y', 'N', 'A'):
+            raise ValidationError({'detail': 'Value has to be Y, N or A.'})
+
+
+def validate_and_format_votecollector_candidates_votes(votes, pollmethod, options):
+    """
+    Reformat the votes that come from the votecollector to match the
+    internal structure. The pollmethod has to be 'yna' or 'yn'.
+    """
+    first_option_id = options[0].candidate_id
+    for vote in votes:
+        value = vote['value']
+        if not isinstance(value, str):
+            raise ValidationError({'detail': 'Value has to be a string.'})
+        if not value in [s.upper() for s in pollmethod]:
+            raise ValidationError({'detail': 'Value has to match the pollmethod {}.'.format(pollmethod)})
+        vote['value'] = {
+            first_option_id: value,
+        }
+    return votes
+
+
+def validate_yn_candidates_votes(votes, pollmethod, options):
+    """
+    Check, if the votes values matches the given pollmethod. It can either be
+    'yna' or 'yn'.
+    The value has to be a dict with _every_ candidate index as key with 'Y', 'N'
+    or 'A' as value (no 'A' for 'YN' method obviosly).
+    """
+    for vote in votes:
+        value = vote['value']
+        if not isinstance(value, dict):
+            raise ValidationError({'detail': 'Value has to be a dict.'})
+        for option in options:
+            option_value = value.get(str(option.candidate_id))
+            if not isinstance(option_value, str):
+                raise ValidationError({'detail': 'The option value (id {}) has the wrong format '.format(
+                    option.candidate_id)})
+            if option_value not in [s.upper() for s in pollmethod]:
+                raise ValidationError({'detail': 'The option value {} is wrong.'.format(
+                    option_value)})
+
+
+def validate_candidates_votes(votes, options, range_exception, open_posts):
+    """
+    Some more types of vote values are accepted here:
+    - A simple 'A' or 'N' for abstain or No. You can give an empty list for abstian as well.
+    - A list with candidate indices. They should be unique. Indices are integers with
+      0 < i <= len(options). Replaces these indeicesx with the actual candidate ids in string.
+    - A single digit: Will be converted to [<id>] and the rule above applies.
+    """
+    for vote in votes:
+        value = vote['value']
+        # for the votecollector single digits are allowed
+        if isinstance(value, str):
+            try:
+                value = [int(value)]
+            except ValueError:
+                pass
 
-    def validate_simple_yna_votes(self, votes):
-        """
-        Checks, if all values are in ('Y', 'N' or 'A').
-        """
-        for vote in votes:
-            value = vote['value']
-            if not isinstance(value, str):
-                raise ValidationError({'detail': 'Value has to be a string.'})
-            if not value in ('Y', 'N', 'A'):
-                raise ValidationError({'detail': 'Value has to be Y, N or A.'})
+        # check for 'A', 'N' or a list of indices
+        if isinstance(value, list):
+            value_set = set(value)
+            if len(value_set) != len(value):  # someone has votes for the same candidate multiple times
+                raise ValidationError({'detail': 'You cannot give more than one vote per candidate.'})
 
-    def validate_and_format_votecollector_candidates_votes(self, votes, pollmethod, options):
-        """
-        Reformat the votes that come from the votecollector to match the
-        internal structure. The pollmethod has to be 'yna' or 'yn'.
-        """
-        first_option_id = options[0].candidate.id
-        for vote in votes:
-            value = vote['value']
-            if not isinstance(value, str):
-                raise ValidationError({'detail': 'Value has to be a string.'})
-            if not value in [s.upper() for s in pollmethod]:
-                raise ValidationError({'detail': 'Value has to match the pollmethod {}.'.format(pollmethod)})
-            vote['value'] = {
-                first_option_id: value,
-            }
-        return votes
+            if len(value) > open_posts:
+                raise ValidationError({'detail': 'You cannot cast more votes than candidates available.'})
 
-    def validate_candidates_votes(self, votes, pollmethod, options):
-        """
-        Check, if the votes values matches the given pollmethod. It can either be
-        'yna' or 'yn'.
-        The value has to be a dict with _every_ candidate index as key with 'Y', 'N'
-        or 'A' as value (no 'A' for 'YN' method obviosly).
-        """
-        for vote in votes:
-            value = vote['value']
-            if not isinstance(value, dict):
-                raise ValidationError({'detail': 'Value has to be a dict.'})
-            for option in options:
-                option_value = value.get(str(option.candidate.id))
-                if not isinstance(option_value, str):
-                    raise ValidationError({'detail': 'The option value (id {}) has the wrong format '.format(
-                        option.candidate.id)})
-                if option_value not in [s.upper() for s in pollmethod]:
-                    raise ValidationError({'detail': 'The option value {} is wrong.'.format(
-                        option_value)})
+            if len(value) == 0:
+                vote['value'] = 'A'
+            else:
+                for index in value:
+                    if not isinstance(index, int):
+                        raise ValidationError({'detail': 'An index has to be int.'})
+                    if index == 0:
+                        vote['value'] = 'A'  # abstain
+                    elif index > len(options) or index < 0:
+                        vote['value'] = 'invalid'  # invalid vote
+                        if range_exception:
+                            raise ValidationError({'detail': 'Value has to be less or equal to {}.'.format(len(options))})
+                    else:
+                        # map the actual candidate ids stringified
+                        vote['value'] = [str(options[i - 1].candidate_id) for i in value]
+
+        elif isinstance(value, str):
+            if value not in ('A', 'N'):
+                raise ValidationError({'detail': 'Value has to be a list of indices, "A" or "N".'})
+        else:
+            raise ValidationError({'detail': 'Value has to be a list of indices, "A" or "N".'})
+    return votes
 
+
+class SubmitVotes(ValidationView):
+    http_method_names = ['post']
+
+    @querybudget.query_budget(25)
     @transaction.atomic()
     def post(self, request, poll_id, votecollector=False):
         """
@@ -202,12 +307,14 @@ class SubmitVotes(ValidationView):
         self.validate_input_data. For a single vote, the list can be omitted.
         """
         poll_id = int(poll_id)
-        vc = VotingController.objects.get()
-        av = AuthorizedVoters.objects.get()
 
-        # Check, if there is an active voting
-        if not vc.is_voting:
-            raise ValidationError({'detail': 'No currently active voting.'})
+        # Get the voting session of the poll.
+        vc = VotingController.get_voting(('MotionPoll', 'AssignmentPoll'), poll_id)
+        if vc is None:
+            raise ValidationError(
+                {'detail': 'The given poll id is not the target of an active voting.'}, reason='wrong_poll')
+        av = vc.authorized_voters
+        self.begin_voting_request(vc)
 
         # No voting for analog voting mode
         if av.type == 'analog':
@@ -219,16 +326,15 @@ class SubmitVotes(ValidationView):
         if not votecollector and av.type.startswith('votecollector'):
             raise ValidationError({'detail': 'Non votecollector requests are permitted!'})
 
-        # check for valid poll_id
-        if poll_id != vc.voting_target:
-            raise ValidationError({'detail': 'The given poll id is not the current voting target.'})
-
         # get request content
         body = request.body
         if votecollector:
             body = self.decode_votecollector_message(body)
+        metrics.mark('decode')
         votes = self.validate_input_data(body, av.type, request.user)
+        metrics.mark('validate')
         self.update_keypads_from_votes(votes, av.type)
+        metrics.mark('keypads')
 
         if vc.voting_mode == 'MotionPoll':
             try:
@@ -236,7 +342,7 @@ class SubmitVotes(ValidationView):
             except MotionPoll.DoesNotExist:
                 raise ValidationError({'detail': 'The MotionPoll does not exist.'})
 
-            self.validate_simple_yna_votes(votes)
+            validate_simple_yna_votes(votes)
 
             ballot = MotionBallot(poll, vc.principle)
         elif vc.voting_mode == 'AssignmentPoll':
@@ -252,12 +358,12 @@ class SubmitVotes(ValidationView):
             # validate votes. For the votecollector the votes get formatted right.
             options = AssignmentOption.objects.filter(poll=poll_id).order_by('weight').all()
             if votecollector:
-                votes = self.validate_and_format_votecollector_candidates_votes(
+                votes = validate_and_format_votecollector_candidates_votes(
                     votes,
                     poll.pollmethod,
                     options)
             else:
-                self.validate_candidates_votes(
+                validate_yn_candidates_votes(
                     votes,
                     poll.pollmethod,
                     options)
@@ -265,6 +371,7 @@ class SubmitVotes(ValidationView):
             ballot = AssignmentBallot(poll, vc.principle)
         else:
             raise ValidationError({'detail': 'The voting mode is neiher MotionPoll nor AssignmentPoll.'})
+        metrics.mark('ballot')
 
         # we can now operate for motions and assignment equally, because the logic is
         # encapsulated in the ballot objects
@@ -275,8 +382,9 @@ class SubmitVotes(ValidationView):
             user = None
             if av.type == 'named_electronic':
                 user = request.user
-                if str(user.id) not in av.authorized_voters:
-                    raise ValidationError({'detail': 'The user is not authorized to vote.'})
+                if not AuthorizedVoter.is_authorized(vc.pk, user):
+                    raise ValidationError({'detail': 'The user is not authorized to vote.'}, reason='not_authorized')
+                metrics.mark('admission')
             else:
                 token_instance = vote['token_instance']
                 token_instance.delete()
@@ -286,21 +394,36 @@ class SubmitVotes(ValidationView):
                 result_vote = vote['value']
 
             vc.votes_received += ballot.register_vote(vote['value'], voter=user, result_token=result_token)
+            session_stats.add_accepted()
         else:  # a votecollector type
+            authorized = AuthorizedVoter.get_authorized(
+                vc.pk, [vote['keypad'].user_id for vote in votes if vote['keypad'] and vote['keypad'].user_id])
+            accepted = []
             for vote in votes:
                 keypad = vote['keypad']
                 user = None
+                if not vc.owns(vote['id']):
+                    # The keypad belongs to another voting session.
+                    session_stats.add_rejected('not_authorized')
+                    continue
                 if av.type in ('votecollector', 'votecollector_secret', 'votecollector_pseudo_secret'):  # vc with user
                     # Get delegate the keypad is assigned to.
                     if keypad:
                         user = keypad.user
-                    if user is None or str(user.id) not in av.authorized_voters:
+                    if user is None or user.id not in authorized:
                         # no or no valid user, skip the vote
+                        session_stats.add_rejected('not_authorized')
                         continue
+                metrics.mark('admission')
 
                 # Write ballot.
                 vc.votes_received += ballot.register_vote(vote['value'], voter=user, device=vote['sn'])
+                session_stats.add_accepted()
+                accepted.append(vote['id'])
+            # The received votes counters of the receivers are written by the poller.
+            transaction.on_commit(lambda: receiver_counter.add(accepted))
         vc.save()
+        metrics.mark('save')
 
         return JsonResponse({
             'result_token': result_token,
@@ -310,62 +433,14 @@ class SubmitVotes(ValidationView):
 class SubmitCandidates(ValidationView):
     http_method_names = ['post']
 
-    def validate_candidates_votes(self, votes, options, range_exception, open_posts):
-        """
-        Some more types of vote values are accepted here:
-        - A simple 'A' or 'N' for abstain or No. You can give an empty list for abstian as well.
-        - A list with candidate indices. They should be unique. Indices are integers with
-          0 < i <= len(options). Replaces these indeicesx with the actual candidate ids in string.
-        - A single digit: Will be converted to [<id>] and the rule above applies.
-        """
-        for vote in votes:
-            value = vote['value']
-            # for the votecollector single digits are allowed
-            if isinstance(value, str):
-                try:
-                    value = [int(value)]
-                except ValueError:
-                    pass
-
-            # check for 'A', 'N' or a list of indices
-            if isinstance(value, list):
-                value_set = set(value)
-                if len(value_set) != len(value):  # someone has votes for the same candidate multiple times
-                    raise ValidationError({'detail': 'You cannot give more than one vote per candidate.'})
-
-                if len(value) > open_posts:
-                    raise ValidationError({'detail': 'You cannot cast more votes than candidates available.'})
-
-                if len(value) == 0:
-                    vote['value'] = 'A'
-                else:
-                    for index in value:
-                        if not isinstance(index, int):
-                            raise ValidationError({'detail': 'An index has to be int.'})
-                        if index == 0:
-                            vote['value'] = 'A'  # abstain
-                        elif index > len(options) or index < 0:
-                            vote['value'] = 'invalid'  # invalid vote
-                            if range_exception:
-                                raise ValidationError({'detail': 'Value has to be less or equal to {}.'.format(len(options))})
-                        else:
-                            # map the actual candidate ids stringified
-                            vote['value'] = [str(options[i - 1].candidate.id) for i in value]
-
-            elif isinstance(value, str):
-                if value not in ('A', 'N'):
-                    raise ValidationError({'detail': 'Value has to be a list of indices, "A" or "N".'})
-            else:
-                raise ValidationError({'detail': 'Value has to be a list of indices, "A" or "N".'})
-        return votes
-
+    @querybudget.query_budget(25)
     @transaction.atomic()
     def post(self, request, poll_id, votecollector=False):
         """
         Takes requests for incomming votes for candidates. They should have the format
         given in self.validate_input_data with the matching format for value (the pollmethod).
         For a single vote, the list can be omitted.
-        The actual vote format can be determined by reading the docstrin from `validate_candidate_votes`.
+        The actual vote format can be determined by reading the docstrin from `validate_candidates_votes`.
         Note: The values for the candidates are NOT the IDs. Its the index started by 1, if
         you put all candidates ordered by their weight in a straight order.
         """
@@ -375,12 +450,13 @@ class SubmitCandidates(ValidationView):
         except AssignmentPoll.DoesNotExist:
             raise ValidationError({'detail': 'The AssignmentPoll does not exist.'})
 
-        vc = VotingController.objects.get()
-        av = AuthorizedVoters.objects.get()
-
-        # Check, if there is an active voting
-        if not vc.is_voting:
-            raise ValidationError({'detail': 'No currently active voting.'})
+        # Get the voting session of the poll.
+        vc = VotingController.get_voting(('AssignmentPoll', ), poll_id)
+        if vc is None:
+            raise ValidationError(
+                {'detail': 'The given poll id is not the target of an active voting.'}, reason='wrong_poll')
+        av = vc.authorized_voters
+        self.begin_voting_request(vc)
 
         # No voting for analog voting mode
         if av.type == 'analog':
@@ -392,24 +468,24 @@ class SubmitCandidates(ValidationView):
         if not votecollector and av.type.startswith('votecollector'):
             raise ValidationError({'detail': 'Non votecollector requests are permitted!'})
 
-        # check for valid poll_id
-        if poll_id != vc.voting_target:
-            raise ValidationError({'detail': 'The given poll id is not the current voting target.'})
-
         # Here, just the votes methods is allowed:
         if poll.pollmethod != 'votes':
             raise ValidationError({'detail': 'The pollmethod has to be votes.'})
 
         options = AssignmentOption.objects.filter(poll=poll_id).order_by('weight').all()
         ballot = AssignmentBallot(poll, vc.principle)
+        metrics.mark('ballot')
 
         # get request content
         body = request.body
         if votecollector:
             body = self.decode_votecollector_message(body)
+        metrics.mark('decode')
         votes = self.validate_input_data(body, av.type, request.user)
-        votes = self.validate_candidates_votes(votes, options, not votecollector, poll.assignment.open_posts)
+        votes = validate_candidates_votes(votes, options, not votecollector, poll.assignment.open_posts)
+        metrics.mark('validate')
         self.update_keypads_from_votes(votes, av.type)
+        metrics.mark('keypads')
 
         result_token = 0
         result_vote = None
@@ -418,8 +494,9 @@ class SubmitCandidates(ValidationView):
             user = None
             if av.type == 'named_electronic':
                 user = request.user
-                if str(user.id) not in av.authorized_voters:
-                    raise ValidationError({'detail': 'The user is not authorized to vote.'})
+                if not AuthorizedVoter.is_authorized(vc.pk, user):
+                    raise ValidationError({'detail': 'The user is not authorized to vote.'}, reason='not_authorized')
+                metrics.mark('admission')
             else:
                 token_instance = vote['token_instance']
                 token_instance.delete()
@@ -428,22 +505,37 @@ class SubmitCandidates(ValidationView):
                 result_token = ballot.get_next_result_token()
                 result_vote = vote['value']
             vc.votes_received += ballot.register_vote(vote['value'], voter=user, result_token=result_token)
+            session_stats.add_accepted()
         else:  # a votecollector type
+            authorized = AuthorizedVoter.get_authorized(
+                vc.pk, [vote['keypad'].user_id for vote in votes if vote['keypad'] and vote['keypad'].user_id])
+            accepted = []
             for vote in votes:
                 keypad = vote['keypad']
                 user = None
+                if not vc.owns(vote['id']):
+                    # The keypad belongs to another voting session.
+                    session_stats.add_rejected('not_authorized')
+                    continue
                 if av.type in ('votecollector', 'votecollector_secret', 'votecollector_pseudo_secret'):  # vc with user
                     # Get delegate the keypad is assigned to.
                     if keypad:
                         user = keypad.user
-                    if user is None or str(user.id) not in av.authorized_voters:
+                    if user is None or user.id not in authorized:
                         # no or no valid user, skip the vote
+                        session_stats.add_rejected('not_authorized')
                         continue
+                metrics.mark('admission')
 
                 # Write ballot.
                 vc.votes_received += ballot.register_vote(vote['value'], voter=user, device=vote['sn'])
+                session_stats.add_accepted()
+                accepted.append(vote['id'])
+            # The received votes counters of the receivers are written by the poller.
+            transaction.on_commit(lambda: receiver_counter.add(accepted))
 
         vc.save()
+        metrics.mark('save')
         return JsonResponse({
             'result_token': result_token,
             'result_vote': result_vote})
@@ -456,20 +548,19 @@ class SubmitSpeaker(ValidationView):
     def post(self, request, item_id, keypad_number):
         item_id = int(item_id)
 
-        # Validate voting mode.
-        vc = VotingController.objects.get()
-        if not vc.is_voting:
-            return HttpResponse(_('No active voting'))
-
-        if vc.voting_mode != 'Item' or item_id != vc.voting_target:
+        # Get the voting session of the agenda item.
+        vc = VotingController.get_voting(('Item', ), item_id)
+        if vc is None:
             return HttpResponse(_('Invalid voting  mode or target'))
+        self.begin_voting_request(vc)
 
         # Authenticate request.
         self.decode_votecollector_message(request.POST.get('auth'))
+        metrics.mark('decode')
 
         # Get keypad.
         try:
-            keypad = Keypad.objects.get(number=keypad_number)
+            keypad = Keypad.objects.filter(vc.get_keypad_filter()).get(number=keypad_number)
         except Keypad.DoesNotExist:
             return HttpResponse(_('Keypad not      registered'))
 
@@ -477,6 +568,7 @@ class SubmitSpeaker(ValidationView):
         keypad.in_range = True
         keypad.battery_level = request.POST.get('battery', -1)
         keypad.save()
+        metrics.mark('keypads')
 
         # Anonymous users cannot be added or removed from the speaker list.
         if keypad.user is None:
@@ -519,19 +611,20 @@ class SubmitKeypads(ValidationView):
 
     @transaction.atomic()
     def post(self, request):
-        # Validate voting mode.
-        vc = VotingController.objects.get()
-        if not vc.is_voting:
-            raise ValidationError({'detail': 'No currently active voting.'})
-
-        if vc.voting_mode != 'ping':
-            raise ValidationError({'detail': 'Invalid voting mode.'})
+        # Validate voting mode. Keypads report to any voting session running a system test.
+        vc = VotingController.objects.filter(is_voting=True, voting_mode='ping').first()
+        if vc is None:
+            raise ValidationError({'detail': 'No currently active system test.'})
+        self.begin_voting_request(vc)
 
         # Get request content.
         body = self.decode_votecollector_message(request.body)
+        metrics.mark('decode')
 
         # Validate marks keypads as in range and updates battery levels.
         votes = self.validate_input_data(body, 'votecollector', request.user)
+        metrics.mark('validate')
         self.update_keypads_from_votes(votes, 'votecollector')
+        metrics.mark('keypads')
 
         return HttpResponse()
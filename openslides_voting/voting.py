@@ -1,17 +1,31 @@
 from decimal import Decimal
+from itertools import compress
+
+from django.db import transaction
 
 from openslides.assignments.models import AssignmentOption
 from openslides.core.config import config
 from openslides.users.models import User
 from openslides.utils.autoupdate import inform_changed_data, inform_deleted_data
 
+from . import metrics, querybudget, votecodec
+from .archive import load_archive, pseudo_anonymize_archive
+from .cache import candidate_index, share_cache
 from .models import (
+    MAX_IN_CLAUSE,
     MotionAbsenteeVote,
     AssignmentPollBallot,
+    BallotArchive,
+    AuthorizedVoter,
+    AuthorizedVoters,
+    Keypad,
     MotionPollBallot,
+    VotingController,
     VotingPrinciple,
-    VotingShare,
+    VotingProxy,
+    chunked,
 )
+from .stats import session_stats
 
 
 def find_authorized_voter(delegate, proxies=None):
@@ -40,7 +54,7 @@ def find_authorized_voter(delegate, proxies=None):
     return delegate
 
 
-def get_admitted_delegates(principle, keypad=False, *order_by):
+def get_admitted_delegates(principle, keypad=False, *order_by, session=None):
     """
     Returns a dictionary {<voter_id>: [<delegate_id>]} of admitted delegates.
     Key is the user id of an authorized voter.
@@ -50,6 +64,8 @@ def get_admitted_delegates(principle, keypad=False, *order_by):
     :param principle: Category ID or None.
     :param keypad: True if authorized voter must have a keypad assigned to.
     :param order_by: User fields the list should be ordered by.
+    :param session: Voting session. If it has a keypad range only voters with a keypad of
+        the range are admitted.
     :return: int, dictionary
     """
     # Get delegates who have voting rights (shares) for the given principle.
@@ -61,22 +77,162 @@ def get_admitted_delegates(principle, keypad=False, *order_by):
 
     # check for keypad, if requested and votecollector is enabled.
     check_for_keypad = keypad and config['voting_enable_votecollector']
+    proxies = get_proxies()
+    attending = get_attending_users(check_for_keypad, session)
 
     # Only admit those delegates whose authorized voter is present with keypad assigned.
+    # The ordering fields are selected too as required for distinct queries.
     count = 0
-    for delegate in qs_delegates.select_related('votingproxy', 'keypad'):
-        auth_voter = find_authorized_voter(delegate)
-        if auth_voter and auth_voter.is_present and (not check_for_keypad or hasattr(auth_voter, 'keypad')):
-            key = auth_voter.id
+    fields = [field.lstrip('-') for field in order_by]
+    for row in qs_delegates.values_list('id', *fields):
+        delegate_id = row[0]
+        key = find_authorized_voter_id(delegate_id, proxies)
+        if key in attending:
             if key in admitted:
-                admitted[key].append(delegate.id)
+                admitted[key].append(delegate_id)
             else:
-                admitted[key] = [delegate.id]
+                admitted[key] = [delegate_id]
             count += 1
 
     return count,  admitted
 
 
+def get_proxies():
+    """
+    Returns a dictionary {<delegate_id>: <proxy_id>} of all voting proxies or an empty
+    dictionary if proxies are disabled.
+    """
+    if not config['voting_enable_proxies']:
+        return {}
+    return dict(VotingProxy.objects.values_list('delegate_id', 'proxy_id'))
+
+
+def get_attending_users(check_for_keypad=False, session=None):
+    """
+    Returns the set of ids of present users. If check_for_keypad is True, only users
+    with a keypad are included. If the given voting session has a keypad range, only
+    users with a keypad of the range are included.
+    """
+    attending = set(User.objects.filter(is_present=True).values_list('id', flat=True))
+    if session is not None and session.has_keypad_range():
+        keypads = Keypad.objects.filter(session.get_keypad_filter())
+    elif check_for_keypad:
+        keypads = Keypad.objects.all()
+    else:
+        return attending
+    attending &= set(keypads.exclude(user=None).values_list('user_id', flat=True))
+    return attending
+
+
+def find_authorized_voter_id(delegate_id, proxies):
+    """
+    Find the authorized voter of a delegate by stepping through the proxy chain.
+
+    :param delegate_id: User ID
+    :param proxies: Dictionary {<delegate_id>: <proxy_id>} of all voting proxies
+    :return: user id of the authorized voter (the last one in the proxy chain) or the
+        delegate himself in case of a circular reference
+    """
+    voter_id = delegate_id
+    chain = {delegate_id}
+    while voter_id in proxies:
+        voter_id = proxies[voter_id]
+        if voter_id in chain:
+            return delegate_id
+        chain.add(voter_id)
+    return voter_id
+
+
+def update_admitted_delegates(user_ids):
+    """
+    Updates the authorized voters of the current votings of all voting sessions after
+    the presence, keypad or voting proxy of the given users changed.
+
+    :param user_ids: List of user ids.
+    """
+    for session_id in VotingController.objects.filter(is_voting=True).values_list('pk', flat=True):
+        update_session_admitted_delegates(session_id, user_ids)
+
+
+@transaction.atomic()
+def update_session_admitted_delegates(session_id, user_ids):
+    """
+    Updates the authorized voters of the current voting of a voting session after the
+    presence, keypad or voting proxy of the given users changed.
+
+    Only the given users and the delegates they represent directly or through a proxy
+    chain are recomputed. Their mandates are moved between AuthorizedVoter objects and
+    votes_count of the voting session is changed by the difference.
+
+    :param session_id: Voting session id.
+    :param user_ids: List of user ids.
+    """
+    # Lock the voting session so concurrent updates are applied one after another.
+    vc = VotingController.objects.select_for_update().get(pk=session_id)
+    if not vc.is_voting:
+        return
+    av = AuthorizedVoters.objects.get(controller=vc)
+    if av.type == 'named_electronic':
+        check_for_keypad = False
+    elif av.type.startswith('votecollector'):
+        check_for_keypad = config['voting_enable_votecollector']
+    else:
+        return
+
+    proxies = get_proxies()
+    mandates = {}
+    for delegate_id, proxy_id in proxies.items():
+        mandates.setdefault(proxy_id, []).append(delegate_id)
+
+    # Collect the users and all delegates represented by them.
+    affected = set()
+    stack = [user_id for user_id in user_ids if user_id is not None]
+    while stack:
+        user_id = stack.pop()
+        if user_id not in affected:
+            affected.add(user_id)
+            stack.extend(mandates.get(user_id, ()))
+
+    # Current authorized voters of the affected delegates.
+    voters = dict(AuthorizedVoter.objects.filter(controller=vc).values_list('voter_id', 'delegates'))
+    old_voter = {
+        delegate_id: voter_id
+        for voter_id, delegate_ids in voters.items()
+        for delegate_id in delegate_ids if delegate_id in affected}
+
+    # New authorized voters of the affected delegates.
+    admitted = query_admitted_delegates(vc.principle).filter(pk__in=affected).values_list('pk', flat=True)
+    auth_voter = {delegate_id: find_authorized_voter_id(delegate_id, proxies) for delegate_id in admitted}
+    present = set(User.objects.filter(pk__in=auth_voter.values(), is_present=True).values_list('pk', flat=True))
+    if vc.has_keypad_range():
+        present = set(Keypad.objects.filter(vc.get_keypad_filter(), user_id__in=present).values_list(
+            'user_id', flat=True))
+    elif check_for_keypad:
+        present = set(Keypad.objects.filter(user_id__in=present).values_list('user_id', flat=True))
+    new_voter = {
+        delegate_id: voter_id for delegate_id, voter_id in auth_voter.items() if voter_id in present}
+
+    if new_voter == old_voter:
+        return
+
+    # Move the changed mandates.
+    changed = {}
+    for delegate_id in affected:
+        old_voter_id = old_voter.get(delegate_id)
+        new_voter_id = new_voter.get(delegate_id)
+        if old_voter_id == new_voter_id:
+            continue
+        if old_voter_id is not None:
+            changed.setdefault(old_voter_id, list(voters[old_voter_id])).remove(delegate_id)
+        if new_voter_id is not None:
+            changed.setdefault(new_voter_id, list(voters.get(new_voter_id, []))).append(delegate_id)
+    AuthorizedVoter.set_voters(vc.pk, changed)
+
+    if av.type != 'votecollector_anonymous':
+        vc.votes_count += len(new_voter) - len(old_voter)
+        vc.save()
+
+
 def query_admitted_delegates(principle=None):
     """
     Returns a queryset of admitted delegates.
@@ -92,7 +248,7 @@ def query_admitted_delegates(principle=None):
 
     # restrict delegates with shares and principles, if enabled.
     if config['voting_enable_principles']:
-        if VotingShare.objects.exists():
+        if share_cache.exists():
             qs = qs.filter(shares__shares__gt=0).distinct()  # distinct is required to eliminate duplicates
         if principle:
             qs = qs.filter(shares__principle=principle)
@@ -110,32 +266,39 @@ def get_total_shares():
     for principle_id in principle_ids:
         total_shares[principle_id] = [Decimal(0), Decimal(0), Decimal(0), Decimal(0)]
 
-    # Query delegates.
-    delegates = User.objects.filter(groups=2).select_related('votingproxy', 'keypad').prefetch_related('shares')
-    shares_exists = VotingShare.objects.exists()
-    for delegate in delegates:
+    # Collect the shares per delegate from the cached share vectors.
+    # Example: {1: [(<principle_id>, Decimal('1.000000'))]}
+    delegate_shares = {}
+    for principle_id, vector in share_cache.get_all().items():
+        for delegate_id, shares in vector.items():
+            delegate_shares.setdefault(delegate_id, []).append((principle_id, shares))
+
+    # Query delegates, proxies and attending users with one query each.
+    delegate_ids = User.objects.filter(groups=2).values_list('id', flat=True)
+    proxies = get_proxies()
+    attending_users = get_attending_users(config['voting_enable_votecollector'])
+    shares_exists = bool(delegate_shares)
+    for delegate_id in delegate_ids:
         # Exclude delegates without shares -- who may only serve as proxies.
-        if shares_exists and delegate.shares.count() == 0:
+        if shares_exists and delegate_id not in delegate_shares:
             continue
 
         total_shares['heads'][0] += 1
 
         # Find the authorized voter.
-        auth_voter = find_authorized_voter(delegate)
+        auth_voter_id = find_authorized_voter_id(delegate_id, proxies)
 
         # If auth_voter is delegate himself set index to 2 (in person) else 3 (represented).
-        i = 2 if auth_voter == delegate else 3
-        attending = auth_voter is not None and auth_voter.is_present
-        if config['voting_enable_votecollector']:
-            attending = attending and hasattr(auth_voter, 'keypad')
+        i = 2 if auth_voter_id == delegate_id else 3
+        attending = auth_voter_id in attending_users
         if attending:
             total_shares['heads'][i] += 1
 
         # Add shares to total.
-        for share in delegate.shares.all():
-            total_shares[share.principle_id][0] += share.shares
+        for principle_id, shares in delegate_shares.get(delegate_id, ()):
+            total_shares[principle_id][0] += shares
             if attending:
-                total_shares[share.principle_id][i] += share.shares
+                total_shares[principle_id][i] += shares
 
     for k in total_shares.keys():
         total_shares[k][1] = total_shares[k][2] + total_shares[k][3]
@@ -146,6 +309,7 @@ class BaseBallot:
     """
     Base class managing poll ballots for different ballot types.
     """
+    model = None  # The poll ballot model, set by derived classes.
 
     def __init__(self, poll, principle=None):
         """
@@ -165,6 +329,18 @@ class BaseBallot:
         """
         raise NotImplementedError()
 
+    def query_votes(self):
+        """
+        Returns the (delegate_id, vote) tuples of all ballots of the poll. The votes of an
+        archived poll are read from its archive.
+        """
+        votes = list(self.model.objects.filter(poll=self.poll).values_list('delegate_id', 'vote'))
+        if not votes:
+            packed = load_archive(self.poll)
+            if packed is not None:
+                return packed.iter_votes()
+        return votes
+
     def create_absentee_ballots(self):
         """
         Creates or updates ballot objects for all voting delegates who have an absentee vote registered.
@@ -198,6 +374,58 @@ class BaseBallot:
         self._register_vote_and_proxy_votes(vote, voter, device, result_token, is_authorized_voter=True)
         return self.created
 
+    def register_votes_bulk(self, votes):
+        """
+        Registers many votes at once. Works like register_vote for each vote but skips
+        delegates who already have a ballot for this poll and creates all ballots with
+        one bulk insert. Used to insert votes pulled from the VoteCollector.
+
+        :param votes: List of (vote, voter, device) tuples. voter is a User or None.
+        :return: Number of ballots created (not counting dummies)
+        """
+        existing = set(self.model.objects.filter(poll=self.poll).exclude(delegate=None).values_list(
+            'delegate_id', flat=True))
+        admitted = set(self.admitted_delegates)
+        mandates = {}
+        if config['voting_enable_proxies']:
+            for proxy_id, delegate_id in VotingProxy.objects.values_list('proxy_id', 'delegate_id'):
+                mandates.setdefault(proxy_id, []).append(delegate_id)
+
+        ballots = []
+        for vote, voter, device in votes:
+            if voter is None:
+                # Anonymous delegate
+                ballots.append(self.model(poll=self.poll, vote=vote, device=device, result_token=0))
+                continue
+            # Step through the voter and his mandates like _register_vote_and_proxy_votes.
+            pending = [(voter.id, True)]
+            while pending:
+                delegate_id, is_authorized_voter = pending.pop()
+                if delegate_id in existing:
+                    continue
+                if delegate_id in admitted or is_authorized_voter:
+                    existing.add(delegate_id)
+                    ballots.append(self.model(
+                        poll=self.poll, delegate_id=delegate_id, vote=vote, device=device, result_token=0,
+                        is_dummy=delegate_id not in admitted and is_authorized_voter))
+                pending.extend((mandate_id, False) for mandate_id in mandates.get(delegate_id, ()))
+
+        self.model.objects.bulk_create(ballots)
+        self._inform_changed_ballots([ballot.delegate_id for ballot in ballots])
+        return sum(1 for ballot in ballots if not ballot.is_dummy)
+
+    def _inform_changed_ballots(self, delegate_ids):
+        """
+        Sends the ballots of the given delegates to the clients. The ballots are loaded
+        in chunks to avoid huge IN clauses.
+        """
+        delegate_ids = sorted({delegate_id for delegate_id in delegate_ids if delegate_id is not None})
+        querybudget.allow(len(delegate_ids) // MAX_IN_CLAUSE)
+        ballots = []
+        for ids in chunked(delegate_ids, MAX_IN_CLAUSE):
+            ballots.extend(self.model.objects.filter(poll=self.poll, delegate_id__in=ids))
+        inform_changed_data(ballots)
+
     def count_votes(self):
         """
         Counts the votes of all ballot objects for the given poll. The returned format
@@ -223,9 +451,14 @@ class BaseBallot:
         Helper function that recursively creates ballots for a voter and his mandates.
         """
         self._create_ballot(vote, voter, device, result_token, is_authorized_voter)
+        if is_authorized_voter:
+            metrics.mark('register')
         if voter and config['voting_enable_proxies']:
-            for proxy in voter.mandates.all():
+            querybudget.allow(1)
+            for proxy in voter.mandates.select_related('delegate'):
                 self._register_vote_and_proxy_votes(vote, proxy.delegate, device, result_token)
+            if is_authorized_voter:
+                metrics.mark('proxies')
 
     def _create_ballot(self, vote, delegate=None, device=None, result_token=0, is_authorized_voter=False):
         """
@@ -238,6 +471,8 @@ class BaseBallot:
         """
         Common helper function that creates or updates a poll ballot.
         """
+        # One query to look up the ballot and one to save it.
+        querybudget.allow(2)
         created = False
         if not delegate:
             # Anonymous delegate
@@ -249,6 +484,10 @@ class BaseBallot:
             except model.DoesNotExist:
                 ballot = model(poll=self.poll, delegate=delegate)
                 created = True
+            else:
+                if is_authorized_voter:
+                    # The voter voted again, e. g. a resent keypad vote. The ballot is updated.
+                    session_stats.add_duplicate()
             # Check, if this is a dummy vote. It is, if the delegate is not admitted, but authorized to vote
             ballot.is_dummy = delegate.id not in self.admitted_delegates and is_authorized_voter
         else:
@@ -267,6 +506,7 @@ class MotionBallot(BaseBallot):
     """
     Creates, deletes, updates MotionPollBallot objects for a given MotionPoll object.
     """
+    model = MotionPollBallot
 
     def delete_ballots(self):
         """
@@ -280,6 +520,9 @@ class MotionBallot(BaseBallot):
             deleted.append((collection_string, pk))
         deleted_count, _ = MotionPollBallot.objects.filter(poll=self.poll).delete()
         inform_deleted_data(deleted)
+        if not deleted:
+            # The ballots of an archived poll.
+            BallotArchive.objects.filter(**{BallotArchive.get_poll_field(self.poll): self.poll}).delete()
         return deleted_count
 
     def create_absentee_ballots(self):
@@ -296,35 +539,40 @@ class MotionBallot(BaseBallot):
         # Query absentee votes for given motion.
         qs_absentee_votes = MotionAbsenteeVote.objects.filter(motion=self.poll.motion, delegate__in=admitted_delegates)
 
+        proxies = get_proxies()
+        present = get_attending_users() if proxies else set()
+        existing = {
+            ballot.delegate_id: ballot
+            for ballot in MotionPollBallot.objects.filter(poll=self.poll).exclude(delegate=None)}
+
         updated = 0
         ballots = []
         delegate_ids = []
         for absentee_vote in qs_absentee_votes:
             allowed = True
             if config['voting_enable_proxies']:
-                auth_voter = find_authorized_voter(absentee_vote.delegate)
-                allowed = auth_voter != absentee_vote.delegate and auth_voter.is_present
+                auth_voter_id = find_authorized_voter_id(absentee_vote.delegate_id, proxies)
+                allowed = auth_voter_id != absentee_vote.delegate_id and auth_voter_id in present
             if allowed:
                 # Update or create ballot instance.
-                try:
-                    mpb = MotionPollBallot.objects.get(poll=self.poll, delegate=absentee_vote.delegate)
-                except MotionPollBallot.DoesNotExist:
-                    mpb = MotionPollBallot(poll=self.poll, delegate=absentee_vote.delegate)
+                mpb = existing.get(absentee_vote.delegate_id)
+                if mpb is None:
+                    mpb = MotionPollBallot(poll=self.poll, delegate_id=absentee_vote.delegate_id)
                 mpb.vote = absentee_vote.vote
                 mpb.result_token = 0
                 if mpb.pk:
+                    querybudget.allow(1)
                     mpb.save(skip_autoupdate=True)
                 else:
                     ballots.append(mpb)
-                delegate_ids.append(mpb.delegate.id)
+                delegate_ids.append(mpb.delegate_id)
             updated += 1
 
         # Bulk create ballots.
         MotionPollBallot.objects.bulk_create(ballots)
 
         # Trigger auto-update.
-        created_ballots = MotionPollBallot.objects.filter(poll=self.poll, delegate_id__in=delegate_ids)
-        inform_changed_data(created_ballots)
+        self._inform_changed_ballots(delegate_ids)
 
         return updated
 
@@ -348,14 +596,13 @@ class MotionBallot(BaseBallot):
         """
         # Convert the ballots into a list of (delegate_id, vote) tuples.
         # Example: [(1, 'Y'), (2, 'N')]
-        votes = MotionPollBallot.objects.filter(poll=self.poll).values_list('delegate', 'vote')
+        votes = self.query_votes()
 
         shares = None
         if self.principle and config['voting_enable_principles']:
-            # Create a dict (key: delegate, value: shares).
+            # Get the cached dict (key: delegate, value: shares).
             # Example: {1: Decimal('1.000000'), 2: Decimal('45.120000')}
-            voting_shares = VotingShare.objects.filter(principle=self.principle)
-            shares = dict(voting_shares.values_list('delegate', 'shares'))
+            shares = share_cache.get(self.principle)
 
         # Sum up the votes.
         result = {
@@ -406,6 +653,8 @@ class MotionBallot(BaseBallot):
             mpb.result_token = 0
             mpb.save(skip_autoupdate=True)
         inform_changed_data(ballots)
+        if not ballots:
+            pseudo_anonymize_archive(self.poll)
 
     def _query_admitted_delegates(self):
         """
@@ -428,6 +677,8 @@ class AssignmentBallot(BaseBallot):
     Creates, deletes, updates AssignmentPollBallot objects for a given AssignmentPoll object.
     For more docstring read the descriptions in BaseBallot.
     """
+    model = AssignmentPollBallot
+
     def delete_ballots(self):
         """
         Deletes all AssignmentPollBallot objects of the current poll.
@@ -438,6 +689,9 @@ class AssignmentBallot(BaseBallot):
             deleted.append((collection_string, pk))
         deleted_count, _ = AssignmentPollBallot.objects.filter(poll=self.poll).delete()
         inform_deleted_data(deleted)
+        if not deleted:
+            # The ballots of an archived poll.
+            BallotArchive.objects.filter(**{BallotArchive.get_poll_field(self.poll): self.poll}).delete()
         return deleted_count
 
     def create_absentee_ballots(self, principle=None):
@@ -491,12 +745,24 @@ class AssignmentBallot(BaseBallot):
         AssignmentPollBallot.objects.bulk_create(ballots_to_create)
 
         # Trigger auto-update.
-        created_ballots = AssignmentPollBallot.objects.filter(poll=self.poll, delegate_id__in=delegate_ids)
-        inform_changed_data(created_ballots)
+        self._inform_changed_ballots(delegate_ids)
 
         return len(delegate_ids)
         """
 
+    def query_votes(self):
+        """
+        Returns the (delegate_id, vote_data) tuples of all ballots of the poll with the votes
+        in the compact encoding (see votecodec.py). The votes of an archived poll are encoded.
+        """
+        votes = list(AssignmentPollBallot.objects.filter(poll=self.poll).values_list('delegate_id', 'vote_data'))
+        if not votes:
+            packed = load_archive(self.poll)
+            if packed is not None:
+                candidate_ids = candidate_index.get(self.poll)
+                return packed.iter_votes(lambda vote: votecodec.encode_vote(vote, candidate_ids))
+        return votes
+
     def get_next_result_token(self):
         """
         Returns the next result token for this poll.
@@ -533,15 +799,17 @@ class AssignmentBallot(BaseBallot):
 
         This function expects the right vote values for the poll method.
         Just the ballot are counted, that does not have a user or the user must have shares >0.
+
+        The ballots are summed up per distinct encoded vote first. Each distinct vote is
+        decoded once and its sums are added to the candidates of its codes or bits.
         """
-        votes = AssignmentPollBallot.objects.filter(poll=self.poll)
+        votes = self.query_votes()
 
         shares = None
         if self.principle and config['voting_enable_principles']:
-            # Create a dict (key: delegate, value: shares).
+            # Get the cached dict (key: delegate, value: shares).
             # Example: {1: Decimal('1.000000'), 2: Decimal('45.120000')}
-            voting_shares = VotingShare.objects.filter(principle=self.principle)
-            shares = dict(voting_shares.values_list('delegate', 'shares'))
+            shares = share_cache.get(self.principle)
 
         options = AssignmentOption.objects.filter(poll=self.poll).order_by('weight').all()
         pollmethod = self.poll.pollmethod
@@ -554,44 +822,56 @@ class AssignmentBallot(BaseBallot):
 
         if pollmethod in ('yn', 'yna'):
             for option in options:
-                result[str(option.candidate.id)] = {
+                result[str(option.candidate_id)] = {
                     'Y': [0, Decimal(0)],  # [heads, shares]
                     'N': [0, Decimal(0)],
                 }
                 if pollmethod == 'yna':
-                    result[str(option.candidate.id)]['A'] = [0, Decimal(0)]
+                    result[str(option.candidate_id)]['A'] = [0, Decimal(0)]
         else:  # votes
             for option in options:
-                result[str(option.candidate.id)] = [0, Decimal(0)]
+                result[str(option.candidate_id)] = [0, Decimal(0)]
                 result['A'] = [0, Decimal(0)]
                 result['N'] = [0, Decimal(0)]
 
-        # Sum up the votes.
-        for vote in votes:
-            if vote.delegate is None:
+        # Sum up the ballots per distinct vote.
+        sums = {}
+        for delegate_id, vote_data in votes:
+            if delegate_id is None:
                 delegate_share = 1
             else:
                 try:
-                    delegate_share = shares[vote.delegate.pk] if shares else 1
+                    delegate_share = shares[delegate_id] if shares else 1
                 except KeyError:
                     # Occurs if voting share was removed after delegate cast a vote.
                     continue
-
-            if pollmethod in ('yn', 'yna'):
-                # count every vote for each candidate
-                for candidate_id, value in vote.vote.items():
-                    result[candidate_id][value][0] += 1
-                    result[candidate_id][value][1] += delegate_share
+            vote_sum = sums.setdefault(bytes(vote_data), [0, 0])
+            vote_sum[0] += 1
+            vote_sum[1] += delegate_share
+
+        # Add the sums of each vote to the candidates.
+        candidate_ids = [str(candidate_id) for candidate_id in candidate_index.get(self.poll)]
+        for vote_data, (heads, vote_shares) in sums.items():
+            kind = vote_data[0] if vote_data else None
+            if pollmethod in ('yn', 'yna') and kind == votecodec.KIND_YNA:
+                counts = [result[candidate_id][votecodec.YNA_VALUES[code]]
+                          for candidate_id, code in zip(candidate_ids, votecodec.decode_codes(vote_data)) if code]
+            elif pollmethod == 'votes' and kind == votecodec.KIND_VOTES:
+                counts = [result[candidate_id]
+                          for candidate_id in compress(candidate_ids, votecodec.decode_bits(vote_data))]
             else:
-                if vote.vote in ('A', 'N', 'invalid'):
-                    result[vote.vote][0] += 1
-                    result[vote.vote][1] += delegate_share
+                vote = votecodec.decode_vote(vote_data, candidate_ids)
+                if pollmethod in ('yn', 'yna'):
+                    # count every vote for each candidate
+                    counts = [result[candidate_id][value] for candidate_id, value in vote.items()]
+                elif vote in ('A', 'N', 'invalid'):
+                    counts = [result[vote]]
                 else:
-                    for candidateId in vote.vote:
-                        result[candidateId][0] += 1
-                        result[candidateId][1] += delegate_share
-            result['casted'][0] += 1
-            result['casted'][1] += delegate_share
+                    counts = [result[candidate_id] for candidate_id in vote]
+            counts.append(result['casted'])
+            for count in counts:
+                count[0] += heads
+                count[1] += vote_shares
         result['valid'][0] = result['casted'][0] - result['invalid'][0]
         result['valid'][1] = result['casted'][1] - result['invalid'][1]
 
@@ -608,6 +888,8 @@ class AssignmentBallot(BaseBallot):
             apb.result_token = 0
             apb.save(skip_autoupdate=True)
         inform_changed_data(ballots)
+        if not ballots:
+            pseudo_anonymize_archive(self.poll)
 
     def _query_admitted_delegates(self):
         """
@@ -0,0 +1,18 @@
+from django.test import TestCase
+
+from openslides_voting.stats import StatsRegistry, session_stats
+
+
+class RejectedWithoutVotingTest(TestCase):
+    def test_vote_for_inactive_poll(self):
+        before = session_stats.unassigned['wrong_poll']
+        response = self.client.post(
+            '/votingcontroller/votecollector/vote/4711/', '[{"id": 1, "value": "Y"}]',
+            content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(session_stats.unassigned['wrong_poll'], before + 1)
+
+    def test_stats_include_unassigned_rejects(self):
+        registry = StatsRegistry()
+        registry.add_rejected('wrong_poll')
+        self.assertEqual(registry.as_dict(1)['unassigned_rejected']['wrong_poll'], 1)